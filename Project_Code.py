@@ -1,302 +1,4547 @@
+import argparse
+import asyncio
+import gzip
+import heapq
+import json
 import requests
-import sys
+import sqlite3
+import struct
 import os
+import queue
+import random
+import threading
+import time
+import zlib
+import numpy as np
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from multiprocessing.managers import BaseManager
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from requests.adapters import HTTPAdapter
+from zoneinfo import ZoneInfo
+
+#aiohttp is only needed for the asyncio data sources
+try:
+
+    import aiohttp
+
+except ImportError:
+
+    aiohttp = None
+
+#pyarrow is only needed for the Parquet export
+try:
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+except ImportError:
+
+    pa = pq = None
+
+#Default timeout in seconds for the requests made to each source
+DEFAULT_SOURCE_TIMEOUTS = {'youtube': 10, 'tmdb': 10, 'imdb': 10}
+
+#Seconds a cached response stays valid for each endpoint. Popular lists and credits change slowly while view counts move quickly
+DEFAULT_CACHE_TTLS = {
+
+    'tmdb.popular': 6 * 3600,
+    'tmdb.details': 7 * 24 * 3600,
+    'imdb.search': 3 * 24 * 3600,
+    'imdb.lookup': 3 * 24 * 3600,
+    'youtube.search': 24 * 3600,
+    'youtube.videos': 15 * 60
+
+}
+
+#Query parameters that hold API keys, they are left out of the cache keys so a new key does not invalidate the cache
+API_KEY_PARAMETERS = ('key', 'api_key', 'apikey')
+
+class BufferedResponse:
+
+    #Stands in for a requests response when the payload is already in memory, either served from the cache or read by the async transport
+
+    def __init__(self, content, status_code=200, headers=None, from_cache=False):
+
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.from_cache = from_cache
+
+    def json(self):
+
+        return json.loads(self.content)
+
+class ResponseCache:
+
+    #Persistent SQLite cache for API responses with a TTL per endpoint and least recently used eviction under a size cap. 
+    #Any object with the same ttl_for, get and set methods can be given to HTTPTransport instead. 
+
+    def __init__(self, path='.api_cache.sqlite', ttls=None, max_bytes=64 * 1024 * 1024, clock=time.time):
+
+        self.path = path
+        self.ttls = dict(DEFAULT_CACHE_TTLS)
+
+        if ttls:
+
+            self.ttls.update(ttls)
+
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = self.misses = self.evictions = 0
+        self.endpoint_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._lock = threading.Lock()
+
+        #The connection is shared between the worker threads, the lock serializes access to it
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, endpoint TEXT, content BLOB, size INTEGER, stored_at REAL, accessed_at REAL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        #The daily quota units spent per source, so the RateLimiter budget holds across separate runs on the same day
+        self._connection.execute('CREATE TABLE IF NOT EXISTS quota_usage (day TEXT, source TEXT, units INTEGER, PRIMARY KEY (day, source))')
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(url, params=None):
+
+        #Normalizes the request into a key, the query parameters are merged, sorted and stripped of API keys
+        parts = urlsplit(url)
+        query = parse_qsl(parts.query, keep_blank_values=True) + list((params or {}).items())
+        query = sorted((name, str(value)) for name, value in query if name not in API_KEY_PARAMETERS)
+
+        return f'{parts.netloc}{parts.path}?{urlencode(query)}'
+
+    def ttl_for(self, endpoint):
+
+        return self.ttls.get(endpoint, 0)
+
+    def get(self, endpoint, key):
+
+        #Returns the cached content for the key, or None when it is missing or older than the endpoint's TTL
+        now = self.clock()
+
+        with self._lock:
+
+            row = self._connection.execute('SELECT content, stored_at FROM responses WHERE key = ?', (key,)).fetchone()
+
+            if row is not None and now - row[1] <= self.ttl_for(endpoint):
+
+                self._connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+                self._connection.commit()
+                self.hits += 1
+                self.endpoint_stats[endpoint]['hits'] += 1
+                return row[0]
+
+            if row is not None:
+
+                self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._connection.commit()
+
+            self.misses += 1
+            self.endpoint_stats[endpoint]['misses'] += 1
+            return None
+
+    def set(self, endpoint, key, content):
+
+        #Stores the content and evicts the least recently used responses until the cache fits under max_bytes
+        now = self.clock()
+
+        with self._lock:
+
+            self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)', (key, endpoint, content, len(content), now, now))
+            total = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+            if total > self.max_bytes:
+
+                for old_key, size in self._connection.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall():
+
+                    if total <= self.max_bytes:
+
+                        break
+
+                    self._connection.execute('DELETE FROM responses WHERE key = ?', (old_key,))
+                    total -= size
+                    self.evictions += 1
+
+            self._connection.commit()
+
+    def stats(self):
+
+        #Reports the hit and miss counts overall and per endpoint along with the current size of the cache
+        with self._lock:
+
+            entries, size = self._connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+
+        lookups = self.hits + self.misses
+
+        return {
+
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size,
+            'endpoints': {endpoint: dict(counts) for endpoint, counts in self.endpoint_stats.items()}
+
+        }
+
+    def load_quota_usage(self, day):
+
+        #Returns the quota units spent on the day (a YYYY-MM-DD string) per source
+        with self._lock:
+
+            return dict(self._connection.execute('SELECT source, units FROM quota_usage WHERE day = ?', (day,)).fetchall())
+
+    def add_quota_usage(self, day, source, units):
+
+        #Adds to the units spent rather than overwriting them, so runs sharing the file on the same day add up
+        with self._lock:
+
+            self._connection.execute('INSERT INTO quota_usage VALUES (?, ?, ?) ON CONFLICT (day, source) DO UPDATE SET units = units + excluded.units', (day, source, units))
+            #Each source's days are cleared separately, the YouTube day (Pacific Time) can be a day behind the UTC day of the others
+            self._connection.execute('DELETE FROM quota_usage WHERE source = ? AND day < ?', (source, day))
+            self._connection.commit()
+
+    def clear(self):
+
+        with self._lock:
+
+            self._connection.execute('DELETE FROM responses')
+            self._connection.commit()
+
+    def close(self):
+
+        with self._lock:
+
+            self._connection.close()
+
+class IDIndex:
+
+    #Persistent SQLite index from TMDb ID to IMDb ID and to the YouTube trailer IDs found for the movie. 
+    #With it OMDb is queried by IMDb ID instead of by title, and a movie is only ever searched for on YouTube once. 
+
+    def __init__(self, path='.id_index.sqlite', max_age=None, clock=time.time):
+
+        #max_age in seconds makes video IDs older than that count as missing so the trailers get searched for again
+        self.path = path
+        self.max_age = max_age
+        self.clock = clock
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS movies (tmdb_id TEXT PRIMARY KEY, imdb_id TEXT, video_ids TEXT, videos_updated_at REAL)')
+        self._connection.commit()
+
+    def get(self, tmdb_id):
+
+        #Returns the IMDb ID and video IDs known for the movie, video_ids is None when the movie has not been searched for yet
+        with self._lock:
+
+            row = self._connection.execute('SELECT imdb_id, video_ids, videos_updated_at FROM movies WHERE tmdb_id = ?', (str(tmdb_id),)).fetchone()
+
+        if row is None:
+
+            return None
+
+        imdb_id, video_ids, updated_at = row
+        fresh = video_ids is not None and (self.max_age is None or self.clock() - updated_at <= self.max_age)
+
+        return {'imdb_id': imdb_id, 'video_ids': json.loads(video_ids) if fresh else None}
+
+    def imdb_id(self, tmdb_id):
+
+        entry = self.get(tmdb_id)
+        return entry['imdb_id'] if entry else None
+
+    def video_ids(self, tmdb_id):
+
+        entry = self.get(tmdb_id)
+        video_ids = entry['video_ids'] if entry else None
+
+        if video_ids is None:
+
+            self.misses += 1
+
+        else:
+
+            self.hits += 1
+
+        return video_ids
+
+    def update(self, tmdb_id, imdb_id=None, video_ids=None):
+
+        #Records whichever of the IDs are given, leaving the others as they are
+        self.warm_up([(tmdb_id, imdb_id, video_ids)])
+
+    def warm_up(self, entries):
+
+        #Bulk loads (tmdb_id, imdb_id, video_ids) entries in one transaction, None values keep what is already indexed
+        now = self.clock()
+        rows = [(str(tmdb_id), imdb_id, None if video_ids is None else json.dumps(list(video_ids)), now) for tmdb_id, imdb_id, video_ids in entries]
+
+        with self._lock:
+
+            self._connection.executemany('''
+
+                INSERT INTO movies VALUES (?1, ?2, ?3, ?4)
+                ON CONFLICT (tmdb_id) DO UPDATE SET
+                    imdb_id = COALESCE(excluded.imdb_id, imdb_id),
+                    video_ids = COALESCE(excluded.video_ids, video_ids),
+                    videos_updated_at = CASE WHEN excluded.video_ids IS NULL THEN videos_updated_at ELSE excluded.videos_updated_at END
+
+            ''', rows)
+            self._connection.commit()
+
+        return len(rows)
+
+    def warm_up_from_records(self, records):
+
+        #Indexes the IMDb and video IDs of integrated records, for example a saved snapshot, skipping movies whose YouTube lookup failed
+        return self.warm_up((record['tmdb_id'], (record.get('tmdb_details') or {}).get('imdb_id'), record['youtube_video_ids'] or None) for record in records)
+
+    def invalidate(self, tmdb_ids=None, videos_only=False):
+
+        #Forgets the given movies, or every movie when no IDs are given. videos_only keeps the IMDb IDs and only forces new YouTube searches
+        with self._lock:
+
+            where, parameters = ('', ()) if tmdb_ids is None else (f" WHERE tmdb_id IN ({','.join('?' * len(tmdb_ids))})", tuple(str(tmdb_id) for tmdb_id in tmdb_ids))
+
+            if videos_only:
+
+                self._connection.execute(f'UPDATE movies SET video_ids = NULL, videos_updated_at = NULL{where}', parameters)
+
+            else:
+
+                self._connection.execute(f'DELETE FROM movies{where}', parameters)
+
+            self._connection.commit()
+
+    def stats(self):
+
+        with self._lock:
+
+            entries, with_imdb, with_videos = self._connection.execute('SELECT COUNT(*), COUNT(imdb_id), COUNT(video_ids) FROM movies').fetchone()
+
+        return {'entries': entries, 'imdb_ids': with_imdb, 'video_ids': with_videos, 'search_hits': self.hits, 'search_misses': self.misses}
+
+    def close(self):
+
+        with self._lock:
+
+            self._connection.close()
+
+#One row of the stats history segments: video number, timestamp, views and likes, packed without padding
+STATS_HISTORY_ROW = struct.Struct('<Idqq')
+
+class _VideoHistory:
+
+    #Time ordered columns of one video's stats, kept in compact typed arrays instead of a list of tuples
+
+    __slots__ = ('video_id', 'tmdb_id', 'times', 'views', 'likes')
+
+    def __init__(self, video_id, tmdb_id):
+
+        self.video_id = video_id
+        self.tmdb_id = tmdb_id
+        self.times = array('d')
+        self.views = array('q')
+        self.likes = array('q')
+
+    def rows(self, first=0, last=None):
+
+        return list(zip(self.times[first:last], self.views[first:last], self.likes[first:last]))
+
+class StatsHistory:
+
+    #Append-only store of the YouTube stats seen for each video, so trends can be computed without querying the API again. 
+    #Rows are appended to fixed width segment files and held in memory as per video arrays for range and latest value queries. 
+    #When enough segments have been sealed they are compacted into one, with the rows older than downsample_after thinned to one per downsample_interval. 
+
+    def __init__(self, directory='.stats_history', segment_rows=100000, compact_after_segments=8, downsample_after=7 * 24 * 3600, downsample_interval=24 * 3600, clock=time.time):
+
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.compact_after_segments = compact_after_segments
+        self.downsample_after = downsample_after
+        self.downsample_interval = downsample_interval
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._videos = []
+        self._numbers = {}
+        self._movies = defaultdict(list)
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _segment_path(self, number):
+
+        return os.path.join(self.directory, f'segment-{number:06d}.bin')
+
+    def _segment_numbers(self):
+
+        return sorted(int(name[8:14]) for name in os.listdir(self.directory) if name.startswith('segment-') and name.endswith('.bin'))
+
+    def _load(self):
+
+        #The video registry maps the row's video number to its YouTube and TMDb IDs, one JSON line per video in the order they were first seen
+        registry_path = os.path.join(self.directory, 'videos.ndjson')
+
+        if os.path.exists(registry_path):
+
+            with open(registry_path, encoding='utf-8') as registry:
+
+                for line in registry:
+
+                    try:
+
+                        video_id, tmdb_id = json.loads(line)
+
+                    except ValueError:
+
+                        #A line torn by a crash mid-write, its rows were never written either
+                        break
+
+                    self._register(video_id, tmdb_id)
+
+        numbers = self._segment_numbers()
+
+        for number in numbers:
+
+            with open(self._segment_path(number), 'rb') as segment:
+
+                data = segment.read()
+
+            #A row torn by a crash mid-write is dropped
+            whole = len(data) - len(data) % STATS_HISTORY_ROW.size
+            self._add_rows(STATS_HISTORY_ROW.iter_unpack(data[:whole]))
+
+            if whole != len(data):
+
+                with open(self._segment_path(number), 'r+b') as segment:
+
+                    segment.truncate(whole)
+
+        self._registry = open(registry_path, 'a', encoding='utf-8')
+        self._segment_number = numbers[-1] if numbers else 1
+        self._segment = open(self._segment_path(self._segment_number), 'ab')
+        self._segment_size = self._segment.tell() // STATS_HISTORY_ROW.size
+        self._sealed_segments = max(len(numbers) - 1, 0)
+
+    def _register(self, video_id, tmdb_id):
+
+        history = _VideoHistory(video_id, tmdb_id)
+        self._numbers[video_id] = len(self._videos)
+        self._videos.append(history)
+        self._movies[str(tmdb_id)].append(history)
+        return history
+
+    def _add_rows(self, rows):
+
+        #Keeps each video's rows in time order. A row that is not newer than the video's last one is skipped, 
+        #which also drops the rows duplicated when a compaction was interrupted before removing the old segments. 
+        added = []
+
+        for number, timestamp, views, likes in rows:
+
+            history = self._videos[number]
+
+            if history.times and timestamp <= history.times[-1]:
+
+                continue
+
+            history.times.append(timestamp)
+            history.views.append(views)
+            history.likes.append(likes)
+            added.append((number, timestamp, views, likes))
+
+        return added
+
+    def append(self, tmdb_id, video_stats, timestamp=None):
+
+        #Records the stats of the movie's videos, given as video ID to stats. Entries without counts, such as error markers, are skipped
+        timestamp = self.clock() if timestamp is None else timestamp
+
+        with self._lock:
+
+            rows = []
+
+            for video_id, stat in video_stats.items():
+
+                if not stat or 'views' not in stat:
+
+                    continue
+
+                if video_id not in self._numbers:
+
+                    self._register(video_id, str(tmdb_id))
+                    #The registry line goes to disk before any row that refers to it
+                    self._registry.write(json.dumps([video_id, str(tmdb_id)]) + '\n')
+                    self._registry.flush()
+
+                rows.append((self._numbers[video_id], timestamp, int(stat['views'] or 0), int(stat['likes'] or 0)))
+
+            added = self._add_rows(rows)
+
+            if added:
+
+                self._segment.write(b''.join(STATS_HISTORY_ROW.pack(*row) for row in added))
+                self._segment.flush()
+                self._segment_size += len(added)
+
+                if self._segment_size >= self.segment_rows:
+
+                    self._roll_segment()
+
+            return len(added)
+
+    def _roll_segment(self):
+
+        #Seals the full segment and starts a new one, compacting once enough segments have piled up
+        self._segment.close()
+        self._sealed_segments += 1
+
+        if self._sealed_segments >= self.compact_after_segments:
+
+            self._compact()
+
+        else:
+
+            self._segment_number += 1
+            self._segment = open(self._segment_path(self._segment_number), 'ab')
+            self._segment_size = 0
+
+    def compact(self):
+
+        #Rewrites every segment into one, downsampling the old rows. Returns the number of rows kept
+        with self._lock:
+
+            self._segment.close()
+            return self._compact()
+
+    def _compact(self):
+
+        cutoff = self.clock() - self.downsample_after
+        old_numbers = self._segment_numbers()
+        rows = []
+
+        for number, history in enumerate(self._videos):
+
+            times, views, likes = array('d'), array('q'), array('q')
+
+            for index, timestamp in enumerate(history.times):
+
+                #Of the rows older than the cutoff only the last one of each interval is kept
+                if timestamp < cutoff and index + 1 < len(history.times) and history.times[index + 1] < cutoff and history.times[index + 1] // self.downsample_interval == timestamp // self.downsample_interval:
+
+                    continue
+
+                times.append(timestamp)
+                views.append(history.views[index])
+                likes.append(history.likes[index])
+                rows.append((number, timestamp, history.views[index], history.likes[index]))
+
+            history.times, history.views, history.likes = times, views, likes
+
+        #The compacted segment takes the place of the newest one in a single rename, then the older segments are removed
+        self._segment_number = old_numbers[-1] if old_numbers else 1
+        temporary_path = self._segment_path(self._segment_number) + '.tmp'
+
+        with open(temporary_path, 'wb') as segment:
+
+            segment.write(b''.join(STATS_HISTORY_ROW.pack(*row) for row in rows))
+
+        os.replace(temporary_path, self._segment_path(self._segment_number))
+
+        for number in old_numbers[:-1]:
+
+            os.remove(self._segment_path(number))
+
+        self._segment_number += 1
+        self._segment = open(self._segment_path(self._segment_number), 'ab')
+        self._segment_size = 0
+        self._sealed_segments = 1
+        return len(rows)
+
+    def range(self, video_id, start=None, end=None):
+
+        #Returns the (timestamp, views, likes) rows of the video between start and end, inclusive
+        with self._lock:
+
+            history = self._videos[self._numbers[video_id]] if video_id in self._numbers else None
+
+            if history is None:
+
+                return []
+
+            first = 0 if start is None else bisect_left(history.times, start)
+            last = len(history.times) if end is None else bisect_right(history.times, end)
+            return history.rows(first, last)
+
+    def latest(self, video_id):
+
+        with self._lock:
+
+            history = self._videos[self._numbers[video_id]] if video_id in self._numbers else None
+            return history.rows(-1)[0] if history is not None and history.times else None
+
+    def movie_range(self, tmdb_id, start=None, end=None):
+
+        return {history.video_id: self.range(history.video_id, start, end) for history in self._movies.get(str(tmdb_id), ())}
+
+    def movie_latest(self, tmdb_id):
+
+        return {history.video_id: self.latest(history.video_id) for history in self._movies.get(str(tmdb_id), ())}
+
+    def growth(self, video_id, window=None):
+
+        #Views and likes gained per day over the last window seconds, or over the whole history when window is None. 
+        #The last row before the window is the baseline, so the rate covers the full window even between polls. None with fewer than two rows. 
+        with self._lock:
+
+            history = self._videos[self._numbers[video_id]] if video_id in self._numbers else None
+
+            if history is None or len(history.times) < 2:
+
+                return None
+
+            base = 0 if window is None else max(bisect_right(history.times, history.times[-1] - window) - 1, 0)
+
+            if base == len(history.times) - 1:
+
+                base -= 1
+
+            days = (history.times[-1] - history.times[base]) / (24 * 3600)
+            views_change = history.views[-1] - history.views[base]
+            likes_change = history.likes[-1] - history.likes[base]
+
+        return {
+
+            'days': days,
+            'views_change': views_change,
+            'likes_change': likes_change,
+            'views_per_day': views_change / days if days else 0.0,
+            'likes_per_day': likes_change / days if days else 0.0
+
+        }
+
+    def movie_growth(self, tmdb_id, window=None):
+
+        #Sums the growth of the movie's videos, None when none of them has two rows yet
+        growths = [growth for growth in (self.growth(history.video_id, window) for history in self._movies.get(str(tmdb_id), ())) if growth]
+
+        if not growths:
+
+            return None
+
+        return {key: sum(growth[key] for growth in growths) for key in ('views_change', 'likes_change', 'views_per_day', 'likes_per_day')}
+
+    def stats(self):
+
+        with self._lock:
+
+            return {'videos': len(self._videos), 'movies': len(self._movies), 'rows': sum(len(history.times) for history in self._videos), 'segments': len(self._segment_numbers())}
+
+    def close(self):
+
+        with self._lock:
+
+            self._segment.close()
+            self._registry.close()
+
+#Requests per second, burst size and daily quota of each source. OMDb's free tier allows 1,000 requests a day and YouTube 10,000 quota units
+DEFAULT_RATE_LIMITS = {
+
+    'tmdb': {'rate': 40, 'burst': 40, 'daily_quota': None},
+    'imdb': {'rate': 10, 'burst': 10, 'daily_quota': 1000},
+    'youtube': {'rate': 10, 'burst': 10, 'daily_quota': 10000}
+
+}
+
+#Quota units charged per request for each endpoint, endpoints not listed cost one unit. A YouTube search costs 100 units and a videos lookup 1
+ENDPOINT_QUOTA_COSTS = {'youtube.search': 100, 'youtube.videos': 1}
+
+class QuotaExceededError(Exception):
+
+    #Raised when a source's daily quota is used up, the integration keeps the results it already has instead of stopping
+
+    pass
+
+class CircuitOpenError(Exception):
+
+    #Raised without sending the request when a host's circuit is open because its recent requests kept failing
+
+    pass
+
+class CircuitBreaker:
+
+    #Stops sending requests to a host that keeps failing. After failure_threshold failed calls in a row the host's circuit opens and calls to it fail at once. 
+    #Every reset_timeout seconds one trial call is let through, a success closes the circuit again and a failure keeps it open. 
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def before_request(self, host):
+
+        with self._lock:
+
+            state = self.hosts.get(host)
+
+            if state is None or state['opened_at'] is None:
+
+                return
+
+            remaining = state['opened_at'] + self.reset_timeout - self.clock()
+
+            if remaining > 0:
+
+                state['rejected'] += 1
+                raise CircuitOpenError(f"{host} is unavailable, failing fast for another {remaining:.0f}s")
+
+            #Lets this call through as the trial and re-arms the timer, so the other callers keep failing fast until it finishes
+            state['opened_at'] = self.clock()
+            state['trial'] = True
+
+    def record_success(self, host):
+
+        with self._lock:
+
+            state = self.hosts.get(host)
+
+            if state is not None:
+
+                state.update(failures=0, opened_at=None, trial=False)
+
+    def record_failure(self, host):
+
+        with self._lock:
+
+            state = self.hosts.setdefault(host, {'failures': 0, 'opened_at': None, 'trial': False, 'rejected': 0})
+            state['failures'] += 1
+
+            if state['trial'] or state['failures'] >= self.failure_threshold:
+
+                state['opened_at'] = self.clock()
+                state['trial'] = False
+
+    def state(self, host):
+
+        with self._lock:
+
+            state = self.hosts.get(host)
+
+            if state is None or state['opened_at'] is None:
+
+                return 'closed'
+
+            return 'open' if state['opened_at'] + self.reset_timeout > self.clock() else 'half-open'
+
+#Server errors worth retrying, other statuses are returned to the data source as they are
+RETRYABLE_STATUS_CODES = (500, 502, 503, 504)
+
+#Connection failures and timeouts worth retrying with the synchronous transport
+RETRYABLE_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+def _backoff_seconds(attempt, base_delay=0.5, max_delay=30):
+
+    #Exponential backoff with full jitter, so callers that failed together do not retry together
+    return random.uniform(0, min(base_delay * 2 ** attempt, max_delay))
+
+class TokenBucket:
+
+    #Allows rate requests per second on average with bursts of up to burst requests
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+
+        self.rate = self.max_rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+
+        #Blocks until enough tokens have built up, then takes them
+        wait = self.reserve(tokens)
+
+        while wait > 0:
+
+            self.sleep(wait)
+            wait = self.reserve(tokens)
+
+    def reserve(self, tokens=1):
+
+        #Takes the tokens if they are available and returns 0, otherwise returns how long to wait before trying again
+        with self._lock:
+
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            #The small tolerance stops float rounding from leaving the bucket a hair short forever
+            if self.tokens >= tokens - 1e-9:
+
+                self.tokens = max(self.tokens - tokens, 0.0)
+                return 0
+
+            return (tokens - self.tokens) / self.rate
+
+    def slow_down(self):
+
+        #Halves the rate after the server answers 429, down to one request every ten seconds
+        with self._lock:
+
+            self.rate = max(self.rate / 2, 0.1)
+
+    def speed_up(self):
+
+        #Recovers the rate a little after every successful request, up to the configured rate
+        with self._lock:
+
+            self.rate = min(self.rate * 1.05, self.max_rate)
+
+#Time zone each source's daily quota resets in. The YouTube quota resets at midnight Pacific Time, the other quotas are counted by UTC day
+QUOTA_TIME_ZONES = {'youtube': 'America/Los_Angeles'}
+
+def _quota_day(time_zone=None, timestamp=None):
+
+    #Today's date (YYYY-MM-DD) in the time zone, the key the day's quota usage is stored under
+    now = datetime.fromtimestamp(time.time() if timestamp is None else timestamp, timezone.utc)
+    return (now.astimezone(ZoneInfo(time_zone)) if time_zone else now).strftime('%Y-%m-%d')
+
+class RateLimiter:
+
+    #Adaptive token bucket per source plus a daily quota budget measured in each endpoint's quota units. 
+    #A request is charged once however many times it is retried: the budget counts logical requests, while each attempt still waits for a token. 
+
+    def __init__(self, limits=None, costs=None, clock=time.monotonic, sleep=time.sleep, today=None, usage_store=None):
+
+        self.limits = {source: dict(limit) for source, limit in DEFAULT_RATE_LIMITS.items()}
+
+        for source, limit in (limits or {}).items():
+
+            self.limits.setdefault(source, {'rate': 10, 'burst': 10, 'daily_quota': None}).update(limit)
+
+        self.costs = dict(ENDPOINT_QUOTA_COSTS)
+        self.costs.update(costs or {})
+        self.buckets = {source: TokenBucket(limit['rate'], limit['burst'], clock, sleep) for source, limit in self.limits.items()}
+        self.sleep = sleep
+        #Returns the current quota day. Without it each source's day follows QUOTA_TIME_ZONES, a function given here is used for every source
+        self.today = today
+        #Optional store, such as the ResponseCache, that keeps the day's usage so one-shot runs share the daily budget
+        self.usage_store = usage_store
+        self.days = {}
+        self.quota_used = defaultdict(int)
+        self._lock = threading.Lock()
+
+        for source in self.limits:
+
+            self._roll_over(source)
+
+    def acquire(self, source, endpoint=None, charge=True):
+
+        #Charges the endpoint's cost against the daily quota, then waits for the source's token bucket. Retries pass charge=False
+        if charge:
+
+            self.charge(source, self.costs.get(endpoint, 1))
+
+        if source in self.buckets:
+
+            self.buckets[source].acquire()
+
+    async def acquire_async(self, source, endpoint=None, charge=True):
+
+        #Same as acquire but waits on the event loop instead of blocking the thread
+        if charge and self.usage_store is not None:
+
+            #Persisting the usage writes to SQLite, which is done in a worker thread instead of on the event loop
+            await asyncio.to_thread(self.charge, source, self.costs.get(endpoint, 1))
+
+        elif charge:
+
+            self.charge(source, self.costs.get(endpoint, 1))
+
+        wait = self.wait_time(source)
+
+        while wait > 0:
+
+            await asyncio.sleep(wait)
+            wait = self.wait_time(source)
+
+    def wait_time(self, source):
+
+        #Takes a token from the source's bucket and returns 0, or returns how long to wait before asking again
+        return self.buckets[source].reserve() if source in self.buckets else 0
+
+    def charge(self, source, units):
+
+        with self._lock:
+
+            self._roll_over(source)
+            quota = self.limits.get(source, {}).get('daily_quota')
+
+            if quota is not None and self.quota_used[source] + units > quota:
+
+                raise QuotaExceededError(f"{source} daily quota exhausted")
+
+            self._use(source, units)
+
+    def exhaust(self, source):
+
+        #Marks the source's quota as used up, for when the API itself reports that the quota ran out
+        with self._lock:
+
+            self._roll_over(source)
+            quota = self.limits.get(source, {}).get('daily_quota')
+
+            if quota is not None and self.quota_used[source] < quota:
+
+                self._use(source, quota - self.quota_used[source])
+
+    def _use(self, source, units):
+
+        self.quota_used[source] += units
+
+        #Only sources with a daily quota are persisted
+        if self.usage_store is not None and self.limits.get(source, {}).get('daily_quota') is not None:
+
+            self.usage_store.add_quota_usage(self.days[source], source, units)
+
+    def _roll_over(self, source):
+
+        #The quota counters start over every day, in the time zone the source's quota resets in. Called with the lock held
+        day = self.today() if self.today is not None else _quota_day(QUOTA_TIME_ZONES.get(source))
+
+        if self.days.get(source) != day:
+
+            self.days[source] = day
+            self.quota_used[source] = self.usage_store.load_quota_usage(day).get(source, 0) if self.usage_store is not None else 0
+
+    def quota_remaining(self, source):
+
+        with self._lock:
+
+            self._roll_over(source)
+            quota = self.limits.get(source, {}).get('daily_quota')
+            return None if quota is None else max(quota - self.quota_used[source], 0)
+
+    def throttled(self, source):
+
+        if source in self.buckets:
+
+            self.buckets[source].slow_down()
+
+    def succeeded(self, source):
+
+        if source in self.buckets:
+
+            self.buckets[source].speed_up()
+
+def _retry_after_seconds(response, attempt, base_delay=0.5, max_delay=60):
+
+    #Reads the Retry-After header (seconds or an HTTP date), falling back to exponential backoff
+    retry_after = response.headers.get('Retry-After')
+
+    if retry_after:
+
+        try:
+
+            return min(max(float(retry_after), 0), max_delay)
+
+        except ValueError:
+
+            try:
+
+                return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0), max_delay)
+
+            except (TypeError, ValueError):
+
+                pass
+
+    return min(base_delay * 2 ** attempt, max_delay)
+
+#Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Instrumentation:
+
+    #Records an event for every API call and the time spent in each stage of a run. 
+    #Keeps Prometheus style counters and latency histograms, an optional JSON trace, and calls every registered hook with each event. 
+
+    def __init__(self, keep_trace=False):
+
+        self.hooks = []
+        self.trace = [] if keep_trace else None
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.request_totals = defaultdict(lambda: {'calls': 0, 'seconds': 0.0, 'bytes': 0, 'retries': 0, 'cache_hits': 0, 'errors': 0})
+        self.stage_totals = defaultdict(lambda: {'runs': 0, 'seconds': 0.0})
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+
+        #The hook is called with each event dictionary, from whichever thread made the call
+        self.hooks.append(hook)
+
+    def record_request(self, source, endpoint, latency, payload_bytes, status, retries=0, cache_hit=False):
+
+        event = {
+
+            'type': 'request',
+            'timestamp': time.time(),
+            'source': source,
+            'endpoint': endpoint or source,
+            'latency': latency,
+            'payload_bytes': payload_bytes,
+            'status': status,
+            'retries': retries,
+            'cache_hit': cache_hit
+
+        }
+
+        with self._lock:
+
+            labels = (('source', source), ('endpoint', event['endpoint']))
+            self.counters[('api_requests_total', labels + (('status', str(status)),))] += 1
+            self.counters[('api_payload_bytes_total', labels)] += payload_bytes
+            self.counters[('api_retries_total', labels)] += retries
+            self.counters[('api_cache_hits_total', labels)] += 1 if cache_hit else 0
+            self._observe('api_request_duration_seconds', labels, latency)
+
+            totals = self.request_totals[event['endpoint']]
+            totals['calls'] += 1
+            totals['seconds'] += latency
+            totals['bytes'] += payload_bytes
+            totals['retries'] += retries
+            totals['cache_hits'] += 1 if cache_hit else 0
+            totals['errors'] += 0 if status == 200 else 1
+
+        self._emit(event)
+
+    @contextmanager
+    def stage(self, name):
+
+        #Times a stage of the run, nested stages and repeated runs of a stage add up
+        started = time.perf_counter()
+
+        try:
+
+            yield
+
+        finally:
+
+            duration = time.perf_counter() - started
+
+            with self._lock:
+
+                self.stage_totals[name]['runs'] += 1
+                self.stage_totals[name]['seconds'] += duration
+                self.counters[('stage_seconds_total', (('stage', name),))] += duration
+
+            self._emit({'type': 'stage', 'timestamp': time.time(), 'stage': name, 'duration': duration})
+
+    def _observe(self, name, labels, value):
+
+        histogram = self.histograms.setdefault((name, labels), {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+
+        for index, bound in enumerate(LATENCY_BUCKETS):
+
+            if value <= bound:
+
+                histogram['buckets'][index] += 1
+
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+    def _emit(self, event):
+
+        if self.trace is not None:
+
+            with self._lock:
+
+                self.trace.append(event)
+
+        for hook in self.hooks:
+
+            hook(event)
+
+    def summary(self):
+
+        #Per stage and per endpoint roll up of the time spent
+        with self._lock:
+
+            return {
+
+                'stages': {name: dict(totals) for name, totals in self.stage_totals.items()},
+                'requests': {endpoint: dict(totals) for endpoint, totals in self.request_totals.items()}
+
+            }
+
+    def render_prometheus(self):
+
+        #Renders the counters and histograms in the Prometheus text exposition format
+        lines = []
+
+        with self._lock:
+
+            for (name, labels), value in sorted(self.counters.items()):
+
+                lines.append(f'{name}{_format_labels(labels)} {value:g}')
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+
+                for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", f"{bound:g}"),))} {count}')
+
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]:g}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def dump_trace(self, path):
+
+        with self._lock:
+
+            events = list(self.trace or [])
+
+        with open(path, 'w', encoding='utf-8') as trace_file:
+
+            json.dump(events, trace_file, indent=1)
+
+def _format_labels(labels):
+
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}' if labels else ''
+
+class SingleFlight:
+
+    #Collapses identical calls made at the same time from several threads into one. The first caller runs the call and the others wait for its result
+
+    def __init__(self):
+
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args):
+
+        with self._lock:
+
+            call = self._in_flight.get(key)
+            leader = call is None
+
+            if leader:
+
+                call = self._in_flight[key] = {'done': threading.Event(), 'result': None, 'error': None}
+                self.calls += 1
+
+            else:
+
+                self.coalesced += 1
+
+        if not leader:
+
+            #Waits for the caller already running the call and shares its result or error
+            call['done'].wait()
+
+            if call['error'] is not None:
+
+                raise call['error']
+
+            return call['result']
+
+        try:
+
+            call['result'] = function(*args)
+            return call['result']
+
+        except BaseException as e:
+
+            call['error'] = e
+            raise
+
+        finally:
+
+            with self._lock:
+
+                del self._in_flight[key]
+
+            call['done'].set()
+
+    def stats(self):
+
+        return {'calls': self.calls, 'coalesced': self.coalesced}
+
+class AsyncSingleFlight:
+
+    #Asyncio version of SingleFlight, callers waiting on the same key await the same task
+
+    def __init__(self):
+
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    async def do(self, key, function, *args):
+
+        task = self._in_flight.get(key)
+
+        if task is None:
+
+            task = self._in_flight[key] = asyncio.ensure_future(function(*args))
+            task.add_done_callback(lambda finished: self._in_flight.pop(key, None) if self._in_flight.get(key) is finished else None)
+            self.calls += 1
+
+        else:
+
+            self.coalesced += 1
+
+        #Shielded so one caller being cancelled does not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def stats(self):
+
+        return {'calls': self.calls, 'coalesced': self.coalesced}
+
+class _RequestAttempts:
+
+    #Retry policy of one logical request, shared by HTTPTransport and AsyncHTTPTransport. The transport sends each attempt and does the waiting, 
+    #this decides whether and how long to wait before the next one and keeps the circuit breaker, rate limiter and instrumentation up to date. 
+
+    def __init__(self, transport, source, url, endpoint):
+
+        self.transport = transport
+        self.source = source
+        self.endpoint = endpoint
+        self.host = urlsplit(url).netloc
+        transport.circuit_breaker.before_request(self.host)
+        self.started = time.perf_counter()
+        self.response = None
+        self.attempts = self.throttles = self.failures = 0
+
+    def start(self):
+
+        #Counts a new attempt and returns whether it is a retry, which waits for the rate limiter without being charged again
+        self.attempts += 1
+        return self.attempts > 1
+
+    def failed(self, error, retryable_exceptions):
+
+        #Returns the backoff before retrying a connection failure or timeout, or None when the error should be raised
+        self.response = None
+
+        if isinstance(error, retryable_exceptions) and self.failures < self.transport.max_retries:
+
+            return self._backoff()
+
+        self.transport.circuit_breaker.record_failure(self.host)
+        return None
+
+    def answered(self, response):
+
+        #Returns the wait before retrying the response, or None when the response is final
+        self.response = response
+        rate_limiter = self.transport.rate_limiter
+
+        if response.status_code == 429:
+
+            #Throttled by the server, slows the source down and waits as long as the server asks before trying again
+            if rate_limiter is not None:
+
+                rate_limiter.throttled(self.source)
+
+            if self.throttles < self.transport.max_throttle_retries:
+
+                self.throttles += 1
+                return _retry_after_seconds(response, self.throttles - 1)
+
+        elif response.status_code in RETRYABLE_STATUS_CODES and self.failures < self.transport.max_retries:
+
+            return self._backoff()
+
+        elif rate_limiter is not None:
+
+            rate_limiter.succeeded(self.source)
+
+        if response.status_code in RETRYABLE_STATUS_CODES:
+
+            self.transport.circuit_breaker.record_failure(self.host)
+
+        else:
+
+            self.transport.circuit_breaker.record_success(self.host)
+
+        return None
+
+    def _backoff(self):
+
+        delay = _backoff_seconds(self.failures, self.transport.retry_base_delay)
+        self.failures += 1
+        return delay
+
+    def record(self):
+
+        #Records the call once with every retry it took, a call that raised is recorded with an error status
+        instrumentation = self.transport.instrumentation
+        response = self.response
+
+        if instrumentation is not None:
+
+            instrumentation.record_request(self.source, self.endpoint, time.perf_counter() - self.started, len(response.content) if response is not None else 0, response.status_code if response is not None else 'error', max(self.attempts - 1, 0))
+
+class HTTPTransport:
+
+    #Shared HTTP layer for the data sources. Keeps one persistent session per host so connections are kept alive and reused
+
+    def __init__(self, pool_size=10, timeouts=None, cache=None, rate_limiter=None, max_throttle_retries=3, single_flight=None, instrumentation=None, max_retries=2, retry_base_delay=0.5, circuit_breaker=None):
+
+        #pool_size is the number of connections kept open per host, it should be at least the number of concurrent workers for that source
+        self.pool_size = pool_size
+        self.timeouts = dict(DEFAULT_SOURCE_TIMEOUTS)
+
+        if timeouts:
+
+            self.timeouts.update(timeouts)
+
+        #Optional response cache, requests for endpoints with a TTL are looked up in it before going to the network
+        self.cache = cache
+        #Optional rate limiter, every request that goes to the network waits for its source's budget first
+        self.rate_limiter = rate_limiter
+        self.max_throttle_retries = max_throttle_retries
+        self.single_flight = single_flight or SingleFlight()
+        #Optional instrumentation, every call is recorded with its latency, size, status, retries and whether the cache served it
+        self.instrumentation = instrumentation
+        #Connection failures, timeouts and 5xx answers are retried up to max_retries times with jittered backoff. 
+        #The circuit breaker then fails calls to a host that keeps failing straight away instead of waiting on more timeouts. 
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.sleep = time.sleep
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url):
+
+        #Returns the session for the host of the URL, creating it on first use
+        host = urlsplit(url).netloc
+
+        with self._lock:
+
+            session = self.sessions.get(host)
+
+            if session is None:
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+                self.sessions[host] = session
+
+        return session
+
+    def get(self, source, url, params=None, endpoint=None):
+
+        #Serves the response from the cache when the endpoint is cacheable and a fresh copy is stored
+        cache_key = None
+
+        if self.cache is not None and endpoint and self.cache.ttl_for(endpoint) > 0:
+
+            cache_key = ResponseCache.make_key(url, params)
+            content = self.cache.get(endpoint, cache_key)
+
+            if content is not None:
+
+                if self.instrumentation is not None:
+
+                    self.instrumentation.record_request(source, endpoint, 0.0, len(content), 200, cache_hit=True)
+
+                return BufferedResponse(content, from_cache=True)
+
+        #Identical requests made at the same time share one trip to the network
+        return self.single_flight.do(ResponseCache.make_key(url, params), self._fetch, source, url, params, endpoint, cache_key)
+
+    def _fetch(self, source, url, params, endpoint, cache_key):
+
+        #The quota is charged once, before the circuit breaker or the instrumentation see the request, 
+        #so a request refused by the limiter was never sent and is not recorded
+        if self.rate_limiter is not None:
+
+            self.rate_limiter.acquire(source, endpoint)
+
+        attempt = _RequestAttempts(self, source, url, endpoint)
+
+        try:
+
+            while True:
+
+                if attempt.start() and self.rate_limiter is not None:
+
+                    self.rate_limiter.acquire(source, endpoint, charge=False)
+
+                try:
+
+                    #Performs the HTTP GET request through the host's session using the timeout of the source
+                    response = self.session_for(url).get(url, params=params, timeout=self.timeouts.get(source))
+
+                except Exception as e:
+
+                    delay = attempt.failed(e, RETRYABLE_EXCEPTIONS)
+
+                    if delay is None:
+
+                        raise
+
+                else:
+
+                    delay = attempt.answered(response)
+
+                    if delay is None:
+
+                        break
+
+                self.sleep(delay)
+
+            #Only successful responses are cached so errors are retried on the next run
+            if cache_key is not None and response.status_code == 200:
+
+                self.cache.set(endpoint, cache_key, response.content)
+
+            return response
+
+        finally:
+
+            attempt.record()
+
+    def connection_stats(self):
+
+        #Counts the connections opened against the requests sent through the pools, every request past the first one on a connection reused it
+        opened = sent = 0
+
+        for session in list(self.sessions.values()):
+
+            for adapter in set(session.adapters.values()):
+
+                pools = adapter.poolmanager.pools
+
+                for key in pools.keys():
+
+                    pool = pools.get(key)
+
+                    if pool is not None:
+
+                        opened += pool.num_connections
+                        sent += pool.num_requests
+
+        return {'sessions': len(self.sessions), 'requests': sent, 'connections_opened': opened, 'connections_reused': max(sent - opened, 0)}
+
+    def close(self):
+
+        #Closes every session and the connections they hold
+        with self._lock:
+
+            for session in self.sessions.values():
+
+                session.close()
+
+            self.sessions = {}
+
+class AsyncHTTPTransport:
+
+    #Asyncio counterpart of HTTPTransport built on aiohttp. One client session with a pooled keep-alive connector is shared by the async data sources
+
+    def __init__(self, max_in_flight=1000, timeouts=None, cache=None, rate_limiter=None, max_throttle_retries=3, single_flight=None, instrumentation=None, max_retries=2, retry_base_delay=0.5, circuit_breaker=None):
+
+        #max_in_flight bounds the number of requests waiting on the network at any moment across all sources
+        self.max_in_flight = max_in_flight
+        self.timeouts = dict(DEFAULT_SOURCE_TIMEOUTS)
+
+        if timeouts:
+
+            self.timeouts.update(timeouts)
+
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.max_throttle_retries = max_throttle_retries
+        self.single_flight = single_flight or AsyncSingleFlight()
+        self.instrumentation = instrumentation
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.session = None
+        self._semaphore = None
+
+    def _ensure_session(self):
+
+        #The session and semaphore are created on first use so they belong to the running event loop
+        if self.session is None:
+
+            if aiohttp is None:
+
+                raise ImportError("aiohttp is required for the async data sources, install it with 'pip install aiohttp'")
+
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+            self.session = aiohttp.ClientSession(connector=connector, headers={'Accept-Encoding': 'gzip, deflate'})
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        return self.session
+
+    async def get(self, source, url, params=None, endpoint=None):
+
+        #Serves the response from the cache when the endpoint is cacheable and a fresh copy is stored
+        cache_key = None
+
+        if self.cache is not None and endpoint and self.cache.ttl_for(endpoint) > 0:
+
+            cache_key = ResponseCache.make_key(url, params)
+            #The SQLite cache is read and written in a worker thread so a slow disk never stalls the event loop
+            content = await asyncio.to_thread(self.cache.get, endpoint, cache_key)
+
+            if content is not None:
+
+                if self.instrumentation is not None:
+
+                    self.instrumentation.record_request(source, endpoint, 0.0, len(content), 200, cache_hit=True)
+
+                return BufferedResponse(content, from_cache=True)
+
+        #Identical requests made at the same time share one trip to the network
+        return await self.single_flight.do(ResponseCache.make_key(url, params), self._fetch, source, url, params, endpoint, cache_key)
+
+    async def _fetch(self, source, url, params, endpoint, cache_key):
+
+        if self.rate_limiter is not None:
+
+            await self.rate_limiter.acquire_async(source, endpoint)
+
+        attempt = _RequestAttempts(self, source, url, endpoint)
+        session = self._ensure_session()
+        timeout = aiohttp.ClientTimeout(total=self.timeouts.get(source))
+
+        try:
+
+            while True:
+
+                if attempt.start() and self.rate_limiter is not None:
+
+                    await self.rate_limiter.acquire_async(source, endpoint, charge=False)
+
+                try:
+
+                    async with self._semaphore:
+
+                        async with session.get(url, params=params, timeout=timeout) as raw_response:
+
+                            response = BufferedResponse(await raw_response.read(), raw_response.status, dict(raw_response.headers))
+
+                except Exception as e:
+
+                    delay = attempt.failed(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+                    if delay is None:
+
+                        raise
+
+                else:
+
+                    delay = attempt.answered(response)
+
+                    if delay is None:
+
+                        break
+
+                await asyncio.sleep(delay)
+
+            if cache_key is not None and response.status_code == 200:
+
+                await asyncio.to_thread(self.cache.set, endpoint, cache_key, response.content)
+
+            return response
+
+        finally:
+
+            attempt.record()
+
+    async def close(self):
+
+        if self.session is not None:
+
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+
+        return self
+
+    async def __aexit__(self, *exc_info):
+
+        await self.close()
+
+#Maximum number of video IDs the YouTube videos endpoint accepts in one request
+YOUTUBE_MAX_IDS_PER_REQUEST = 50
+
+#Stats returned for a video whose details could not be fetched
+
+#Partial responses requested from YouTube, only the parts the parsers read are sent back
+YOUTUBE_SEARCH_FIELDS = 'items(id/videoId)'
+YOUTUBE_VIDEOS_FIELDS = 'items(id,snippet(title,channelTitle),statistics(viewCount,likeCount))'
+
+#Keys the movie info is built from, the rest of the OMDb response is dropped while parsing
+OMDB_INFO_PARSED_KEYS = ('Director', 'Actors', 'imdbVotes', 'imdbRating', 'Response')
+
+#json.loads calls these hooks with every decoded object, innermost first, and uses what they return in place of the object. 
+#The hooks save memory, not CPU: the whole response is still decoded and each object costs a Python call, about 20% more decode time than json.loads alone. 
+def _project_details_object(data):
+
+    #Crew members other than the director and cast members other than the lead become None, so the full credits are never held at once
+    if 'job' in data:
+
+        return data if data['job'] == 'Director' else None
+
+    if 'order' in data:
+
+        return data if data['order'] == 0 else None
+
+    return data
+
+def _project_omdb_object(data):
+
+    return {key: data[key] for key in OMDB_INFO_PARSED_KEYS if key in data}
 
 class YouTubeDataSource:
 
-    #Fetches data related to videos from the YouTube Api
+    #Fetches data related to videos from the YouTube Api
+
+    def __init__(self, api_key, transport=None):
+
+        #Initializes the data source with a given YouTube API key and sets the base URL for the YouTube API
+
+        self.api_key = api_key
+        self.transport = transport or HTTPTransport()
+        self.base_url = 'https://www.googleapis.com/youtube/v3/'
+
+    def search_videos_by_title(self, title):
+
+        #Search YouTube for videos matching the given movie title and returns their IDs.
+
+        #Constructs the search URL with the API key and search title and asks to recieve 3 videos from YouTube
+        search_url = self._search_url(title)
+        #Performs the HTTP GET request to the YouTube API
+        response = self.transport.get('youtube', search_url, endpoint='youtube.search') 
+
+        return self._parse_search_response(response)
+
+    def _search_url(self, title):
+
+        #fields asks YouTube to leave everything but the video IDs out of the response
+        return f'{self.base_url}search?key={self.api_key}&q={title}&part=snippet&type=video&maxResults=3&fields={YOUTUBE_SEARCH_FIELDS}'
+
+    def _stats_url(self, video_ids):
+
+        return f'{self.base_url}videos?key={self.api_key}&id={",".join(video_ids)}&part=statistics,snippet&fields={YOUTUBE_VIDEOS_FIELDS}'
+
+    def _parse_search_response(self, response):
+
+        #Checks the response status code is accepted
+        if response.status_code == 200:
+
+            #Extracts the video IDs from the search results and returns them as a list
+            return [item['id']['videoId'] for item in json.loads(response.content)['items']]
+        
+        elif response.status_code == 403:  # Assuming 403 is the status code for quota exceeded
+
+            if self.transport.rate_limiter is not None:
+
+                self.transport.rate_limiter.exhaust('youtube')
+
+            raise QuotaExceededError("YouTube API quota exceeded")
+        
+        else:
+            
+            return []  # Return an empty list or consider raising a different exception for other error conditions
+
+    def fetch_video_stats(self, video_id):
+
+        #Fetches statistics for a given video ID
+
+        #Constructs the URL to get the video statistics and snippet information using the video ID
+        stats_url = self._stats_url([video_id])
+        #Performs the HTTP GET request to the YouTube API
+        response = self.transport.get('youtube', stats_url, endpoint='youtube.videos')
+
+        #Returns None if the request was unsuccessful or the API returned nothing for the video, so no zeroed stats can pass for real ones. 
+        return self._parse_stats_batch_response(response).get(video_id)
+
+    def fetch_video_stats_batch(self, video_ids):
+
+        #Fetches statistics for many video IDs at once and returns them in a dictionary keyed by video ID. 
+        #The videos endpoint accepts up to 50 comma separated IDs, so this makes one request per 50 distinct IDs instead of one per video. 
+
+        stats = {}
+        unique_ids = list(dict.fromkeys(video_ids))
+
+        for start in range(0, len(unique_ids), YOUTUBE_MAX_IDS_PER_REQUEST):
+
+            chunk = unique_ids[start:start + YOUTUBE_MAX_IDS_PER_REQUEST]
+            response = self.transport.get('youtube', self._stats_url(chunk), endpoint='youtube.videos')
+            stats.update(self._parse_stats_batch_response(response))
+
+        #Videos missing from the responses are left out, so a missing video is never mistaken for one with no views
+        return {video_id: stats[video_id] for video_id in unique_ids if video_id in stats}
+
+    def _parse_stats_batch_response(self, response):
+
+        if response.status_code == 200:
+
+            return {item['id']: self._parse_video_stats(item) for item in json.loads(response.content).get('items', [])}
+
+        return {}
+
+    def _parse_video_stats(self, item):
+
+        #Extracts the statistics part of the item
+        stats_data = item['statistics']
+        #Extracts the snippet part of the item which contains the title and channel information. 
+        snippet = item['snippet']
+
+        return {
+
+            #Returns a dictionary containing the channel name, video title, view count, and like count. 
+
+            'channelName': snippet['channelTitle'],
+            'videoTitle': snippet['title'],
+            'views': int(stats_data.get('viewCount', 0)),
+            'likes': int(stats_data.get('likeCount', 0))
+
+        }
+
+#Number of movies TMDb returns on each page of the popular list, and the last page it will serve
+TMDB_PAGE_SIZE = 20
+TMDB_MAX_POPULAR_PAGES = 500
+
+#Number of movies taken from a daily ID export when no count is given
+DEFAULT_SEED_MOVIES = 100
+
+class TMDbDataSource:
+
+    #Fetches movie data from the TMDb API
+
+    def __init__(self, api_key, transport=None):
+
+        #Initializes the data source with a given TMDb API key and sets the base URL for the TMDb API
+
+        self.api_key = api_key
+        self.transport = transport or HTTPTransport()
+        self.base_url = 'https://api.themoviedb.org/3/'
+
+    def fetch_most_popular_movies(self):
+
+        #Fetches the most popular movies
+
+        try: 
+        
+            #Constructs the URL to get the list of popular movies on the first page with the API key
+            url = f"{self.base_url}movie/popular?api_key={self.api_key}&language=en-US&page=1"
+            #Performs the HTTP GET request to the YouTube API
+            response = self.transport.get('tmdb', url, endpoint='tmdb.popular')
+
+            #Checks the response status code is accepted
+            if response.status_code == 200:
+
+                #Extracts the top 3 popular movies from the response and returns them. 
+                return response.json()['results'][:3]  
+        
+            else:
+            
+                #Returns an empty list if the request was unsuccessful
+                return []
+            
+        except Exception as e:
+
+            print(f"Error fetching most popular movies: {e}")
+            return 'Possible Network Error'
+
+    def fetch_popular_movies_page(self, page):
+
+        #Fetches one page of the popular movies list and returns its movies along with the total number of pages
+        url = self._popular_url(page)
+        response = self.transport.get('tmdb', url, endpoint='tmdb.popular')
+
+        return self._parse_popular_page_response(response, page)
+
+    def _popular_url(self, page):
+
+        return f"{self.base_url}movie/popular?api_key={self.api_key}&language=en-US&page={page}"
+
+    def _parse_popular_page_response(self, response, page):
+
+        if response.status_code == 200:
+
+            data = response.json()
+            return data.get('results', []), data.get('total_pages', page)
+
+        #An unsuccessful page ends the listing
+        return [], 0
+
+    def iter_popular_movies(self, count=20, prefetch=1):
+
+        #Yields up to count popular movies, paging through the list lazily. 
+        #Up to prefetch pages are requested in the background while the current page is being consumed. 
+
+        pages_needed = min(-(-count // TMDB_PAGE_SIZE), TMDB_MAX_POPULAR_PAGES)
+        pending = deque()
+        next_page = 1
+        yielded = 0
+
+        with ThreadPoolExecutor(max_workers=max(prefetch, 1)) as pool:
+
+            while yielded < count:
+
+                #Keeps the current page and up to prefetch more pages in flight
+                while next_page <= pages_needed and len(pending) <= prefetch:
+
+                    pending.append((next_page, pool.submit(self.fetch_popular_movies_page, next_page)))
+                    next_page += 1
+
+                if not pending:
+
+                    return
+
+                page, future = pending.popleft()
+
+                #A page that cannot be fetched ends the listing, the movies already yielded are still integrated
+                try:
+
+                    movies, total_pages = future.result()
+
+                except Exception as e:
+
+                    print(f"Stopped listing popular movies at page {page}: {e}")
+                    return
+
+                pages_needed = min(pages_needed, total_pages)
+
+                #Pages prefetched past the end of the list are dropped
+                if not movies or page > pages_needed:
+
+                    return
+
+                for movie in movies[:count - yielded]:
+
+                    yield movie
+
+                yielded += min(len(movies), count - yielded)
+
+    def fetch_movie_details_with_credits(self, movie_id):
+
+        #Fetches movie details, including credits
+
+        #Constructs the URL to get movie details and credits information using the movie ID
+        details_url = self._details_url(movie_id)
+        #Performs the HTTP GET request to the YouTube API
+        response = self.transport.get('tmdb', details_url, endpoint='tmdb.details')
+
+        return self._parse_details_response(response)
+
+    def _details_url(self, movie_id):
+
+        return f"{self.base_url}movie/{movie_id}?api_key={self.api_key}&append_to_response=credits"
+
+    def _parse_details_response(self, response):
+
+        #Checks the response status code is accepted
+        if response.status_code == 200:
+
+            #Every cast and crew entry other than the director and the lead actor is dropped as soon as it is decoded
+            data = json.loads(response.content, object_hook=_project_details_object)
+            
+            #Extracts the director's name from the crewq list where the job title is 'Directore
+            director = next((crew['name'] for crew in data['credits']['crew'] if crew), None)
+            #Extracts the lead actor's name from the cast list based on the order. This is usually the first person on the cast list so index[0]. 
+            lead_actor = next((cast['name'] for cast in data['credits']['cast'] if cast), None)
+            #Extracts the movie's budget, defaults to 0 if not available. 
+            budget = data.get('budget', 0)
+
+            details = {
+
+                #Returns a dictionary containing information about the movie. 
+
+                'title': data['title'],
+                'average_rating': data['vote_average'],
+                'number_of_ratings': data['vote_count'],
+                'director': director,
+                'lead_actor': lead_actor,
+                'budget': budget
+
+            }
+
+            #TMDb includes the IMDb ID with the details when it knows it, so OMDb can be queried by ID instead of by title
+            if data.get('imdb_id'):
+
+                details['imdb_id'] = data['imdb_id']
+
+            return details
+        
+        else:
+
+            #Returns None if the request to fetch movie details was unsuccessful. 
+            return None
+
+def iter_tmdb_export(path, include_adult=False):
+
+    #Streams the movies of a TMDb daily ID export, a gzipped file with one JSON object per line such as 
+    #{"adult": false, "id": 3924, "original_title": "Blondie", "popularity": 2.129, "video": false}. 
+    #The file is decompressed and parsed a line at a time, so the full catalogue is never held in memory. 
+    with (gzip.open if path.endswith('.gz') else open)(path, 'rt', encoding='utf-8') as export_file:
+
+        try:
+
+            for line in export_file:
+
+                try:
+
+                    movie = json.loads(line)
+
+                except ValueError:
+
+                    #Blank lines, or the partial line left where a truncated file ends
+                    continue
+
+                if movie.get('adult') and not include_adult:
+
+                    continue
+
+                yield movie
+
+        except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+
+            #An interrupted download cuts the compressed stream short, the movies read up to that point are still used
+            print(f"Stopped reading {path} early, the file is truncated or corrupt: {e}")
+
+def top_exported_movies(path, count, include_adult=False):
+
+    #Picks the count most popular movies of a TMDb daily ID export with a heap of size count, in O(n log count). 
+    #The entries have no 'title', only the 'original_title', so the searches use the English title from the movie details. 
+    top = heapq.nlargest(count, iter_tmdb_export(path, include_adult), key=lambda movie: movie.get('popularity') or 0)
+    return [{'id': movie['id'], 'original_title': movie.get('original_title'), 'popularity': movie.get('popularity')} for movie in top]
+
+class IMDb:
+
+    def __init__(self, api_key, transport=None):    #initialization
+
+        self.api_key = api_key
+        self.transport = transport or HTTPTransport()
+        self.base_url = "http://www.omdbapi.com/"
+
+    def search(self, title):        #title refers to the movie title
+
+        return self._parse_search_response(self._search_response(title))
+        
+    def get_movie_info(self, title):
+
+        #Keeps only the fields the movie info is built from, the plot and the ratings list are dropped while parsing
+        return self._parse_movie_info(self._parse_search_response(self._search_response(title), _project_omdb_object))
+
+    def get_movie_info_by_id(self, imdb_id):
+
+        #Looks the movie up by its IMDb ID, which is exact where a title search can pick the wrong movie
+        response = self.transport.get('imdb', self.base_url, params = {'apikey': self.api_key, 'i': imdb_id}, endpoint='imdb.lookup')
+        return self._parse_movie_info(self._parse_search_response(response, _project_omdb_object))
+
+    def _search_response(self, title):
+
+        parameters = self._search_parameters(title)
+        return self.transport.get('imdb', self.base_url, params = parameters, endpoint='imdb.search')
+
+    def _search_parameters(self, title):
+
+        return {               # returns movie info in json
+            
+            'apikey': self.api_key,
+            't': title 
+            
+        }
+
+    def _parse_search_response(self, response, object_hook=None):
+
+        if response.status_code == 200:
+
+            try:
+
+                return json.loads(response.content, object_hook=object_hook)
+            
+            except ValueError:
+
+                return None    
+               
+        else:
+
+            return None
+
+    def _parse_movie_info(self, data):
+
+        if data and data.get('Response','False') == 'True':
+
+            return {
+
+                'Director' : data.get('Director', 'N/A'),
+                'Lead Actor' : data.get('Actors', 'N/A').split(',')[0] if data.get('Actors') else 'N/A',
+                'Number of Reviews' : data.get('imdbVotes', 'N/A'),
+                'Average Review' : data.get('imdbRating', 'N/A')
+
+
+            }
+            
+        else:
+
+            return None
+
+class AsyncYouTubeDataSource(YouTubeDataSource):
+
+    #Asyncio version of YouTubeDataSource, it builds the same URLs and parses the responses with the same code
+
+    def __init__(self, api_key, transport=None):
+
+        super().__init__(api_key, transport or AsyncHTTPTransport())
+
+    async def search_videos_by_title(self, title):
+
+        response = await self.transport.get('youtube', self._search_url(title), endpoint='youtube.search')
+        return self._parse_search_response(response)
+
+    async def fetch_video_stats(self, video_id):
+
+        response = await self.transport.get('youtube', self._stats_url([video_id]), endpoint='youtube.videos')
+        return self._parse_stats_batch_response(response).get(video_id)
+
+    async def fetch_video_stats_batch(self, video_ids):
+
+        #Requests every chunk of 50 IDs at the same time
+        unique_ids = list(dict.fromkeys(video_ids))
+        chunks = [unique_ids[start:start + YOUTUBE_MAX_IDS_PER_REQUEST] for start in range(0, len(unique_ids), YOUTUBE_MAX_IDS_PER_REQUEST)]
+        responses = await asyncio.gather(*(self.transport.get('youtube', self._stats_url(chunk), endpoint='youtube.videos') for chunk in chunks))
+        stats = {}
+
+        for response in responses:
+
+            stats.update(self._parse_stats_batch_response(response))
+
+        return {video_id: stats[video_id] for video_id in unique_ids if video_id in stats}
+
+class AsyncTMDbDataSource(TMDbDataSource):
+
+    #Asyncio version of TMDbDataSource, it builds the same URLs and parses the responses with the same code
+
+    def __init__(self, api_key, transport=None):
+
+        super().__init__(api_key, transport or AsyncHTTPTransport())
+
+    async def fetch_most_popular_movies(self):
+
+        try:
+
+            movies, total_pages = await self.fetch_popular_movies_page(1)
+            return movies[:3]
+
+        except Exception as e:
+
+            print(f"Error fetching most popular movies: {e}")
+            return 'Possible Network Error'
+
+    async def fetch_popular_movies_page(self, page):
+
+        response = await self.transport.get('tmdb', self._popular_url(page), endpoint='tmdb.popular')
+        return self._parse_popular_page_response(response, page)
+
+    async def iter_popular_movies(self, count=20, prefetch=1):
+
+        #Async generator over up to count popular movies, with up to prefetch pages requested ahead
+        pages_needed = min(-(-count // TMDB_PAGE_SIZE), TMDB_MAX_POPULAR_PAGES)
+        pending = deque()
+        next_page = 1
+        yielded = 0
+
+        try:
+
+            while yielded < count:
+
+                while next_page <= pages_needed and len(pending) <= prefetch:
+
+                    pending.append((next_page, asyncio.ensure_future(self.fetch_popular_movies_page(next_page))))
+                    next_page += 1
+
+                if not pending:
+
+                    return
+
+                page, task = pending.popleft()
+
+                try:
+
+                    movies, total_pages = await task
+
+                except Exception as e:
+
+                    print(f"Stopped listing popular movies at page {page}: {e}")
+                    return
+
+                pages_needed = min(pages_needed, total_pages)
+
+                if not movies or page > pages_needed:
+
+                    return
+
+                for movie in movies[:count - yielded]:
+
+                    yield movie
+
+                yielded += min(len(movies), count - yielded)
+
+        finally:
+
+            for page, task in pending:
+
+                task.cancel()
+
+    async def fetch_movie_details_with_credits(self, movie_id):
+
+        response = await self.transport.get('tmdb', self._details_url(movie_id), endpoint='tmdb.details')
+        return self._parse_details_response(response)
+
+class AsyncIMDb(IMDb):
+
+    #Asyncio version of IMDb, it sends the same parameters and parses the responses with the same code
+
+    def __init__(self, api_key, transport=None):
+
+        super().__init__(api_key, transport or AsyncHTTPTransport())
+
+    async def search(self, title):
+
+        return self._parse_search_response(await self._search_response(title))
+
+    async def get_movie_info(self, title):
+
+        return self._parse_movie_info(self._parse_search_response(await self._search_response(title), _project_omdb_object))
+
+    async def get_movie_info_by_id(self, imdb_id):
+
+        response = await self.transport.get('imdb', self.base_url, params = {'apikey': self.api_key, 'i': imdb_id}, endpoint='imdb.lookup')
+        return self._parse_movie_info(self._parse_search_response(response, _project_omdb_object))
+
+    async def _search_response(self, title):
+
+        return await self.transport.get('imdb', self.base_url, params = self._search_parameters(title), endpoint='imdb.search')
+
+class _Record:
+
+    #Base of the compact record types. Values live in __slots__ instead of a dictionary per record, 
+    #while the records still read like the dictionaries they replace: record['title'], record.get('budget'), 'views' in record, dict(record). 
+
+    __slots__ = ()
+
+    #Pairs of dictionary key and attribute name, in the order they are exported
+    _keys = ()
+    #Keys only some API responses have. They are left out of the record while their value is None, so the dictionaries and snapshots stay as they were
+    _optional = ()
+
+    def __init_subclass__(cls, **kwargs):
+
+        super().__init_subclass__(**kwargs)
+        cls._attributes = dict(cls._keys)
+
+    def __getitem__(self, key):
+
+        try:
+
+            return getattr(self, self._attributes[key])
+
+        except KeyError:
+
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+
+        #Values that were missing from the API response are None and fall back to the default, like a missing key
+        value = getattr(self, self._attributes[key]) if key in self._attributes else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+
+        return key in self._attributes and (key not in self._optional or getattr(self, self._attributes[key]) is not None)
+
+    def __iter__(self):
+
+        return iter(self.keys())
+
+    def __len__(self):
+
+        return len(self.keys())
+
+    def keys(self):
+
+        if not self._optional:
+
+            return self._attributes.keys()
+
+        return [key for key in self._attributes if key in self]
+
+    def items(self):
+
+        return [(key, getattr(self, attribute)) for key, attribute in self._keys if key not in self._optional or getattr(self, attribute) is not None]
+
+    def to_dict(self):
+
+        #Exports the record, and any records nested in it, as plain dictionaries and lists
+        return {key: _export_value(value) for key, value in self.items()}
+
+    def __eq__(self, other):
+
+        if isinstance(other, (_Record, dict)):
+
+            return dict(self.items()) == dict(other.items())
+
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+def _export_value(value):
+
+    if isinstance(value, _Record):
+
+        return value.to_dict()
+
+    if isinstance(value, (list, tuple)):
+
+        return [_export_value(item) for item in value]
+
+    return value
+
+class VideoStats(_Record):
+
+    #Channel, title and counts of one YouTube video
+
+    __slots__ = ('channel_name', 'video_title', 'views', 'likes')
+    _keys = (('channelName', 'channel_name'), ('videoTitle', 'video_title'), ('views', 'views'), ('likes', 'likes'))
+
+    def __init__(self, channel_name='', video_title='', views=0, likes=0):
+
+        self.channel_name = channel_name
+        self.video_title = video_title
+        self.views = views
+        self.likes = likes
+
+    @classmethod
+    def from_dict(cls, data):
+
+        if isinstance(data, cls):
+
+            return data
+
+        return cls(data.get('channelName', ''), data.get('videoTitle', ''), int(data.get('views') or 0), int(data.get('likes') or 0))
+
+class TMDbDetails(_Record):
+
+    #The TMDb details and credits the integration keeps for a movie. The IMDb ID is kept when TMDb knows it, 
+    #so a snapshot can warm up the ID index and OMDb can be queried by ID on the next run. 
+
+    __slots__ = ('title', 'average_rating', 'number_of_ratings', 'director', 'lead_actor', 'budget', 'imdb_id')
+    _keys = tuple((attribute, attribute) for attribute in __slots__)
+    _optional = ('imdb_id',)
+
+    def __init__(self, title, average_rating=None, number_of_ratings=None, director=None, lead_actor=None, budget=0, imdb_id=None):
+
+        self.title = title
+        self.average_rating = average_rating
+        self.number_of_ratings = number_of_ratings
+        self.director = director
+        self.lead_actor = lead_actor
+        self.budget = budget
+        self.imdb_id = imdb_id
+
+    @classmethod
+    def from_dict(cls, data):
+
+        if isinstance(data, cls):
+
+            return data
+
+        return cls(data.get('title'), data.get('average_rating'), data.get('number_of_ratings'), data.get('director'), data.get('lead_actor'), data.get('budget') or 0, data.get('imdb_id') or None)
+
+class OMDbInfo(_Record):
+
+    #The OMDb details of a movie. OMDb sends its numbers as strings ('1,234', '8.5' or 'N/A'), they are parsed once here
+
+    __slots__ = ('director', 'lead_actor', 'number_of_reviews', 'average_review')
+    _keys = (('Director', 'director'), ('Lead Actor', 'lead_actor'), ('Number of Reviews', 'number_of_reviews'), ('Average Review', 'average_review'))
+
+    def __init__(self, director=None, lead_actor=None, number_of_reviews=None, average_review=None):
+
+        self.director = director
+        self.lead_actor = lead_actor
+        self.number_of_reviews = number_of_reviews
+        self.average_review = average_review
+
+    @classmethod
+    def from_dict(cls, data):
+
+        if isinstance(data, cls):
+
+            return data
+
+        average_review = _to_float(data.get('Average Review'))
+
+        return cls(
+
+            _known(data.get('Director')),
+            _known(data.get('Lead Actor')),
+            _to_count(data.get('Number of Reviews')),
+            None if average_review != average_review else average_review
+
+        )
+
+class MovieRecord(_Record):
+
+    #One integrated movie. The TMDb ID and video IDs let a later run refresh the movie without searching for it again
+
+    __slots__ = ('title', 'tmdb_id', 'tmdb_details', 'imdb_details', 'youtube_video_ids', 'youtube_videos_stats', 'errors')
+    _keys = tuple((attribute, attribute) for attribute in __slots__)
+
+    def __init__(self, title, tmdb_id, tmdb_details, imdb_details, youtube_video_ids, youtube_videos_stats, errors=()):
+
+        self.title = title
+        self.tmdb_id = tmdb_id
+        self.tmdb_details = tmdb_details
+        self.imdb_details = imdb_details
+        self.youtube_video_ids = youtube_video_ids
+        self.youtube_videos_stats = youtube_videos_stats
+        #ErrorMarkers of the sources that could not provide their data for this movie
+        self.errors = errors
+
+    @classmethod
+    def from_dict(cls, data):
+
+        #Builds the record from the dictionaries returned by the data sources or loaded from a snapshot
+        if isinstance(data, cls):
+
+            return data
+
+        tmdb_details = TMDbDetails.from_dict(data['tmdb_details'])
+
+        return cls(
+
+            data.get('title', tmdb_details.title),
+            data.get('tmdb_id'),
+            tmdb_details,
+            OMDbInfo.from_dict(data['imdb_details']) if data.get('imdb_details') else None,
+            tuple(data.get('youtube_video_ids') or ()),
+            tuple(_video_stats_record(stat) for stat in data.get('youtube_videos_stats') or ()),
+            tuple(ErrorMarker.from_dict(error) for error in data.get('errors') or ())
+
+        )
+
+class ErrorMarker(_Record):
+
+    #Stored in a record in place of the data a source could not provide, it reads like the {'error': message} entries it replaces. 
+    #kind is 'quota' when the source's quota ran out, 'unavailable' when its circuit is open, 'missing' when it had no data and 'failed' otherwise. 
+
+    __slots__ = ('message', 'source', 'kind')
+    _keys = (('error', 'message'), ('source', 'source'), ('kind', 'kind'))
+
+    def __init__(self, message, source=None, kind='failed'):
+
+        self.message = message
+        self.source = source
+        self.kind = kind
+
+    @classmethod
+    def from_error(cls, source, error):
+
+        if isinstance(error, QuotaExceededError):
+
+            return cls(str(error), source, 'quota')
+
+        if isinstance(error, CircuitOpenError):
+
+            return cls(str(error), source, 'unavailable')
+
+        return cls(f"{source} lookup failed: {error or type(error).__name__}", source, 'failed')
+
+    @classmethod
+    def from_dict(cls, data):
+
+        if isinstance(data, cls):
+
+            return data
+
+        return cls(data.get('error'), data.get('source'), data.get('kind', 'failed'))
+
+def _video_stats_record(stat):
+
+    #Error entries recorded in place of the stats become ErrorMarkers
+    return ErrorMarker.from_dict(stat) if 'error' in stat else VideoStats.from_dict(stat)
+
+def _checked_video_stats(video_ids, video_stats):
+
+    #A video the YouTube API returned nothing for gets an error marker instead of zeroed stats, which would drag the averages down
+    return {video_id: video_stats[video_id] if video_stats.get(video_id) else ErrorMarker("No statistics returned for this video", 'youtube', 'missing') for video_id in dict.fromkeys(video_ids)}
+
+def _known(value):
+
+    return None if value in (None, '', 'N/A') else value
+
+def _to_count(value):
+
+    #Converts an OMDb count such as '1,234' to an int, missing or 'N/A' values become None
+    try:
+
+        return int(str(value).replace(',', ''))
+
+    except ValueError:
+
+        return None
+
+class SnapshotStore:
+
+    #Keeps the last integrated snapshot in a JSON file so the next run can tell what changed
+
+    def __init__(self, path='integrated_snapshot.json'):
+
+        self.path = path
+
+    def load(self):
+
+        #Returns the previous records keyed by TMDb ID, or an empty dictionary on the first run
+        try:
+
+            with open(self.path, encoding='utf-8') as snapshot_file:
+
+                return {str(record['tmdb_id']): MovieRecord.from_dict(record) for record in json.load(snapshot_file)}
+
+        except FileNotFoundError:
+
+            return {}
+
+    def save(self, integrated_data):
+
+        #Writes to a temporary file first so a crash mid-write never leaves a truncated snapshot
+        temporary_path = f'{self.path}.tmp'
+
+        with open(temporary_path, 'w', encoding='utf-8') as snapshot_file:
+
+            json.dump([_export_value(record) for record in integrated_data], snapshot_file)
+
+        os.replace(temporary_path, self.path)
+
+#Columns of the exported tables. Movies get one row each, videos get one row per video with the TMDb ID to join them back
+MOVIE_EXPORT_COLUMNS = (
+
+    ('tmdb_id', 'string'),
+    ('title', 'string'),
+    ('tmdb_average_rating', 'float64'),
+    ('tmdb_number_of_ratings', 'int64'),
+    ('tmdb_director', 'string'),
+    ('tmdb_lead_actor', 'string'),
+    ('budget', 'int64'),
+    ('imdb_director', 'string'),
+    ('imdb_lead_actor', 'string'),
+    ('imdb_number_of_reviews', 'int64'),
+    ('imdb_average_review', 'float64'),
+    ('video_count', 'int64'),
+    ('errors', 'string')
+
+)
+VIDEO_EXPORT_COLUMNS = (
+
+    ('tmdb_id', 'string'),
+    ('position', 'int64'),
+    ('video_id', 'string'),
+    ('channel_name', 'string'),
+    ('video_title', 'string'),
+    ('views', 'int64'),
+    ('likes', 'int64'),
+    ('error', 'string')
+
+)
+
+def flatten_movie_record(movie_data):
+
+    #Flattens one integrated movie into its movie row and its video rows
+    tmdb_id = None if movie_data.get('tmdb_id') is None else str(movie_data['tmdb_id'])
+    tmdb_details = TMDbDetails.from_dict(movie_data['tmdb_details'])
+    imdb_details = OMDbInfo.from_dict(movie_data['imdb_details']) if movie_data.get('imdb_details') else OMDbInfo()
+    video_ids = list(movie_data.get('youtube_video_ids') or ())
+    stats = list(movie_data.get('youtube_videos_stats') or ())
+    video_rows = []
+
+    for position in range(max(len(video_ids), len(stats))):
+
+        stat = stats[position] if position < len(stats) else {}
+        error = stat.get('error') if 'error' in stat else None
+        video_stats = VideoStats() if error is not None or not stat else VideoStats.from_dict(stat)
+
+        video_rows.append({
+
+            'tmdb_id': tmdb_id,
+            'position': position,
+            'video_id': video_ids[position] if position < len(video_ids) else None,
+            'channel_name': video_stats.channel_name if error is None else None,
+            'video_title': video_stats.video_title if error is None else None,
+            'views': video_stats.views if error is None else None,
+            'likes': video_stats.likes if error is None else None,
+            'error': error
+
+        })
+
+    movie_row = {
+
+        'tmdb_id': tmdb_id,
+        'title': movie_data['title'],
+        'tmdb_average_rating': tmdb_details.average_rating,
+        'tmdb_number_of_ratings': tmdb_details.number_of_ratings,
+        'tmdb_director': tmdb_details.director,
+        'tmdb_lead_actor': tmdb_details.lead_actor,
+        'budget': tmdb_details.budget,
+        'imdb_director': imdb_details.director,
+        'imdb_lead_actor': imdb_details.lead_actor,
+        'imdb_number_of_reviews': imdb_details.number_of_reviews,
+        'imdb_average_review': imdb_details.average_review,
+        'video_count': len(video_rows),
+        'errors': '; '.join(error['error'] for error in movie_data.get('errors') or ()) or None
+
+    }
+
+    return movie_row, video_rows
+
+class NDJSONExporter:
+
+    #Writes one JSON line per integrated movie and flushes after each one, so the file can be tailed while the run is going
+
+    def __init__(self, path):
+
+        self.path = path
+        self.export_file = open(path, 'w', encoding='utf-8')
+        self.count = 0
+
+    def write(self, movie_data):
+
+        self.export_file.write(json.dumps(_export_value(movie_data)) + '\n')
+        self.export_file.flush()
+        self.count += 1
+
+    def close(self):
+
+        self.export_file.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+class ParquetExporter:
+
+    #Writes the movies and their videos to movies.parquet and videos.parquet in the given directory. 
+    #Rows are buffered in columns and written as a row group every batch_size rows, so only one batch is held in memory however many videos are exported. 
+
+    def __init__(self, directory, batch_size=50000):
+
+        if pa is None:
+
+            raise ImportError("pyarrow is required for the Parquet export, install it with 'pip install pyarrow'")
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.tables = {
+
+            'movies': self._open_table(os.path.join(directory, 'movies.parquet'), MOVIE_EXPORT_COLUMNS),
+            'videos': self._open_table(os.path.join(directory, 'videos.parquet'), VIDEO_EXPORT_COLUMNS)
+
+        }
+        self.count = 0
+
+    def _open_table(self, path, columns):
+
+        schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+        return {'writer': pq.ParquetWriter(path, schema), 'schema': schema, 'columns': {name: [] for name, _ in columns}, 'rows': 0}
+
+    def write(self, movie_data):
+
+        movie_row, video_rows = flatten_movie_record(movie_data)
+        self._append('movies', [movie_row])
+        self._append('videos', video_rows)
+        self.count += 1
+
+    def _append(self, name, rows):
+
+        table = self.tables[name]
+
+        for row in rows:
+
+            for column, values in table['columns'].items():
+
+                values.append(row[column])
+
+        table['rows'] += len(rows)
+
+        if table['rows'] >= self.batch_size:
+
+            self._flush(table)
+
+    def _flush(self, table):
+
+        if table['rows']:
+
+            table['writer'].write_table(pa.Table.from_pydict(table['columns'], schema=table['schema']))
+
+            for values in table['columns'].values():
+
+                values.clear()
+
+            table['rows'] = 0
+
+    def close(self):
+
+        for table in self.tables.values():
+
+            self._flush(table)
+            table['writer'].close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+#Message stored in place of the YouTube stats when the YouTube lookup fails
+YOUTUBE_ERROR_MESSAGE = "No Youtube results available (Youtube API quota reached, try using a new key). No information Available."
+
+#Default number of requests allowed in flight per source when integrating concurrently
+DEFAULT_SOURCE_CONCURRENCY = {'tmdb': 4, 'imdb': 4, 'youtube': 4}
+
+#Average ticket price and the share of likes assumed to turn into ticket purchases (see the README)
+AVERAGE_TICKET_PRICE = 11.23
+LIKES_TO_TICKETS_RATE = 0.1
+
+#Number of movies integrated together when streaming, about enough for their videos to fill one YouTube stats request
+DEFAULT_STREAM_CHUNK_SIZE = 16
+
+#Seconds of stats history the growth rates in the analysis are measured over
+DEFAULT_GROWTH_WINDOW = 7 * 24 * 3600
+
+class TaskGraph:
+
+    #Small dataflow scheduler. A task is submitted to its pool as soon as the tasks it depends on have finished, 
+    #so independent lookups overlap instead of waiting for a fixed stage order. 
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+
+    def add(self, pool, function, *dependencies):
+
+        #Returns a future for function(*results of the dependencies). A pool of None runs the function on the thread that finished the last dependency
+        future = Future()
+        remaining = [len(dependencies)]
+
+        def dependency_done(_):
+
+            with self._lock:
+
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+
+            if ready:
+
+                self._submit(pool, function, dependencies, future)
+
+        if not dependencies:
+
+            self._submit(pool, function, dependencies, future)
+
+        for dependency in dependencies:
+
+            dependency.add_done_callback(dependency_done)
+
+        return future
+
+    def _submit(self, pool, function, dependencies, future):
+
+        #A failed dependency fails the task without running it
+        for dependency in dependencies:
+
+            if dependency.exception() is not None:
+
+                future.set_exception(dependency.exception())
+                return
+
+        def run():
+
+            try:
+
+                future.set_result(function(*(dependency.result() for dependency in dependencies)))
+
+            except Exception as e:
+
+                future.set_exception(e)
+
+        if pool is None:
+
+            return run()
+
+        try:
+
+            pool.submit(run)
+
+        except RuntimeError as e:
+
+            #The pool was shut down because the consumer stopped early
+            future.set_exception(e)
+
+def _failed_details(details):
+
+    #The details future of a pipelined movie resolves to None when the movie could not be fetched
+    return details.done() and not details.result()
+
+class _StatsBatcher:
+
+    #Batches the video stats of the pipelined movies whose searches finish close together. A finished search adds its videos to the pending batch, 
+    #and one task on the YouTube pool sends every video pending when it starts, 50 to a request, instead of a stats request per movie. 
+
+    def __init__(self, fetch, pool):
+
+        self.fetch = fetch
+        self.pool = pool
+        self.pending = []
+        self._lock = threading.Lock()
+
+    def add(self, search):
+
+        #Returns a future for the stats of the videos found by the search future
+        future = Future()
+        search.add_done_callback(lambda search: self._queue(search, future))
+        return future
+
+    def _queue(self, search, future):
+
+        if search.exception() is not None:
+
+            future.set_exception(search.exception())
+            return
+
+        video_ids = search.result()[0]
+
+        if not video_ids:
+
+            future.set_result({})
+            return
+
+        with self._lock:
+
+            self.pending.append((video_ids, future))
+            start_batch = len(self.pending) == 1
+
+        #The batch task is only submitted for the first pending movie, the ones added before it starts join its batch
+        if start_batch:
+
+            try:
+
+                self.pool.submit(self._flush)
+
+            except RuntimeError as e:
+
+                #The pool was shut down because the consumer stopped early
+                self._fail(e)
+
+    def _flush(self):
+
+        with self._lock:
+
+            batch, self.pending = self.pending, []
+
+        try:
+
+            video_stats = self.fetch([video_id for video_ids, future in batch for video_id in video_ids])
+
+        except Exception as e:
+
+            for video_ids, future in batch:
+
+                future.set_exception(e)
+
+            return
+
+        for video_ids, future in batch:
+
+            future.set_result({video_id: video_stats[video_id] for video_id in video_ids if video_id in video_stats})
+
+    def _fail(self, error):
+
+        with self._lock:
+
+            batch, self.pending = self.pending, []
+
+        for video_ids, future in batch:
+
+            future.set_exception(error)
+
+class IntegratedData:
+
+    #Integrates YouTube video stats with TMDb movie details
+
+    def __init__(self, youtube_data_source, tmdb_data_source, imdb_data_source, concurrent=False, source_concurrency=None, instrumentation=None, id_index=None, stats_history=None, growth_window=DEFAULT_GROWTH_WINDOW):
+
+        #Initializes the integrated data object with YouTube and TMDb data sources.
+        self.youtube_data_source = youtube_data_source
+        self.tmdb_data_source = tmdb_data_source
+        self.imdb_data_source = imdb_data_source
+
+        #Concurrent mode runs the per-movie lookups in bounded thread pools, one pool per source. 
+        #The sequential mode is kept as the default so runs can still be stepped through when debugging. 
+        self.concurrent = concurrent
+        self.source_concurrency = dict(DEFAULT_SOURCE_CONCURRENCY)
+
+        if source_concurrency:
+
+            self.source_concurrency.update(source_concurrency)
+
+        #Set once YouTube reports that the quota is used up, the remaining movies are integrated without YouTube data
+        self.youtube_quota_exhausted = False
+
+        #Optional instrumentation that times each stage of a run
+        self.instrumentation = instrumentation
+
+        #Optional IDIndex that lets OMDb be queried by IMDb ID and skips the YouTube search of movies already indexed
+        self.id_index = id_index
+
+        #Optional StatsHistory that keeps every stats snapshot, its growth rates are added to the analysis
+        self.stats_history = stats_history
+        self.growth_window = growth_window
+
+    def _start_run(self):
+
+        #Every run tries YouTube again, so a long lived handler such as the service's recovers once the quota is reset. 
+        #While the daily budget is still used up the rate limiter fails the first search without sending it. 
+        self.youtube_quota_exhausted = False
+
+    def integrate_popular_movies_youtube_data(self):
+
+        #Integrates popular movie data from TMDb with corresponding Youtube video stats. 
+        self._start_run()
+
+        #Fetches the list of most popular movies from TMDb
+        with self._stage('popular'):
+
+            popular_movies = self.tmdb_data_source.fetch_most_popular_movies()
+
+        #A failed fetch comes back as an error message instead of a list, there is nothing to integrate then
+        if not isinstance(popular_movies, list):
+
+            print(f"Could not fetch the popular movies: {popular_movies}")
+            return []
+
+        return self._integrate_chunk(popular_movies)
+
+    def refresh_incremental(self, snapshot_store, movie_count=None, popular_movies=None):
+
+        #Refreshes the previous snapshot instead of rebuilding it. Only movies new to the popular list are integrated in full, 
+        #the movies already known just get their fast changing YouTube stats re-fetched. Returns the records and the delta from the last run. 
+        #popular_movies replaces the popular list, for example with the movies seeded from a daily ID export. 
+        self._start_run()
+
+        previous = snapshot_store.load()
+
+        if popular_movies is not None:
+
+            popular_movies = list(popular_movies)
+
+        else:
+
+            popular_movies = self.tmdb_data_source.fetch_most_popular_movies() if movie_count is None else list(self.tmdb_data_source.iter_popular_movies(movie_count))
+
+        #Keeps the previous snapshot untouched when the popular list cannot be fetched
+        if not isinstance(popular_movies, list):
+
+            return list(previous.values()), {'added': [], 'removed': [], 'updated': []}
+
+        kept, new_movies = self._split_refresh(previous, popular_movies)
+        new_records = {str(record['tmdb_id']): record for record in self._integrate_chunk(new_movies)} if new_movies else {}
+
+        with self._stage('refresh'):
+
+            video_stats = self._fetch_video_stats([video_id for record in kept for video_id in record['youtube_video_ids']])
+
+        integrated_data, delta = self._merge_refresh(previous, popular_movies, kept, new_records, video_stats)
+        snapshot_store.save(integrated_data)
+        return integrated_data, delta
+
+    def _split_refresh(self, previous, popular_movies):
+
+        #Movies whose YouTube lookup failed last time are integrated again from scratch
+        known = {movie_id: record for movie_id, record in previous.items() if record.get('youtube_video_ids')}
+        new_movies = [movie for movie in popular_movies if str(movie['id']) not in known]
+        kept = [known[str(movie['id'])] for movie in popular_movies if str(movie['id']) in known]
+
+        return kept, new_movies
+
+    def _merge_refresh(self, previous, popular_movies, kept, new_records, video_stats):
+
+        #Puts the refreshed and new records in popular list order and works out the delta from the previous snapshot
+        refreshed = {}
+        updated = []
+
+        for record in kept:
+
+            stats = []
+            fresh_video_ids = set()
+
+            for video_id, old_stat in zip(record['youtube_video_ids'], record['youtube_videos_stats']):
+
+                #A video missing from the new stats keeps its last known numbers
+                new_stat = video_stats.get(video_id)
+
+                if not new_stat or 'error' in new_stat:
+
+                    stats.append(old_stat)
+
+                else:
+
+                    stats.append(new_stat)
+                    fresh_video_ids.add(video_id)
+
+            views_change = sum(stat.get('views', 0) for stat in stats) - sum(stat.get('views', 0) for stat in record['youtube_videos_stats'])
+            likes_change = sum(stat.get('likes', 0) for stat in stats) - sum(stat.get('likes', 0) for stat in record['youtube_videos_stats'])
+            refreshed[str(record['tmdb_id'])] = self._build_movie_data(record['tmdb_id'], record['tmdb_details'], record['imdb_details'], record['youtube_video_ids'], stats, [error for error in record.get('errors', ()) if error['source'] != 'youtube'], fresh_video_ids)
+
+            if views_change or likes_change:
+
+                updated.append({'tmdb_id': record['tmdb_id'], 'title': record['title'], 'views_change': views_change, 'likes_change': likes_change})
+
+        current_ids = [str(movie['id']) for movie in popular_movies]
+        integrated_data = [refreshed.get(movie_id) or new_records.get(movie_id) for movie_id in current_ids]
+        integrated_data = [record for record in integrated_data if record]
+
+        delta = {
+
+            'added': [record for movie_id, record in new_records.items() if movie_id not in previous],
+            'removed': [record for movie_id, record in previous.items() if movie_id not in current_ids],
+            'updated': updated
+
+        }
+
+        return integrated_data, delta
+
+    def stream_popular_movies_youtube_data(self, movie_count, prefetch=1, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+
+        #Integrates the top movie_count popular movies, paging through TMDb lazily and yielding each record as soon as its chunk is complete. 
+        #Only one chunk of movies is held at a time, so memory stays flat however many movies are requested. 
+        return self.iter_integrated_movies(self.tmdb_data_source.iter_popular_movies(movie_count, prefetch), chunk_size)
+
+    def iter_integrated_movies(self, movies, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+
+        #Integrates any iterable of TMDb movies chunk by chunk and yields the records in the original order
+        self._start_run()
+        pools = self._source_pools() if self.concurrent else None
+
+        try:
+
+            chunk = []
+
+            for movie in movies:
+
+                chunk.append(movie)
+
+                if len(chunk) >= chunk_size:
+
+                    yield from self._integrate_chunk(chunk, pools)
+                    chunk = []
+
+            if chunk:
+
+                yield from self._integrate_chunk(chunk, pools)
+
+        finally:
+
+            if pools:
+
+                for pool in pools:
+
+                    pool.shutdown()
+
+    def stream_pipelined_movies(self, movies):
+
+        #Integrates the movies as a dependency graph per movie and yields each record as soon as it is complete, in completion order. 
+        #The popular list already has the titles, so the YouTube search starts alongside the details instead of after them: 
+        #the critical path of a movie is max(details then OMDb, search then stats), two round trips instead of four. 
+        self._start_run()
+        pools = self._source_pools()
+        graph = TaskGraph()
+        stats_batcher = _StatsBatcher(self._fetch_video_stats, pools[2])
+        completed = queue.Queue()
+        scheduled = 0
+        #Enough movies to keep every pool busy are scheduled at a time, a long popular list never queues all of its tasks up front
+        max_in_flight = sum(self.source_concurrency[source] for source in ('tmdb', 'imdb', 'youtube'))
+
+        try:
+
+            #The movies overlap, so the whole stream is timed as one integrate stage
+            with self._stage('integrate'):
+
+                for movie in movies:
+
+                    self._schedule_movie(graph, pools, stats_batcher, movie).add_done_callback(completed.put)
+                    scheduled += 1
+
+                    #Hands out what has finished while the rest of the popular list is still being paged in, 
+                    #and waits for a record before taking the next movie once max_in_flight are scheduled
+                    while scheduled >= max_in_flight or not completed.empty():
+
+                        scheduled -= 1
+                        yield from self._completed_record(completed.get())
+
+                for _ in range(scheduled):
+
+                    yield from self._completed_record(completed.get())
+
+        finally:
+
+            for pool in pools:
+
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule_movie(self, graph, pools, stats_batcher, movie):
+
+        #Adds the tasks of one movie to the graph and returns the future of its record
+        tmdb_pool, imdb_pool, youtube_pool = pools
+        movie_id = movie['id']
+        title = movie.get('title')
+
+        details = graph.add(tmdb_pool, lambda: self._fetch_movie_details(movie_id))
+
+        #OMDb is queried by IMDb ID, so it waits for the details unless the index already knows the ID
+        imdb_id = self.id_index.imdb_id(movie_id) if self.id_index is not None else None
+
+        if imdb_id:
+
+            imdb = graph.add(imdb_pool, lambda: self._fetch_imdb_info(title, imdb_id))
+
+        else:
+
+            imdb = graph.add(imdb_pool, lambda movie_details: self._fetch_imdb_info(movie_details['title'], self._imdb_id(movie_id, movie_details)) if movie_details else None, details)
+
+        #Movies listed without a title, bare TMDb IDs for example, search with the title from the details. 
+        #A search still waiting for a YouTube worker when the details fail is skipped, the movie will be dropped and the 100 units would be wasted. 
+        if title:
+
+            search = graph.add(youtube_pool, lambda: ([], None) if _failed_details(details) else self._pipelined_search(title, movie_id))
+
+        else:
+
+            search = graph.add(youtube_pool, lambda movie_details: self._pipelined_search(movie_details['title'], movie_id) if movie_details else ([], None), details)
+
+        #The stats wait for the details as well, so no stats are fetched for a movie that is dropped
+        found = graph.add(None, lambda movie_details, search_result: search_result if movie_details else ([], None), details, search)
+        stats = stats_batcher.add(found)
+
+        return graph.add(None, lambda movie_details, imdb_movie_details, search_result, video_stats: self._pipelined_record(movie_id, movie_details, imdb_movie_details, search_result, video_stats), details, imdb, search, stats)
+
+    def _pipelined_search(self, movie_title, movie_id):
+
+        #Returns the video IDs and, when the search failed, the error recorded in place of the stats
+        try:
+
+            return self._search_youtube_videos(movie_title, movie_id), None
+
+        except Exception as e:
+
+            return [], self._handle_youtube_error(e)
+
+    def _pipelined_record(self, movie_id, movie_details, imdb_movie_details, search_result, video_stats):
+
+        #A movie whose details could not be fetched is skipped, as in the other modes
+        if not movie_details:
+
+            return None
+
+        video_ids, error_stats = search_result
+        return self._assemble_movie_data([(movie_id, movie_details, imdb_movie_details, video_ids, error_stats)], video_stats)[0]
+
+    def _completed_record(self, future):
+
+        record = future.result()
+
+        if record is not None:
+
+            yield record
+
+    def _integrate_chunk(self, movies, pools=None):
+
+        with self._stage('integrate'):
+
+            if pools or self.concurrent:
+
+                return self._integrate_concurrently(movies, pools)
+
+            return self._integrate_sequentially(movies)
+
+    def _stage(self, name):
+
+        #Times the stage when instrumentation is attached, otherwise does nothing
+        return self.instrumentation.stage(name) if self.instrumentation is not None else nullcontext()
+
+    def _source_pools(self):
+
+        #Creates the TMDb, OMDb and YouTube pools sized by each source's concurrency limit
+        return tuple(ThreadPoolExecutor(max_workers=self.source_concurrency[source]) for source in ('tmdb', 'imdb', 'youtube'))
+
+    def _integrate_sequentially(self, popular_movies):
+
+        #Collects the details, OMDb info and YouTube video IDs of each movie before resolving the video stats in one batch. 
+        lookups = []
+
+        #Iterate over each popular movie fetched from TMDb
+        for movie in popular_movies:
+
+            #Fetched movie details including credits. 
+            movie_details = self._fetch_movie_details(movie['id'])
+
+            #Checks if movie details were successfully fetched
+            if movie_details:
+
+                #Extracts the movie title from the details.
+                movie_title = movie_details['title']
+                imdb_movie_details = self._fetch_imdb_info(movie_title, self._imdb_id(movie['id'], movie_details))
+
+                try:
+
+                    #Searches for YouTube videos related to the movie title
+                    lookups.append((movie['id'], movie_details, imdb_movie_details, self._search_youtube_videos(movie_title, movie['id']), None))
+                    
+                except Exception as e:
+
+                    lookups.append((movie['id'], movie_details, imdb_movie_details, [], self._handle_youtube_error(e)))
+
+        video_stats = self._fetch_video_stats([video_id for lookup in lookups for video_id in lookup[3]])
+
+        #Returns the list of integrated movie data. 
+        return self._assemble_movie_data(lookups, video_stats)
+
+    def _integrate_concurrently(self, popular_movies, pools=None):
+
+        #Runs the TMDb, OMDb and YouTube lookups in parallel across movies and across sources. 
+        #Each source gets its own pool so its concurrency limit is enforced independently of the others. 
+        if pools is None:
+
+            pools = self._source_pools()
+
+            try:
+
+                return self._integrate_concurrently(popular_movies, pools)
+
+            finally:
+
+                for pool in pools:
+
+                    pool.shutdown()
+
+        tmdb_pool, imdb_pool, youtube_pool = pools
+        popular_movies = list(popular_movies)
+        pending = {}
+
+        #Fetches the details of every movie up front and remembers each movie's position in the list. 
+        details_futures = {tmdb_pool.submit(self._fetch_movie_details, movie['id']): index for index, movie in enumerate(popular_movies)}
+
+        #Starts the OMDb lookup and YouTube search for a movie as soon as its title is known. 
+        for future in as_completed(details_futures):
+
+            movie_details = future.result()
+
+            if movie_details:
+
+                movie_title = movie_details['title']
+                movie_id = popular_movies[details_futures[future]]['id']
+                imdb_future = imdb_pool.submit(self._fetch_imdb_info, movie_title, self._imdb_id(movie_id, movie_details))
+                search_future = youtube_pool.submit(self._search_youtube_videos, movie_title, movie_id)
+                pending[details_futures[future]] = (movie_details, imdb_future, search_future)
+
+        #Waits for the searches in the original TMDb order so the output matches the sequential path. 
+        lookups = []
+
+        for index in sorted(pending):
+
+            movie_details, imdb_future, search_future = pending[index]
+            movie_id = popular_movies[index]['id']
+
+            try:
+
+                lookups.append((movie_id, movie_details, imdb_future, search_future.result(), None))
+
+            except Exception as e:
+
+                lookups.append((movie_id, movie_details, imdb_future, [], self._handle_youtube_error(e)))
+
+        video_stats = self._fetch_video_stats([video_id for lookup in lookups for video_id in lookup[3]], youtube_pool)
+        lookups = [(movie_id, movie_details, imdb_future.result(), video_ids, error_stats) for movie_id, movie_details, imdb_future, video_ids, error_stats in lookups]
+
+        return self._assemble_movie_data(lookups, video_stats)
+
+    def _fetch_video_stats(self, video_ids, pool=None):
+
+        #Resolves the stats of every video found for the movies, using the batched lookup when the source has one. 
+        if not hasattr(self.youtube_data_source, 'fetch_video_stats_batch'):
+
+            return {video_id: self._fetch_single_video_stats(video_id) for video_id in dict.fromkeys(video_ids)}
+
+        unique_ids = list(dict.fromkeys(video_ids))
+        chunks = [unique_ids[start:start + YOUTUBE_MAX_IDS_PER_REQUEST] for start in range(0, len(unique_ids), YOUTUBE_MAX_IDS_PER_REQUEST)]
+        video_stats = {}
+
+        #Each chunk is a single request, in concurrent mode the chunks are spread over the YouTube pool. 
+        for chunk_stats in (pool.map(self._fetch_video_stats_batch, chunks) if pool else map(self._fetch_video_stats_batch, chunks)):
+
+            video_stats.update(chunk_stats)
+
+        return video_stats
+
+    def _fetch_video_stats_batch(self, video_ids):
+
+        #Videos left unresolved because the quota ran out are recorded as errors when the records are assembled
+        if self.youtube_quota_exhausted:
+
+            return {}
+
+        try:
+
+            return _checked_video_stats(video_ids, self.youtube_data_source.fetch_video_stats_batch(video_ids))
+
+        except Exception as e:
+
+            #A failed chunk only marks its own videos, the other chunks are unaffected
+            error_stats = self._handle_youtube_error(e)
+            return {video_id: error_stats[0] for video_id in video_ids}
+
+    def _fetch_single_video_stats(self, video_id):
+
+        try:
+
+            return _checked_video_stats([video_id], {video_id: self.youtube_data_source.fetch_video_stats(video_id)})[video_id]
+
+        except Exception as e:
+
+            return self._handle_youtube_error(e)[0]
+
+    def _fetch_movie_details(self, movie_id):
+
+        #A movie whose details cannot be fetched, because the TMDb quota ran out or TMDb is failing, is skipped and the rest of the batch carries on
+        try:
+
+            return self.tmdb_data_source.fetch_movie_details_with_credits(movie_id)
+
+        except Exception as e:
+
+            print(f"Skipping movie {movie_id}: {e}")
+            return None
+
+    def _imdb_id(self, movie_id, movie_details):
+
+        #Takes the IMDb ID from the TMDb details, falling back on the index, and keeps the index up to date with it
+        imdb_id = movie_details.get('imdb_id')
+
+        if self.id_index is None:
+
+            return imdb_id
+
+        #The index is only written when it does not know the ID yet or knows a different one, a read is much cheaper than a committed write
+        if imdb_id:
+
+            if self.id_index.imdb_id(movie_id) != imdb_id:
+
+                self.id_index.update(movie_id, imdb_id=imdb_id)
+
+            return imdb_id
+
+        return self.id_index.imdb_id(movie_id)
+
+    def _fetch_imdb_info(self, movie_title, imdb_id=None):
+
+        #The movie keeps its TMDb and YouTube data when OMDb fails, with an error marker in place of the OMDb details
+        try:
+
+            #An ID lookup cannot pick the wrong movie the way a title search can, sources without it keep searching by title
+            if imdb_id and hasattr(self.imdb_data_source, 'get_movie_info_by_id'):
+
+                return self.imdb_data_source.get_movie_info_by_id(imdb_id)
+
+            return self.imdb_data_source.get_movie_info(movie_title)
+
+        except Exception as e:
+
+            print(f"No IMDb information for {movie_title}: {e}")
+            return ErrorMarker.from_error('imdb', e)
+
+    def _search_youtube_videos(self, movie_title, movie_id=None):
+
+        #A movie already in the index reuses its video IDs, which saves the 100 quota units of a search
+        video_ids = self._indexed_video_ids(movie_id)
+
+        if video_ids is not None:
+
+            return video_ids
+
+        #Once the YouTube quota is used up the remaining searches are skipped instead of spending more requests
+        if self.youtube_quota_exhausted:
+
+            raise QuotaExceededError("YouTube API quota exceeded")
+
+        return self._index_video_ids(movie_id, self.youtube_data_source.search_videos_by_title(movie_title))
+
+    def _indexed_video_ids(self, movie_id):
+
+        if self.id_index is None or movie_id is None:
+
+            return None
+
+        return self.id_index.video_ids(movie_id)
+
+    def _index_video_ids(self, movie_id, video_ids):
+
+        #Empty results are not indexed so a movie whose trailer is not up yet gets searched for again next run
+        if self.id_index is not None and movie_id is not None and isinstance(video_ids, list) and video_ids:
+
+            self.id_index.update(movie_id, video_ids=video_ids)
+
+        return video_ids
+
+    def _assemble_movie_data(self, lookups, video_stats):
+
+        #Builds the integrated record of each movie, using the recorded error in place of the stats when the YouTube lookups failed. 
+        return [self._build_movie_data(movie_id, movie_details, imdb_movie_details, video_ids, error_stats if error_stats is not None else [video_stats.get(video_id) or ErrorMarker(YOUTUBE_ERROR_MESSAGE, 'youtube', 'quota') for video_id in video_ids]) for movie_id, movie_details, imdb_movie_details, video_ids, error_stats in lookups]
+
+    def _handle_youtube_error(self, error):
+
+        #Records the error in place of the stats. When the quota is used up the run carries on without YouTube data and keeps the results it already has. 
+        if isinstance(error, QuotaExceededError) or 'quota exceeded' in str(error).lower():
+
+            if not self.youtube_quota_exhausted:
+
+                self.youtube_quota_exhausted = True
+                print(f"{YOUTUBE_ERROR_MESSAGE}")
+
+            return [ErrorMarker(YOUTUBE_ERROR_MESSAGE, 'youtube', 'quota')]
+
+        #Any other failure, such as YouTube being down, only affects the movie it happened on
+        return [ErrorMarker.from_error('youtube', error)]
+
+    def _build_movie_data(self, movie_id, movie_details, imdb_movie_details, youtube_video_ids, youtube_video_stats, errors=(), fresh_video_ids=None):
+
+        #Compiles the integrated movie data including TMDb details and YouTube video stats into a compact record. 
+        #The OMDb numbers are parsed here once, so the analysis never has to parse them again. 
+        tmdb_details = TMDbDetails.from_dict(movie_details)
+        errors = list(errors)
+
+        if isinstance(imdb_movie_details, ErrorMarker):
+
+            errors.append(imdb_movie_details)
+            imdb_movie_details = None
+
+        video_stats = tuple(_video_stats_record(stat) for stat in youtube_video_stats)
+
+        #Each distinct YouTube error is listed once with the record's errors
+        for stat in video_stats:
+
+            if isinstance(stat, ErrorMarker) and stat not in errors:
+
+                errors.append(stat)
+
+        #Only stats just fetched go to the history, stats carried over from the last snapshot would add a flat sample with a new timestamp
+        if self.stats_history is not None:
+
+            self.stats_history.append(movie_id, {video_id: stat for video_id, stat in zip(youtube_video_ids, video_stats) if fresh_video_ids is None or video_id in fresh_video_ids})
+
+        return MovieRecord(
+
+            tmdb_details.title,
+            movie_id,
+            tmdb_details,
+            OMDbInfo.from_dict(imdb_movie_details) if imdb_movie_details else None,
+            tuple(youtube_video_ids),
+            video_stats,
+            tuple(errors)
+
+        )
+    
+    def perform_analysis(self, integrated_data):
+
+        #Computes every metric in one columnar pass, prints the report and returns the structured results
+        analysis = self.analyze(integrated_data)
+        columns = analysis['columns']
+
+        print("\n--- Movie Popularity and Engagement Analysis ---\n")
+        print("------------------------------------------------\n")
+
+        for index, title in enumerate(analysis['titles']):
+
+            budget = columns['budget'][index]
+            imdb_rating = columns['imdb_rating'][index]
+
+            print(f"  Title: {title}")
+            print(f"  Budget: ${budget:,} USD" if budget else "N/A")
+            print(f"  TMDb Rating: {columns['tmdb_rating'][index]}")
+            print(f"  IMDb Rating: {'N/A' if np.isnan(imdb_rating) else imdb_rating}")
+            print(f"  Average YouTube Views: {columns['average_views'][index]:,.0f}")
+            print(f"  Average YouTube Likes: {columns['average_likes'][index]:,.0f}")
+            print(f"  Engagement Ratio (Likes/Views): {columns['engagement_ratio'][index]:.2f}%")
+            print(f"  Estimated Revenue from YouTube Engagement From 3 Videos: ${columns['potential_revenue'][index]:,.2f}\n")
+
+            if 'views_per_day' in columns and not np.isnan(columns['views_per_day'][index]):
+
+                print(f"  YouTube Views Per Day: {columns['views_per_day'][index]:,.0f}")
+                print(f"  YouTube Likes Per Day: {columns['likes_per_day'][index]:,.0f}\n")
+
+            print("------------------------------------------------\n")
+
+        correlations = analysis['correlations']
+
+        if analysis['titles']:
+
+            print("  Correlations:")
+            print(f"  TMDb vs IMDb Rating: {_format_correlation(correlations['tmdb_vs_imdb_rating'])}")
+            print(f"  Budget vs Engagement Ratio: {_format_correlation(correlations['budget_vs_engagement_ratio'])}")
+            print(f"  Budget vs Average YouTube Views: {_format_correlation(correlations['budget_vs_average_views'])}\n")
+            print("------------------------------------------------\n")
+
+        return analysis
+
+    def analyze(self, integrated_data):
+
+        #Loads the integrated data into NumPy columns and computes the engagement metrics for every movie at once. 
+        #Returns the titles, one array per metric and the cross source correlations. 
+
+        with self._stage('analysis'):
+
+            return self._analyze(integrated_data)
+
+    def _analyze(self, integrated_data):
+
+        titles, budgets, tmdb_ratings, imdb_ratings = [], [], [], []
+        video_movies, video_views, video_likes = [], [], []
+        views_per_day, likes_per_day = [], []
+
+        #Flattens the videos of every movie into columns tagged with the movie's position
+        for index, movie_data in enumerate(integrated_data):
+
+            tmdb_details = movie_data['tmdb_details']
+            titles.append(movie_data['title'])
+            budgets.append(tmdb_details.get('budget') or 0)
+            tmdb_ratings.append(_to_float(tmdb_details.get('average_rating')))
+            imdb_ratings.append(_to_float((movie_data['imdb_details'] or {}).get('Average Review')))
+
+            if self.stats_history is not None:
+
+                growth = self.stats_history.movie_growth(movie_data['tmdb_id'], self.growth_window) or {}
+                views_per_day.append(growth.get('views_per_day', np.nan))
+                likes_per_day.append(growth.get('likes_per_day', np.nan))
+
+            #Error entries recorded in place of the stats are left out of the averages
+            for stat in movie_data['youtube_videos_stats']:
+
+                if 'views' in stat:
+
+                    video_movies.append(index)
+                    video_views.append(stat['views'])
+                    video_likes.append(stat['likes'])
+
+        movie_count = len(titles)
+        video_movies = np.asarray(video_movies, dtype=np.int64)
+        video_counts = np.bincount(video_movies, minlength=movie_count)
+        total_views = np.bincount(video_movies, weights=np.asarray(video_views, dtype=np.float64), minlength=movie_count)
+        total_likes = np.bincount(video_movies, weights=np.asarray(video_likes, dtype=np.float64), minlength=movie_count)
+
+        average_views = np.divide(total_views, video_counts, out=np.zeros(movie_count), where=video_counts > 0)
+        average_likes = np.divide(total_likes, video_counts, out=np.zeros(movie_count), where=video_counts > 0)
+        engagement_ratio = np.divide(average_likes, average_views, out=np.zeros(movie_count), where=average_views > 0) * 100
+        potential_revenue = average_likes * AVERAGE_TICKET_PRICE * LIKES_TO_TICKETS_RATE
+
+        budget = np.asarray(budgets, dtype=np.int64)
+        tmdb_rating = np.asarray(tmdb_ratings, dtype=np.float64)
+        imdb_rating = np.asarray(imdb_ratings, dtype=np.float64)
+
+        #A budget of 0 means TMDb does not know it, so it is left out of the budget correlations
+        known_budget = np.where(budget > 0, budget, np.nan)
+
+        analysis = {
+
+            'titles': titles,
+            'columns': {
+
+                'budget': budget,
+                'tmdb_rating': tmdb_rating,
+                'imdb_rating': imdb_rating,
+                'video_count': video_counts,
+                'average_views': average_views,
+                'average_likes': average_likes,
+                'engagement_ratio': engagement_ratio,
+                'potential_revenue': potential_revenue
+
+            },
+            'correlations': {
+
+                'tmdb_vs_imdb_rating': _correlation(tmdb_rating, imdb_rating),
+                'budget_vs_engagement_ratio': _correlation(known_budget, engagement_ratio),
+                'budget_vs_average_views': _correlation(known_budget, average_views)
+
+            }
+
+        }
+
+        #Growth over the window from the stats history, NaN for movies without two snapshots yet
+        if self.stats_history is not None:
+
+            analysis['columns']['views_per_day'] = np.asarray(views_per_day, dtype=np.float64)
+            analysis['columns']['likes_per_day'] = np.asarray(likes_per_day, dtype=np.float64)
+
+        return analysis
+
+    def print_movie_analysis(self, movie_data):
+
+        #Prints the engagement analysis of one integrated movie, used directly when the records are streamed
+
+        title = movie_data['title']
+        tmdb_details = movie_data['tmdb_details'] 
+        budget = tmdb_details['budget']
+        tmdb_rating = movie_data['tmdb_details']['average_rating']
+        imdb_rating = (movie_data['imdb_details'] or {}).get('Average Review', 'N/A')
+        #Error entries recorded in place of the stats are left out of the averages
+        metrics = movie_metrics(movie_data)
+        youtube_views = metrics['average_views']
+        youtube_likes = metrics['average_likes']
+        engagement_ratio = metrics['engagement_ratio']
+        potential_revenue = metrics['potential_revenue']  # Assuming 10% of likes convert to movie ticket purchases
+
+        print(f"  Title: {title}")
+        print(f"  Budget: ${budget:,} USD" if budget else "N/A")
+        print(f"  TMDb Rating: {tmdb_rating}")
+        print(f"  IMDb Rating: {imdb_rating}")
+        print(f"  Average YouTube Views: {youtube_views:,.0f}")
+        print(f"  Average YouTube Likes: {youtube_likes:,.0f}")
+        print(f"  Engagement Ratio (Likes/Views): {engagement_ratio:.2f}%")
+        print(f"  Estimated Revenue from YouTube Engagement From 3 Videos: ${potential_revenue:,.2f}\n")
+
+        growth = self.stats_history.movie_growth(movie_data['tmdb_id'], self.growth_window) if self.stats_history is not None else None
+
+        if growth:
+
+            print(f"  YouTube Views Per Day: {growth['views_per_day']:,.0f}")
+            print(f"  YouTube Likes Per Day: {growth['likes_per_day']:,.0f}\n")
+
+        print("------------------------------------------------\n")
+
+class AsyncIntegratedData(IntegratedData):
+
+    #Asyncio driver for the async data sources. Every movie is looked up at the same time and the transport's semaphore bounds the requests in flight. 
+    #The records, error handling and analysis are the same as IntegratedData. The ID index, stats history and snapshot store are SQLite and file I/O, 
+    #they are called in a worker thread with asyncio.to_thread so the event loop keeps serving the other movies meanwhile. 
+
+    async def integrate_popular_movies_youtube_data(self):
+
+        self._start_run()
+
+        with self._stage('popular'):
+
+            popular_movies = await self.tmdb_data_source.fetch_most_popular_movies()
+
+        if not isinstance(popular_movies, list):
+
+            print(f"Could not fetch the popular movies: {popular_movies}")
+            return []
+
+        return await self.integrate_movies(popular_movies)
+
+    async def refresh_incremental(self, snapshot_store, movie_count=None, popular_movies=None):
+
+        #Async counterpart of IntegratedData.refresh_incremental, the new movies are integrated concurrently
+        self._start_run()
+
+        previous = await asyncio.to_thread(snapshot_store.load)
+
+        if popular_movies is not None:
+
+            popular_movies = list(popular_movies)
+
+        elif movie_count is None:
+
+            popular_movies = await self.tmdb_data_source.fetch_most_popular_movies()
+
+        else:
+
+            popular_movies = [movie async for movie in self.tmdb_data_source.iter_popular_movies(movie_count)]
+
+        if not isinstance(popular_movies, list):
+
+            return list(previous.values()), {'added': [], 'removed': [], 'updated': []}
+
+        kept, new_movies = self._split_refresh(previous, popular_movies)
+        new_records = {str(record['tmdb_id']): record for record in await self.integrate_movies(new_movies)} if new_movies else {}
+
+        with self._stage('refresh'):
+
+            video_stats = await self._fetch_video_stats_async([video_id for record in kept for video_id in record['youtube_video_ids']])
+
+        integrated_data, delta = await self._run_blocking(self._merge_refresh, previous, popular_movies, kept, new_records, video_stats)
+        await asyncio.to_thread(snapshot_store.save, integrated_data)
+        return integrated_data, delta
+
+    async def stream_pipelined_movies(self, movies):
+
+        #Async generator counterpart of IntegratedData.stream_pipelined_movies. Every movie is looked up at once, its stats are fetched as soon as 
+        #its own search returns, and each record is yielded as soon as it is complete, in completion order. 
+        self._start_run()
+        movies = [movie async for movie in movies] if hasattr(movies, '__aiter__') else list(movies)
+        tasks = [asyncio.ensure_future(self._pipelined_movie(movie)) for movie in movies]
+
+        try:
+
+            #The movies overlap, so the whole stream is timed as one integrate stage
+            with self._stage('integrate'):
+
+                for next_record in asyncio.as_completed(tasks):
+
+                    movie_data = await next_record
+
+                    if movie_data is not None:
+
+                        yield movie_data
+
+        finally:
+
+            #A consumer that stops early does not leave lookups running
+            for task in tasks:
+
+                task.cancel()
+
+    async def _pipelined_movie(self, movie):
+
+        lookup = await self._lookup_movie(movie)
+
+        if not lookup:
+
+            return None
+
+        video_stats = await self._fetch_video_stats_async(lookup[3])
+        return (await self._run_blocking(self._assemble_movie_data, [lookup], video_stats))[0]
+
+    async def stream_popular_movies_youtube_data(self, movie_count, prefetch=1, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+
+        #Async generator over the integrated records of the top movie_count popular movies
+        async for movie_data in self.iter_integrated_movies(self.tmdb_data_source.iter_popular_movies(movie_count, prefetch), chunk_size):
+
+            yield movie_data
+
+    async def iter_integrated_movies(self, movies, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+
+        #Integrates an iterable or async iterable of movies chunk by chunk and yields the records in the original order
+        self._start_run()
+        chunk = []
+
+        async for movie in (movies if hasattr(movies, '__aiter__') else _as_async_iterator(movies)):
+
+            chunk.append(movie)
+
+            if len(chunk) >= chunk_size:
+
+                for movie_data in await self.integrate_movies(chunk):
+
+                    yield movie_data
+
+                chunk = []
+
+        if chunk:
+
+            for movie_data in await self.integrate_movies(chunk):
+
+                yield movie_data
+
+    async def integrate_movies(self, movies):
+
+        #Looks up every movie concurrently, then resolves all of their videos in batched stats requests
+        with self._stage('integrate'):
+
+            lookups = [lookup for lookup in await asyncio.gather(*(self._lookup_movie(movie) for movie in movies)) if lookup]
+            video_stats = await self._fetch_video_stats_async([video_id for lookup in lookups for video_id in lookup[3]])
+
+            return await self._run_blocking(self._assemble_movie_data, lookups, video_stats)
+
+    async def _run_blocking(self, function, *args):
+
+        #Building the records appends to the stats history and the lookups read and write the ID index, 
+        #without either of them there is no I/O and the call stays on the event loop
+        if self.id_index is None and self.stats_history is None:
+
+            return function(*args)
+
+        return await asyncio.to_thread(function, *args)
+
+    async def _lookup_movie(self, movie):
+
+        try:
+
+            movie_details = await self.tmdb_data_source.fetch_movie_details_with_credits(movie['id'])
+
+        except Exception as e:
+
+            print(f"Skipping movie {movie['id']}: {e}")
+            return None
+
+        if not movie_details:
+
+            return None
+
+        #The OMDb lookup and YouTube search only need the title, so they run at the same time
+        movie_title = movie_details['title']
+        imdb_movie_details, video_ids = await asyncio.gather(self._fetch_imdb_info_async(movie_title, await self._run_blocking(self._imdb_id, movie['id'], movie_details)), self._search_youtube_videos_async(movie_title, movie['id']), return_exceptions=True)
+
+        if isinstance(imdb_movie_details, BaseException):
+
+            raise imdb_movie_details
+
+        if isinstance(video_ids, Exception):
+
+            return (movie['id'], movie_details, imdb_movie_details, [], self._handle_youtube_error(video_ids))
+
+        return (movie['id'], movie_details, imdb_movie_details, video_ids, None)
+
+    async def _fetch_imdb_info_async(self, movie_title, imdb_id=None):
+
+        try:
+
+            if imdb_id and hasattr(self.imdb_data_source, 'get_movie_info_by_id'):
+
+                return await self.imdb_data_source.get_movie_info_by_id(imdb_id)
+
+            return await self.imdb_data_source.get_movie_info(movie_title)
+
+        except Exception as e:
+
+            print(f"No IMDb information for {movie_title}: {e}")
+            return ErrorMarker.from_error('imdb', e)
+
+    async def _search_youtube_videos_async(self, movie_title, movie_id=None):
+
+        video_ids = await self._run_blocking(self._indexed_video_ids, movie_id)
+
+        if video_ids is not None:
+
+            return video_ids
+
+        if self.youtube_quota_exhausted:
+
+            raise QuotaExceededError("YouTube API quota exceeded")
+
+        return await self._run_blocking(self._index_video_ids, movie_id, await self.youtube_data_source.search_videos_by_title(movie_title))
+
+    async def _fetch_video_stats_async(self, video_ids):
+
+        if self.youtube_quota_exhausted or not video_ids:
+
+            return {}
+
+        try:
+
+            return _checked_video_stats(video_ids, await self.youtube_data_source.fetch_video_stats_batch(video_ids))
+
+        except Exception as e:
+
+            error_stats = self._handle_youtube_error(e)
+            return {video_id: error_stats[0] for video_id in video_ids}
+
+class RateLimitManager(BaseManager):
+
+    #Hosts one RateLimiter in a server process so every worker process of a sharded run draws on the same budget
+
+    pass
+
+def _manager_rate_limiter(limits=None, costs=None, usage_path=None):
+
+    #Runs in the manager process. The quota usage is kept in the response cache file, like in a single process run, 
+    #so every shard charges the budget already spent today and what the shards spend is there for the next run
+    return RateLimiter(limits, costs, usage_store=ResponseCache(usage_path) if usage_path else None)
+
+RateLimitManager.register('RateLimiter', _manager_rate_limiter)
+
+class SharedRateLimiter:
+
+    #Worker side handle on the RateLimiter hosted by a RateLimitManager. The quota and token bucket live in the manager, 
+    #the waiting happens in the worker so no manager thread is held while a request waits for its turn. 
+
+    def __init__(self, limiter, costs=None, sleep=time.sleep):
+
+        self.limiter = limiter
+        self.costs = dict(ENDPOINT_QUOTA_COSTS)
+        self.costs.update(costs or {})
+        self.sleep = sleep
+
+    def acquire(self, source, endpoint=None, charge=True):
+
+        if charge:
+
+            self.limiter.charge(source, self.costs.get(endpoint, 1))
+
+        wait = self.limiter.wait_time(source)
+
+        while wait > 0:
+
+            self.sleep(wait)
+            wait = self.limiter.wait_time(source)
+
+    def charge(self, source, units):
+
+        self.limiter.charge(source, units)
+
+    def exhaust(self, source):
+
+        self.limiter.exhaust(source)
+
+    def quota_remaining(self, source):
+
+        return self.limiter.quota_remaining(source)
+
+    def throttled(self, source):
+
+        self.limiter.throttled(source)
+
+    def succeeded(self, source):
+
+        self.limiter.succeeded(source)
+
+#Integration handler of the current worker process, built once by _init_shard_worker
+_shard_worker = None
+
+def _init_shard_worker(config, limiter):
+
+    #Gives each worker process its own data sources, connection pools and circuit breaker, sharing only the rate limit budget. 
+    #The response cache and ID index are opened on the same SQLite files as the other workers, SQLite serializes their writes. 
+    global _shard_worker
+
+    rate_limiter = SharedRateLimiter(limiter, config['costs']) if limiter is not None else None
+    cache = ResponseCache(config['cache_path'], max_bytes=config['cache_max_bytes']) if config['cache_path'] else None
+    circuit_breaker = CircuitBreaker(config['breaker_threshold'], config['breaker_reset'])
+    transport = HTTPTransport(pool_size=max(max(config['source_concurrency'].values()), config['pool_size']), cache=cache, rate_limiter=rate_limiter, max_retries=config['max_retries'], circuit_breaker=circuit_breaker)
+    id_index = IDIndex(config['id_index_path'], config['id_index_max_age']) if config['id_index_path'] else None
+    youtube_ds = YouTubeDataSource(config['api_keys']['youtube'], transport)
+    tmdb_ds = TMDbDataSource(config['api_keys']['tmdb'], transport)
+    imdb_ds = IMDb(config['api_keys']['imdb'], transport)
+
+    for source, data_source in (('youtube', youtube_ds), ('tmdb', tmdb_ds), ('imdb', imdb_ds)):
+
+        if source in config['base_urls']:
+
+            data_source.base_url = config['base_urls'][source]
+
+    _shard_worker = IntegratedData(youtube_ds, tmdb_ds, imdb_ds, concurrent=config['concurrent'], source_concurrency=config['source_concurrency'], id_index=id_index)
+
+def _integrate_shard(movies):
+
+    return _shard_worker._integrate_chunk(movies)
+
+class ShardedRunner:
+
+    #Integrates a long list of movies across a pool of worker processes, so decoding and record building are not limited to one core by the GIL. 
+    #Each worker has its own data sources and connection pools. The rate limits and daily quotas are shared through a RateLimitManager process, 
+    #so the whole run stays within one budget however many workers there are. 
+
+    def __init__(self, youtube_api_key, tmdb_api_key, imdb_api_key, processes=None, shard_size=50, rate_limits=None, costs=None, concurrent=True, source_concurrency=None, max_retries=2, base_urls=None, cache_path=None, cache_max_bytes=64 * 1024 * 1024, pool_size=10, breaker_threshold=5, breaker_reset=30, id_index_path=None, id_index_max_age=None):
+
+        self.processes = processes or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.rate_limits = rate_limits
+        #SQLite file of the response cache, the daily quota usage is read from it and recorded in it
+        self.cache_path = cache_path
+        self.config = {
+
+            'api_keys': {'youtube': youtube_api_key, 'tmdb': tmdb_api_key, 'imdb': imdb_api_key},
+            'costs': costs,
+            'concurrent': concurrent,
+            'source_concurrency': dict(DEFAULT_SOURCE_CONCURRENCY, **(source_concurrency or {})),
+            'max_retries': max_retries,
+            'base_urls': dict(base_urls or {}),
+            'cache_path': cache_path,
+            'cache_max_bytes': cache_max_bytes,
+            'pool_size': pool_size,
+            'breaker_threshold': breaker_threshold,
+            'breaker_reset': breaker_reset,
+            'id_index_path': id_index_path,
+            'id_index_max_age': id_index_max_age
+
+        }
+
+    def run(self, movies):
+
+        #Splits the movies (TMDb movie dictionaries or bare TMDb IDs) into shards and returns the merged records in the original order
+        movies = [movie if isinstance(movie, dict) else {'id': movie} for movie in movies]
+        shards = [movies[start:start + self.shard_size] for start in range(0, len(movies), self.shard_size)]
+
+        if not shards:
+
+            return []
+
+        with RateLimitManager() as manager:
+
+            limiter = manager.RateLimiter(self.rate_limits, self.config['costs'], self.cache_path)
+
+            with ProcessPoolExecutor(max_workers=min(self.processes, len(shards)), initializer=_init_shard_worker, initargs=(self.config, limiter)) as pool:
+
+                return [movie_data for shard_records in pool.map(_integrate_shard, shards) for movie_data in shard_records]
+
+class ServiceSnapshot:
+
+    #One refresh of the integrated data as served by the service. It is never changed once built, and the JSON bodies are rendered up front, 
+    #so answering a request is a dictionary lookup and a socket write. 
+
+    def __init__(self, records, generation=0, generated_at=None, analysis=None):
+
+        self.records = tuple(records)
+        self.generation = generation
+        self.generated_at = time.time() if generated_at is None else generated_at
+        self.etag = f'"{generation}-{int(self.generated_at)}"'
+
+        #Each movie is encoded once, the full list is the movie bodies joined together
+        self.movie_bodies = {str(record['tmdb_id']): json.dumps(_export_value(record)).encode() for record in self.records}
+        self.movies_body = b'[' + b','.join(self.movie_bodies[str(record['tmdb_id'])] for record in self.records) + b']'
+        self.analysis_body = json.dumps(_analysis_summary(analysis)).encode()
+
+def _analysis_summary(analysis):
+
+    #Turns the NumPy columns of IntegratedData.analyze into one JSON ready dictionary per movie, unknown values become null
+    if analysis is None:
+
+        return {'movies': [], 'correlations': {}}
+
+    columns = analysis['columns']
+    movies = []
+
+    for index, title in enumerate(analysis['titles']):
+
+        movie = {'title': title}
+
+        for name, column in columns.items():
+
+            value = column[index].item()
+            movie[name] = value if value == value else None
+
+        movies.append(movie)
+
+    return {'movies': movies, 'correlations': analysis['correlations']}
+
+class MovieService:
+
+    #Keeps the integrated data in memory for the HTTP service and refreshes it on a background thread. 
+    #A refresh builds a whole new snapshot before swapping it in, so readers always see either the old snapshot or the new one and never wait on the APIs. 
+
+    def __init__(self, integrated_data_handler, refresh_interval=3600, movie_count=None, snapshot_store=None, clock=time.time, movie_source=None):
+
+        self.integrated_data_handler = integrated_data_handler
+        self.refresh_interval = refresh_interval
+        self.movie_count = movie_count
+        #Optional callable returning the movies to integrate in place of the popular list, called again on each refresh
+        self.movie_source = movie_source
+        #With a snapshot store each refresh is incremental and survives restarts
+        self.snapshot_store = snapshot_store
+        self.clock = clock
+
+        self.refreshes = self.failures = 0
+        self.last_error = None
+        self.last_refresh_seconds = None
+
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        #Serves the records saved by the last run straight away, before the first refresh has finished
+        self.snapshot = self._build_snapshot(list(snapshot_store.load().values()) if snapshot_store is not None else [], 0)
+
+    def refresh(self):
+
+        #Integrates the data again and swaps the new snapshot in. Returns False and keeps serving the current snapshot when the refresh fails
+        with self._refresh_lock:
+
+            started = time.perf_counter()
+
+            try:
+
+                records = self._integrate()
+
+                #An empty result means the popular list could not be fetched, which is no reason to stop serving the current data
+                if not records:
+
+                    raise RuntimeError("No movies were integrated")
+
+                snapshot = self._build_snapshot(records, self.snapshot.generation + 1)
+
+            except Exception as e:
+
+                self.failures += 1
+                self.last_error = str(e)
+                print(f"Refresh failed, still serving snapshot {self.snapshot.generation}: {e}")
+                return False
+
+            #Replacing the attribute is atomic, requests already holding the old snapshot finish with it undisturbed
+            self.snapshot = snapshot
+            self.refreshes += 1
+            self.last_error = None
+            self.last_refresh_seconds = time.perf_counter() - started
+            return True
+
+    def _integrate(self):
+
+        handler = self.integrated_data_handler
+        movies = self.movie_source() if self.movie_source is not None else None
+
+        if self.snapshot_store is not None:
+
+            return handler.refresh_incremental(self.snapshot_store, self.movie_count, movies)[0]
+
+        if movies is not None:
+
+            return list(handler.iter_integrated_movies(movies))
+
+        if self.movie_count:
+
+            return list(handler.stream_popular_movies_youtube_data(self.movie_count))
+
+        return handler.integrate_popular_movies_youtube_data()
+
+    def _build_snapshot(self, records, generation):
+
+        #The analysis is computed with the snapshot so the analysis endpoint costs nothing per request
+        analysis = self.integrated_data_handler.analyze(records) if records else None
+        return ServiceSnapshot(records, generation, self.clock(), analysis)
+
+    def start(self):
+
+        #Starts the refresh thread, the first refresh runs straight away
+        if self._thread is None:
+
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._refresh_forever, name='movie-service-refresh', daemon=True)
+            self._thread.start()
+
+    def _refresh_forever(self):
+
+        #Waiting on the event instead of sleeping lets stop() end the wait straight away
+        while True:
+
+            self.refresh()
+
+            if self._stopped.wait(self.refresh_interval):
+
+                return
+
+    def stop(self):
+
+        self._stopped.set()
+
+        if self._thread is not None:
+
+            self._thread.join()
+            self._thread = None
+
+    def health(self):
+
+        snapshot = self.snapshot
+
+        return {
+
+            'generation': snapshot.generation,
+            'movies': len(snapshot.records),
+            'generated_at': snapshot.generated_at,
+            'age_seconds': self.clock() - snapshot.generated_at,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'last_refresh_seconds': self.last_refresh_seconds,
+            'refresh_interval': self.refresh_interval
+
+        }
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+
+    #Answers from the service's current snapshot: /movies, /movies/<tmdb_id>, /analysis, /health and /metrics. 
+    #The snapshot is read once per request, so a swap in the middle of a request cannot mix two refreshes. 
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+
+        service = self.server.service
+        snapshot = service.snapshot
+        path = urlsplit(self.path).path.rstrip('/') or '/'
+
+        if path == '/health':
+
+            return self._send(200, json.dumps(service.health()).encode())
+
+        if path == '/metrics':
+
+            instrumentation = service.integrated_data_handler.instrumentation
+
+            if instrumentation is None:
+
+                return self._send(404, b'{"error": "Metrics are not enabled"}')
+
+            return self._send(200, instrumentation.render_prometheus().encode(), 'text/plain; version=0.0.4')
+
+        if path in ('/', '/movies'):
+
+            body = snapshot.movies_body
+
+        elif path == '/analysis':
+
+            body = snapshot.analysis_body
+
+        elif path.startswith('/movies/'):
+
+            body = snapshot.movie_bodies.get(path[len('/movies/'):])
+
+            if body is None:
+
+                return self._send(404, b'{"error": "Unknown movie"}')
+
+        else:
+
+            return self._send(404, b'{"error": "Not found"}')
+
+        #Consumers polling the service only download the data again after a refresh
+        if self.headers.get('If-None-Match') == snapshot.etag:
+
+            return self._send(304, etag=snapshot.etag)
+
+        self._send(200, body, etag=snapshot.etag)
+
+    def _send(self, status, body=b'', content_type='application/json', etag=None):
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+
+        if etag:
+
+            self.send_header('ETag', etag)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+
+        #Keeps the console for the refresh messages instead of one line per request
+        pass
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+
+    #Threaded HTTP server bound to a MovieService, each connection is answered on its own thread
+
+    daemon_threads = True
+
+    def __init__(self, address, service):
+
+        self.service = service
+        super().__init__(address, ServiceRequestHandler)
+
+def movie_metrics(movie_data):
+
+    #The engagement metrics of one integrated movie, the same numbers the analysis reports. Unknown ratings are NaN
+    video_stats = [stat for stat in movie_data['youtube_videos_stats'] if 'views' in stat]
+    average_views = sum(stat['views'] for stat in video_stats) / len(video_stats) if video_stats else 0
+    average_likes = sum(stat['likes'] for stat in video_stats) / len(video_stats) if video_stats else 0
+    tmdb_rating = _to_float(movie_data['tmdb_details'].get('average_rating'))
+    imdb_rating = _to_float((movie_data['imdb_details'] or {}).get('Average Review'))
+
+    return {
+
+        'video_count': len(video_stats),
+        'average_views': average_views,
+        'average_likes': average_likes,
+        'engagement_ratio': (average_likes / average_views) * 100 if average_views else 0,
+        'potential_revenue': average_likes * AVERAGE_TICKET_PRICE * LIKES_TO_TICKETS_RATE,
+        'rating_gap': abs(tmdb_rating - imdb_rating)
+
+    }
+
+#Metrics a leaderboard can rank by
+LEADERBOARD_METRICS = ('engagement_ratio', 'potential_revenue', 'average_views', 'average_likes', 'rating_gap')
+
+class Leaderboard:
+
+    #Keeps the top k movies by one metric out of a stream of integrated records. A min-heap of size k holds the current top, 
+    #so each record costs O(log k) and memory stays bounded by k however many movies go through. 
+
+    def __init__(self, metric, k=10, min_budget=None, max_budget=None, min_ratings=None, predicate=None):
+
+        if metric not in LEADERBOARD_METRICS:
+
+            raise ValueError(f"Unknown leaderboard metric {metric!r}, expected one of {', '.join(LEADERBOARD_METRICS)}")
+
+        self.metric = metric
+        self.k = k
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.min_ratings = min_ratings
+        #Any further filter, called with the record and its metrics
+        self.predicate = predicate
+        self.seen = self.matched = 0
+        self._heap = []
+
+    def accepts(self, movie_data, metrics):
+
+        budget = movie_data['tmdb_details'].get('budget') or 0
+
+        #A budget of 0 means TMDb does not know it, such movies never match a budget range
+        if (self.min_budget is not None or self.max_budget is not None) and not budget:
+
+            return False
+
+        if self.min_budget is not None and budget < self.min_budget:
 
-    def __init__(self, api_key):
+            return False
 
-        #Initializes the data source with a given YouTube API key and sets the base URL for the YouTube API
+        if self.max_budget is not None and budget > self.max_budget:
 
-        self.api_key = api_key
-        self.base_url = 'https://www.googleapis.com/youtube/v3/'
+            return False
 
-    def search_videos_by_title(self, title):
+        if self.min_ratings is not None and (movie_data['tmdb_details'].get('number_of_ratings') or 0) < self.min_ratings:
 
-        #Search YouTube for videos matching the given movie title and returns their IDs.
+            return False
 
-        #Constructs the search URL with the API key and search title and asks to recieve 3 videos from YouTube
-        search_url = f'{self.base_url}search?key={self.api_key}&q={title}&part=snippet&type=video&maxResults=3'
-        #Performs the HTTP GET request to the YouTube API
-        response = requests.get(search_url) 
+        return self.predicate is None or self.predicate(movie_data, metrics)
 
-        #Checks the response status code is accepted
-        if response.status_code == 200:
+    def add(self, movie_data, metrics=None):
 
-            #Extracts the video IDs from the search results and returns them as a list
-            return [item['id']['videoId'] for item in response.json()['items']]
-        
-        if response.status_code == 200:
+        #Offers one record to the leaderboard. Movies whose metric is unknown, such as a rating gap without an IMDb rating, are left out
+        metrics = movie_metrics(movie_data) if metrics is None else metrics
+        self.seen += 1
 
-            return [item['id']['videoId'] for item in response.json()['items']]
-        
-        elif response.status_code == 403:  # Assuming 403 is the status code for quota exceeded
+        if not self.accepts(movie_data, metrics):
 
-            raise Exception("YouTube API quota exceeded")
-        
-        else:
-            
-            return []  # Return an empty list or consider raising a different exception for other error conditions
+            return
 
-    def fetch_video_stats(self, video_id):
+        score = metrics[self.metric]
 
-        #Fetches statistics for a given video ID
+        if score != score:
 
-        #Constructs the URL to get the video statistics and snippet information using the video ID
-        stats_url = f'{self.base_url}videos?key={self.api_key}&id={video_id}&part=statistics,snippet'
-        #Performs the HTTP GET request to the YouTube API
-        response = requests.get(stats_url)
+            return
 
-        #Checks the response status code is accepted
-        if response.status_code == 200:
+        self.matched += 1
 
-            #Extracts the only item in the response
-            item = response.json()['items'][0]
-            #Extracts the statistics part of the item
-            stats_data = item['statistics']
-            #Extracts the snippet part of the item which contains the title and channel information. 
-            snippet = item['snippet']
+        #On equal scores the movie seen first stays on the board
+        entry = (score, -self.seen, movie_data['title'], movie_data['tmdb_id'], metrics)
 
-            return {
+        if len(self._heap) < self.k:
 
-                #Returns a dictionary containing the channel name, video title, view count, and like count. 
+            heapq.heappush(self._heap, entry)
 
-                'channelName': snippet['channelTitle'],
-                'videoTitle': snippet['title'],
-                'views': int(stats_data.get('viewCount', 0)),
-                'likes': int(stats_data.get('likeCount', 0))
+        elif entry > self._heap[0]:
 
-            }
-        
-        else:
+            heapq.heapreplace(self._heap, entry)
 
-            #Returns a dictionary with empty values if the request was unsuccessful. 
-            return {'channelName': '', 'videoTitle': '', 'views': 0, 'likes': 0}
+    def extend(self, integrated_data):
 
-class TMDbDataSource:
+        for movie_data in integrated_data:
 
-    #Fetches movie data from the TMDb API
+            self.add(movie_data)
 
-    def __init__(self, api_key):
+        return self
 
-        #Initializes the data source with a given TMDb API key and sets the base URL for the TMDb API
+    def results(self):
 
-        self.api_key = api_key
-        self.base_url = 'https://api.themoviedb.org/3/'
+        #The top movies, best first, as dictionaries with the title, TMDb ID, score and every metric
+        return [dict(metrics, title=title, tmdb_id=tmdb_id, score=score) for score, _, title, tmdb_id, metrics in sorted(self._heap, reverse=True)]
 
-    def fetch_most_popular_movies(self):
+class Leaderboards:
 
-        #Fetches the most popular movies
+    #Several leaderboards fed from one pass over the records, the metrics of each record are computed once for all of them
 
-        try: 
-        
-            #Constructs the URL to get the list of popular movies on the first page with the API key
-            url = f"{self.base_url}movie/popular?api_key={self.api_key}&language=en-US&page=1"
-            #Performs the HTTP GET request to the YouTube API
-            response = requests.get(url)
+    def __init__(self, metrics=LEADERBOARD_METRICS, k=10, **filters):
 
-            #Checks the response status code is accepted
-            if response.status_code == 200:
+        self.boards = [Leaderboard(metric, k, **filters) for metric in metrics]
 
-                #Extracts the top 3 popular movies from the response and returns them. 
-                return response.json()['results'][:3]  
-        
-            else:
-            
-                #Returns an empty list if the request was unsuccessful
-                return []
-            
-        except Exception as e:
+    def add(self, movie_data):
 
-            print(f"Error fetching most popular movies: {e}")
-            return 'Possible Network Error'
+        metrics = movie_metrics(movie_data)
 
-    def fetch_movie_details_with_credits(self, movie_id):
+        for board in self.boards:
 
-        #Fetches movie details, including credits
+            board.add(movie_data, metrics)
 
-        #Constructs the URL to get movie details and credits information using the movie ID
-        details_url = f"{self.base_url}movie/{movie_id}?api_key={self.api_key}&append_to_response=credits"
-        #Performs the HTTP GET request to the YouTube API
-        response = requests.get(details_url)
+    def extend(self, integrated_data):
 
-        #Checks the response status code is accepted
-        if response.status_code == 200:
+        for movie_data in integrated_data:
 
-            data = response.json()
-            
-            #Extracts the director's name from the crewq list where the job title is 'Directore
-            director = next((crew['name'] for crew in data['credits']['crew'] if crew['job'] == 'Director'), None)
-            #Extracts the lead actor's name from the cast list based on the order. This is usually the first person on the cast list so index[0]. 
-            lead_actor = next((cast['name'] for cast in data['credits']['cast'] if cast['order'] == 0), None)
-            #Extracts the movie's budget, defaults to 0 if not available. 
-            budget = data.get('budget', 0)
+            self.add(movie_data)
 
-            return {
+        return self
 
-                #Returns a dictionary containing information about the movie. 
+    def results(self):
 
-                'title': data['title'],
-                'average_rating': data['vote_average'],
-                'number_of_ratings': data['vote_count'],
-                'director': director,
-                'lead_actor': lead_actor,
-                'budget': budget
+        return {board.metric: board.results() for board in self.boards}
 
-            }
-        
-        else:
+def top_movies(integrated_data, metric='engagement_ratio', k=10, **filters):
 
-            #Returns None if the request to fetch movie details was unsuccessful. 
-            return None
+    #Top k movies of any iterable of integrated records, including the streaming generators, without holding the whole stream
+    return Leaderboard(metric, k, **filters).extend(integrated_data).results()
 
-class IMDb:
+async def _as_async_iterator(iterable):
 
-    def __init__(self, api_key):    #initialization
+    for item in iterable:
 
-        self.api_key = api_key
-        self.base_url = "http://www.omdbapi.com/"
+        yield item
 
-    def search(self, title):        #title refers to the movie title
+def _to_float(value):
 
-        parameters= {               # returns movie info in json
-            
-            'apikey': self.api_key,
-            't': title 
-            
-        }
+    #Converts a rating to a float, missing or 'N/A' values become NaN
+    try:
 
-        response = requests.get(self.base_url, params = parameters)
+        return float(value)
 
-        if response.status_code == 200:
+    except (TypeError, ValueError):
 
-            try:
+        return float('nan')
 
-                return response.json()
-            
-            except ValueError:
+def _correlation(first, second):
 
-                return None    
-               
-        else:
+    #Pearson correlation over the movies where both values are known, None when it cannot be computed
+    known = np.isfinite(first) & np.isfinite(second)
 
-            return None
-        
-    def get_movie_info(self, title):
+    if known.sum() < 2 or np.std(first[known]) == 0 or np.std(second[known]) == 0:
 
-        data = self.search(title)
+        return None
 
-        if data and data.get('Response','False') == 'True':
+    return float(np.corrcoef(first[known], second[known])[0, 1])
 
-            return {
+def _format_correlation(value):
 
-                'Director' : data.get('Director', 'N/A'),
-                'Lead Actor' : data.get('Actors', 'N/A').split(',')[0] if data.get('Actors') else 'N/A',
-                'Number of Reviews' : data.get('imdbVotes', 'N/A'),
-                'Average Review' : data.get('imdbRating', 'N/A')
+    return 'N/A' if value is None else f"{value:.2f}"
 
+def print_movie_data(movie_data):
 
-            }
-            
-        else:
+    #Prints the TMDb, IMDb and YouTube data of one integrated movie
 
-            return None
+    print(f"Movie Title: {movie_data.get('title', 'N/A')}")
 
-class IntegratedData:
+    #TMDb Section
 
-    #Integrates YouTube video stats with TMDb movie details
+    print("\nTMDB Data:")
 
-    def __init__(self, youtube_data_source, tmdb_data_source, imdb_data_source):
+    #Retrieves the TMDb details for the movie. 
+    tmdb_details = movie_data.get('tmdb_details', {})
+    #Formats the movie's budget for printing. Displays 'N/A' if the budget is not available. 
+    budget_formatted = f"${tmdb_details['budget']:,} USD" if tmdb_details['budget'] else "N/A"
 
-        #Initializes the integrated data object with YouTube and TMDb data sources.
-        self.youtube_data_source = youtube_data_source
-        self.tmdb_data_source = tmdb_data_source
-        self.imdb_data_source = imdb_data_source
+    print(f"   [Director: {tmdb_details['director']}]")
+    print(f"   [Lead Actor: {tmdb_details['lead_actor']}]")
+    print(f"   [Budget: {budget_formatted}]")
+    print(f"   [Number of Ratings: {tmdb_details['number_of_ratings']}, Average Rating: {tmdb_details['average_rating']}]")
 
-    def integrate_popular_movies_youtube_data(self):
+    #IMDb Section
+    
+    imdb_details = movie_data.get('imdb_details') or {}
+    
+    print("\nIMDb Data:")
+    print(f"   [Director: {imdb_details.get('Director', 'N/A')}]")
+    print(f"   [Lead Actor: {imdb_details.get('Lead Actor', 'N/A')}]")
+    print(f"   [Number of Reviews: {imdb_details.get('Number of Reviews', 'N/A')}, Average Review: {imdb_details.get('Average Review', 'N/A')}]")
+    
+    #YouTube Section 
 
-        #Integrates popular movie data from TMDb with corresponding Youtube video stats. 
+    print("\nYoutube Data:")
 
-        #Fetches the list of most popular movies from TMDb
-        popular_movies = self.tmdb_data_source.fetch_most_popular_movies()
-        
-        #Initializes an empty list to store the integrated movie data. 
-        integrated_data = []
+    #Retrieves YouTube video stats
+    youtube_video_stats = movie_data.get('youtube_videos_stats', [])
+    #Iterates through each YouTube video stat, with an index starting from 1. 
+    for index, video_stat in enumerate(youtube_video_stats, start=1):
 
-        #Iterate over each popular movie fetched from TMDb
-        for movie in popular_movies:
+        print(f"   CHANNEL {index}")                
+        print(f"      [Channel: {video_stat.get('channelName', 'N/A')}]")
+        print(f"      [Title: {video_stat.get('videoTitle', 'N/A')}]")
+        print(f"      [Views: {video_stat.get('views', 0)}, Likes: {video_stat.get('likes', 0)}]")
 
-            #Fetched movie details including credits. 
-            movie_details = self.tmdb_data_source.fetch_movie_details_with_credits(movie['id'])
+    print("\n------------------------------------------------")
 
-            #Checks if movie details were successfully fetched
-            if movie_details:
+def print_delta(delta):
 
-                #Extracts the movie title from the details.
-                movie_title = movie_details['title']
-                imdb_movie_details = self.imdb_data_source.get_movie_info(movie_title)
-                youtube_video_stats = [{"error": "No Youtube results available (Youtube API quota reached, try using a new key). No information Available."}]
+    #Prints the movies added to and removed from the popular list and the YouTube changes since the previous run
 
-                try:
+    print(f"\nChanges since the last run: {len(delta['added'])} added, {len(delta['removed'])} removed, {len(delta['updated'])} updated")
 
-                    #Searches for YouTube videos related to the movie title
-                    youtube_video_stats = [self.youtube_data_source.fetch_video_stats(video_id) for video_id in self.youtube_data_source.search_videos_by_title(movie_title)]
-                    
-                except Exception as e:
+    for movie_data in delta['added']:
 
-                    if str(e) == "YouTube API quota exceeded":
-                        print(f"No Youtube results available (Youtube API quota reached, try using a new key). No information Available.")
-                        sys.exit(0)
- 
-                movie_data = {
+        print(f"   [Added: {movie_data['title']}]")
 
-                    #Compiles the integrated movie data including TMDb details and YouTube video stats.
+    for movie_data in delta['removed']:
 
-                    'title': movie_title,
-                    'tmdb_details': movie_details,
-                    'imdb_details': imdb_movie_details,
-                    'youtube_videos_stats': youtube_video_stats
+        print(f"   [Removed: {movie_data['title']}]")
 
-                }
+    for change in delta['updated']:
 
-                #Appends the compiled movie data to the integrated data list. 
-                integrated_data.append(movie_data)
+        print(f"   [Updated: {change['title']}, Views: {change['views_change']:+,}, Likes: {change['likes_change']:+,}]")
 
-        #Returns the list of integrated movie data. 
-        return integrated_data
-    
-    def perform_analysis(self, integrated_data):
+def report_movie_data(movie_data, exporters, leaderboards=None):
 
-        print("\n--- Movie Popularity and Engagement Analysis ---\n")
-        print("------------------------------------------------\n")
+    #With leaderboards only the top movies are printed, at the end of the run. Every movie still goes to the exports
+    if leaderboards is None:
 
-        for movie_data in integrated_data:
+        print_movie_data(movie_data)
 
-            title = movie_data['title']
-            tmdb_details = movie_data['tmdb_details'] 
-            budget = tmdb_details['budget']
-            tmdb_rating = movie_data['tmdb_details']['average_rating']
-            imdb_rating = movie_data['imdb_details'].get('Average Review', 'N/A')
-            youtube_views = sum(stat['views'] for stat in movie_data['youtube_videos_stats']) / len(movie_data['youtube_videos_stats']) if movie_data['youtube_videos_stats'] else 0
-            youtube_likes = sum(stat['likes'] for stat in movie_data['youtube_videos_stats']) / len(movie_data['youtube_videos_stats']) if movie_data['youtube_videos_stats'] else 0
-            engagement_ratio = (youtube_likes / youtube_views) * 100 if youtube_views else 0
-            potential_revenue = youtube_likes * 11.23 * 0.1  # Assuming 10% of likes convert to movie ticket purchases
+    else:
 
-            print(f"  Title: {title}")
-            print(f"  Budget: ${budget:,} USD" if budget else "N/A")
-            print(f"  TMDb Rating: {tmdb_rating}")
-            print(f"  IMDb Rating: {imdb_rating}")
-            print(f"  Average YouTube Views: {youtube_views:,.0f}")
-            print(f"  Average YouTube Likes: {youtube_likes:,.0f}")
-            print(f"  Engagement Ratio (Likes/Views): {engagement_ratio:.2f}%")
-            print(f"  Estimated Revenue from YouTube Engagement From 3 Videos: ${potential_revenue:,.2f}\n")
-            print("------------------------------------------------\n")
+        leaderboards.add(movie_data)
+
+    export_movie_data(exporters, movie_data)
+
+def print_leaderboards(results):
+
+    for metric, movies in results.items():
+
+        print(f"\n--- Top {len(movies)} by {metric.replace('_', ' ').title()} ---\n")
+
+        for rank, movie in enumerate(movies, 1):
+
+            rating_gap = 'N/A' if movie['rating_gap'] != movie['rating_gap'] else f"{movie['rating_gap']:.2f}"
+
+            print(f"  {rank}. {movie['title']} (TMDb ID {movie['tmdb_id']})")
+            print(f"     [Engagement Ratio: {movie['engagement_ratio']:.2f}%, Estimated Revenue: ${movie['potential_revenue']:,.2f}]")
+            print(f"     [Average Views: {movie['average_views']:,.0f}, Average Likes: {movie['average_likes']:,.0f}, Rating Gap: {rating_gap}]")
+
+        print("\n------------------------------------------------")
+
+def export_movie_data(exporters, movie_data):
+
+    for exporter in exporters:
+
+        exporter.write(movie_data)
+
+def print_timings(summary):
+
+    #Prints where the time of the run went, by stage and by endpoint
+    print("  Stage timings:")
+
+    for name, totals in summary['stages'].items():
+
+        print(f"  {name}: {totals['seconds']:.3f}s over {totals['runs']} run(s)")
+
+    print("  Endpoint timings:")
 
+    for endpoint, totals in sorted(summary['requests'].items()):
 
+        print(f"  {endpoint}: {totals['calls']} call(s), {totals['seconds']:.3f}s, {totals['bytes']:,} bytes, {totals['retries']} retries, {totals['cache_hits']} cache hits, {totals['errors']} errors")
 
-def main():
+    print("------------------------------------------------\n")
+
+def parse_arguments(argv=None):
+
+    #Reads the command line options for the run
+
+    parser = argparse.ArgumentParser(description='Compares popular TMDb movies with IMDb ratings and YouTube engagement.')
+    parser.add_argument('--sequential', action='store_true', help='Fetch one movie at a time instead of running the lookups concurrently (useful for debugging).')
+    parser.add_argument('--tmdb-workers', type=int, default=DEFAULT_SOURCE_CONCURRENCY['tmdb'], help='Maximum number of TMDb requests in flight.')
+    parser.add_argument('--imdb-workers', type=int, default=DEFAULT_SOURCE_CONCURRENCY['imdb'], help='Maximum number of OMDb requests in flight.')
+    parser.add_argument('--youtube-workers', type=int, default=DEFAULT_SOURCE_CONCURRENCY['youtube'], help='Maximum number of YouTube requests in flight.')
+    parser.add_argument('--movies', type=int, help='Number of popular movies to integrate, paging through TMDb and printing each movie as it completes. Without it the top 3 are shown.')
+    parser.add_argument('--incremental', metavar='SNAPSHOT_PATH', help='Refresh the snapshot saved by the previous run, re-fetching only new movies and the YouTube stats, and print what changed.')
+    parser.add_argument('--seed-export', metavar='EXPORT_PATH', help=f'Take the movies from a TMDb daily ID export (movie_ids_MM_DD_YYYY.json.gz) instead of the popular list: the top --movies by popularity, {DEFAULT_SEED_MOVIES} by default.')
+    parser.add_argument('--include-adult', action='store_true', help='Keep the adult titles of the daily ID export.')
+    parser.add_argument('--pipelined', action='store_true', help='With --movies, start every lookup as soon as its inputs are known and print the movies in the order they complete.')
+    parser.add_argument('--prefetch', type=int, default=1, help='Number of TMDb pages fetched ahead while streaming.')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_STREAM_CHUNK_SIZE, help='Number of movies integrated together while streaming.')
+    parser.add_argument('--processes', type=int, help='With --movies, integrate the movies across this many worker processes sharing one rate limit budget.')
+    parser.add_argument('--shard-size', type=int, default=50, help='Number of movies each worker process integrates at a time.')
+    parser.add_argument('--serve', action='store_true', help='Run as a service: serve the integrated data over HTTP from memory and refresh it in the background.')
+    parser.add_argument('--host', default='0.0.0.0', help='Address the service listens on.')
+    parser.add_argument('--port', type=int, default=80, help='Port the service listens on.')
+    parser.add_argument('--refresh-interval', type=float, default=3600, help='Seconds between the background refreshes of the service.')
+    parser.add_argument('--tmdb-rate', type=float, default=DEFAULT_RATE_LIMITS['tmdb']['rate'], help='Maximum TMDb requests per second.')
+    parser.add_argument('--imdb-rate', type=float, default=DEFAULT_RATE_LIMITS['imdb']['rate'], help='Maximum OMDb requests per second.')
+    parser.add_argument('--youtube-rate', type=float, default=DEFAULT_RATE_LIMITS['youtube']['rate'], help='Maximum YouTube requests per second.')
+    parser.add_argument('--imdb-daily-quota', type=int, default=DEFAULT_RATE_LIMITS['imdb']['daily_quota'], help='OMDb requests allowed per day.')
+    parser.add_argument('--youtube-daily-quota', type=int, default=DEFAULT_RATE_LIMITS['youtube']['daily_quota'], help='YouTube quota units allowed per day (a search costs 100 units, a stats lookup 1).')
+    parser.add_argument('--pool-size', type=int, default=10, help='Number of keep-alive connections kept open per host.')
+    parser.add_argument('--max-retries', type=int, default=2, help='Retries, with jittered exponential backoff, for connection failures, timeouts and 5xx answers.')
+    parser.add_argument('--breaker-threshold', type=int, default=5, help='Failed calls in a row after which a host is failed fast instead of called.')
+    parser.add_argument('--breaker-reset', type=float, default=30, help='Seconds a failing host is skipped before a trial call is let through.')
+    parser.add_argument('--connection-stats', action='store_true', help='Print how many connections were opened and reused at the end of the run.')
+    parser.add_argument('--cache-path', default='.api_cache.sqlite', help='SQLite file used to cache API responses between runs.')
+    parser.add_argument('--cache-max-mb', type=float, default=64, help='Size cap of the response cache in megabytes.')
+    parser.add_argument('--no-cache', action='store_true', help='Always fetch fresh responses from the APIs.')
+    parser.add_argument('--cache-stats', action='store_true', help='Print the cache hit and miss counts at the end of the run.')
+    parser.add_argument('--id-index', metavar='INDEX_PATH', help='SQLite file mapping TMDb IDs to IMDb IDs and YouTube video IDs, so OMDb is queried by ID and indexed movies skip the YouTube search.')
+    parser.add_argument('--id-index-max-age', type=float, help='Days after which indexed YouTube video IDs are searched for again.')
+    parser.add_argument('--warm-id-index', metavar='SNAPSHOT_PATH', help='Load the video IDs of a saved snapshot into the ID index before the run.')
+    parser.add_argument('--reset-id-index', action='store_true', help='Empty the ID index before the run.')
+    parser.add_argument('--id-index-stats', action='store_true', help='Print the ID index size and search hits at the end of the run.')
+    parser.add_argument('--stats-history', metavar='DIRECTORY', help='Append every YouTube stats snapshot to a local history and add views and likes per day to the analysis.')
+    parser.add_argument('--growth-window', type=float, default=DEFAULT_GROWTH_WINDOW / (24 * 3600), help='Days of stats history the growth rates are measured over.')
+    parser.add_argument('--compact-history', action='store_true', help='Compact the stats history at the end of the run, downsampling snapshots older than a week to one a day.')
+    parser.add_argument('--top', type=int, metavar='K', help='Print only the top K movies of each leaderboard instead of every movie, keeping just K movies in memory per leaderboard.')
+    parser.add_argument('--rank-by', nargs='+', choices=LEADERBOARD_METRICS, default=['engagement_ratio'], help='Metrics to rank the movies by with --top.')
+    parser.add_argument('--min-budget', type=int, help='With --top, only rank movies with a known budget of at least this many dollars.')
+    parser.add_argument('--max-budget', type=int, help='With --top, only rank movies with a known budget of at most this many dollars.')
+    parser.add_argument('--min-ratings', type=int, help='With --top, only rank movies with at least this many TMDb ratings.')
+    parser.add_argument('--metrics', action='store_true', help='Print the request counters and latency histograms in the Prometheus text format at the end of the run.')
+    parser.add_argument('--timings', action='store_true', help='Print the time spent in each stage and on each endpoint at the end of the run.')
+    parser.add_argument('--trace', metavar='TRACE_PATH', help='Write every request and stage event of the run to a JSON trace file.')
+    parser.add_argument('--export-ndjson', metavar='NDJSON_PATH', help='Write each integrated movie as a line of JSON as soon as it is ready.')
+    parser.add_argument('--export-parquet', metavar='DIRECTORY', help='Write the movies and their YouTube videos to movies.parquet and videos.parquet in the directory (requires pyarrow).')
+    parser.add_argument('--export-batch-size', type=int, default=50000, help='Rows buffered before each Parquet row group is written.')
+
+    arguments = parser.parse_args(argv)
+
+    #The worker processes integrate in chunks and their requests and stages are not collected, so these options would be silently ignored
+    if arguments.processes:
+
+        for option, value in (('--pipelined', arguments.pipelined), ('--timings', arguments.timings), ('--metrics', arguments.metrics), ('--trace', arguments.trace)):
+
+            if value:
+
+                parser.error(f"{option} cannot be combined with --processes")
+
+    return arguments
+
+def main(argv=None):
+
+    arguments = parse_arguments(argv)
+
+    #A daily ID export replaces the popular list, its movies are ranked by popularity locally without any API calls
+    seed_movies = None
+
+    if arguments.seed_export:
+
+        arguments.movies = arguments.movies or DEFAULT_SEED_MOVIES
+        seed_movies = lambda: top_exported_movies(arguments.seed_export, arguments.movies, arguments.include_adult)
     
     #API Keys
 
@@ -310,80 +4555,226 @@ def main():
     #tmdb_api_key = ''
     #imdb_api_key = ''
 
+    #Creates one shared transport so every source reuses its pooled connections, sized for the largest worker pool
+    cache = None if arguments.no_cache else ResponseCache(arguments.cache_path, max_bytes=int(arguments.cache_max_mb * 1024 * 1024))
+    rate_limits = {
+
+        'tmdb': {'rate': arguments.tmdb_rate, 'burst': arguments.tmdb_rate},
+        'imdb': {'rate': arguments.imdb_rate, 'burst': arguments.imdb_rate, 'daily_quota': arguments.imdb_daily_quota},
+        'youtube': {'rate': arguments.youtube_rate, 'burst': arguments.youtube_rate, 'daily_quota': arguments.youtube_daily_quota}
+
+    }
+    #The daily quota usage is kept in the cache file, so scheduled one-shot runs share the day's budget
+    rate_limiter = RateLimiter(rate_limits, usage_store=cache)
+    #Instrumentation is only attached when one of its reports was asked for, so the hot path stays untouched otherwise
+    instrumentation = Instrumentation(keep_trace=bool(arguments.trace)) if arguments.metrics or arguments.timings or arguments.trace else None
+    circuit_breaker = CircuitBreaker(arguments.breaker_threshold, arguments.breaker_reset)
+    transport = HTTPTransport(pool_size=max(arguments.tmdb_workers, arguments.imdb_workers, arguments.youtube_workers, arguments.pool_size), cache=cache, rate_limiter=rate_limiter, instrumentation=instrumentation, max_retries=arguments.max_retries, circuit_breaker=circuit_breaker)
+
     #Create an instance of YouTubeDataSource and TMDbDataSource with the provided API keys. 
-    youtube_ds = YouTubeDataSource(youtube_api_key)
-    tmdb_ds = TMDbDataSource(tmdb_api_key)
-    imdb_ds = IMDb(imdb_api_key)
+    youtube_ds = YouTubeDataSource(youtube_api_key, transport)
+    tmdb_ds = TMDbDataSource(tmdb_api_key, transport)
+    imdb_ds = IMDb(imdb_api_key, transport)
+
+    #The ID index outlives the run, so movies seen before skip the YouTube search that costs the most quota
+    id_index = None
+
+    if arguments.id_index:
+
+        id_index = IDIndex(arguments.id_index, arguments.id_index_max_age * 24 * 3600 if arguments.id_index_max_age else None)
+
+        if arguments.reset_id_index:
+
+            id_index.invalidate()
+
+        if arguments.warm_id_index:
+
+            print(f"Indexed {id_index.warm_up_from_records(SnapshotStore(arguments.warm_id_index).load().values())} movies from {arguments.warm_id_index}")
+
+    stats_history = StatsHistory(arguments.stats_history) if arguments.stats_history else None
 
     #Initializes the IntegratedData class with the YouTube and TMDb data sources. 
-    integrated_data_handler = IntegratedData(youtube_ds, tmdb_ds, imdb_ds)
-    #Calls the method to integrate popular movies from TMDb with their YouTube video stats.
-    integrated_data = integrated_data_handler.integrate_popular_movies_youtube_data()
+    integrated_data_handler = IntegratedData(youtube_ds, tmdb_ds, imdb_ds, concurrent=not arguments.sequential, source_concurrency={
+
+        'tmdb': arguments.tmdb_workers,
+        'imdb': arguments.imdb_workers,
+        'youtube': arguments.youtube_workers
+
+    }, instrumentation=instrumentation, id_index=id_index, stats_history=stats_history, growth_window=arguments.growth_window * 24 * 3600)
+
+    #Structured exports receive every integrated movie alongside the printed report
+    exporters = []
+    leaderboards = Leaderboards(arguments.rank_by, arguments.top, min_budget=arguments.min_budget, max_budget=arguments.max_budget, min_ratings=arguments.min_ratings) if arguments.top else None
+
+    if arguments.export_ndjson:
+
+        exporters.append(NDJSONExporter(arguments.export_ndjson))
+
+    if arguments.export_parquet:
+
+        exporters.append(ParquetExporter(arguments.export_parquet, arguments.export_batch_size))
 
-    #Checks if there is any integrated data. 
-    if integrated_data:
+    if arguments.serve:
+
+        #Serves the data until interrupted. With --incremental the service starts from the saved snapshot and keeps it up to date
+        service = MovieService(integrated_data_handler, arguments.refresh_interval, arguments.movies, SnapshotStore(arguments.incremental) if arguments.incremental else None, movie_source=seed_movies)
+        server = ServiceHTTPServer((arguments.host, arguments.port), service)
+        service.start()
+        print(f"Serving the integrated movie data on http://{arguments.host}:{server.server_address[1]}/ (refreshing every {arguments.refresh_interval:g} seconds)")
+
+        try:
+
+            server.serve_forever()
+
+        except KeyboardInterrupt:
+
+            pass
+
+        finally:
+
+            server.server_close()
+            service.stop()
+
+    elif arguments.incremental:
+
+        #Refreshes the snapshot from the previous run, only new movies and the YouTube stats are fetched again
+        integrated_data, delta = integrated_data_handler.refresh_incremental(SnapshotStore(arguments.incremental), arguments.movies, seed_movies() if seed_movies else None)
 
-        #Iterates through each movie's integrated data. 
         for movie_data in integrated_data:
 
-            print(f"Movie Title: {movie_data.get('title', 'N/A')}")
+            report_movie_data(movie_data, exporters, leaderboards)
 
-            #TMDb Section
+        print_delta(delta)
 
-            print("\nTMDB Data:")
+        if leaderboards is None:
 
-            #Retrieves the TMDb details for the movie. 
-            tmdb_details = movie_data.get('tmdb_details', {})
-            #Formats the movie's budget for printing. Displays 'N/A' if the budget is not available. 
-            budget_formatted = f"${tmdb_details['budget']:,} USD" if tmdb_details['budget'] else "N/A"
-  
-            print(f"   [Director: {tmdb_details['director']}]")
-            print(f"   [Lead Actor: {tmdb_details['lead_actor']}]")
-            print(f"   [Budget: {budget_formatted}]")
-            print(f"   [Number of Ratings: {tmdb_details['number_of_ratings']}, Average Rating: {tmdb_details['average_rating']}]")
+            integrated_data_handler.perform_analysis(integrated_data)
 
-            #IMDb Section
-            
-            imdb_details = movie_data.get('imdb_details', {})
+    elif arguments.movies and arguments.processes:
 
-            if imdb_details:
-                imdb_reviews = imdb_details.get('Number of Reviews', 'N/A')
-                imdb_average_review = imdb_details.get('Average Review', 'N/A')
-            else:
-                imdb_reviews = 'N/A'
-                imdb_average_review = 'N/A'
-            
-            print("\nIMDb Data:")
-            print(f"   [Director: {imdb_details.get('Director', 'N/A')}]")
-            print(f"   [Lead Actor: {imdb_details.get('Lead Actor', 'N/A')}]")
-            print(f"   [Number of Reviews: {imdb_details.get('Number of Reviews', 'N/A')}, Average Review: {imdb_details.get('Average Review', 'N/A')}]")
-            
-            #YouTube Section 
+        #Lists the popular movies here and integrates them across worker processes that share one rate limit budget
+        runner = ShardedRunner(youtube_api_key, tmdb_api_key, imdb_api_key, arguments.processes, arguments.shard_size, rate_limits, concurrent=not arguments.sequential, source_concurrency={
+
+            'tmdb': arguments.tmdb_workers,
+            'imdb': arguments.imdb_workers,
+            'youtube': arguments.youtube_workers
+
+        }, max_retries=arguments.max_retries, cache_path=None if arguments.no_cache else arguments.cache_path, cache_max_bytes=int(arguments.cache_max_mb * 1024 * 1024), pool_size=arguments.pool_size, 
+            breaker_threshold=arguments.breaker_threshold, breaker_reset=arguments.breaker_reset, id_index_path=arguments.id_index, id_index_max_age=id_index.max_age if id_index is not None else None)
+        integrated_data = runner.run(seed_movies() if seed_movies else tmdb_ds.iter_popular_movies(arguments.movies, arguments.prefetch))
+
+        for movie_data in integrated_data:
+
+            #The workers build the records in their own processes, so the stats are added to the history here
+            if stats_history is not None:
+
+                stats_history.append(movie_data['tmdb_id'], dict(zip(movie_data['youtube_video_ids'], movie_data['youtube_videos_stats'])))
+
+            report_movie_data(movie_data, exporters, leaderboards)
+
+        if leaderboards is None:
+
+            integrated_data_handler.perform_analysis(integrated_data)
+
+    elif arguments.movies:
+
+        #Streams the requested number of popular movies, printing each one as soon as it is integrated. 
+        print("\n--- Movie Popularity and Engagement Analysis ---\n")
+
+        if arguments.pipelined:
+
+            movie_stream = integrated_data_handler.stream_pipelined_movies(seed_movies() if seed_movies else tmdb_ds.iter_popular_movies(arguments.movies, arguments.prefetch))
+
+        elif seed_movies:
 
-            print("\nYoutube Data:")
+            movie_stream = integrated_data_handler.iter_integrated_movies(seed_movies(), arguments.chunk_size)
 
-            #Initializes counters for total views and likes
-            total_views = total_likes = 0
-            #Retrieves YouTube video stats
-            youtube_video_stats = movie_data.get('youtube_videos_stats', [])
-            #Iterates through each YouTube video stat, with an index starting from 1. 
-            for index, video_stat in enumerate(youtube_video_stats, start=1):
+        else:
+
+            movie_stream = integrated_data_handler.stream_popular_movies_youtube_data(arguments.movies, arguments.prefetch, arguments.chunk_size)
 
-                print(f"   CHANNEL {index}")                
-                print(f"      [Channel: {video_stat.get('channelName', 'N/A')}]")
-                print(f"      [Title: {video_stat.get('videoTitle', 'N/A')}]")
-                print(f"      [Views: {video_stat.get('views', 0)}, Likes: {video_stat.get('likes', 0)}]")
+        for movie_data in movie_stream:
 
-                #Updates the total views and likes with values from teh current video. 
-                total_views += video_stat.get('views', 0)
-                total_likes += video_stat.get('likes', 0)
+            report_movie_data(movie_data, exporters, leaderboards)
 
-            print("\n------------------------------------------------")
+            if leaderboards is None:
+
+                integrated_data_handler.print_movie_analysis(movie_data)
 
     else:
-        print("No integrated data found.")
 
-    integrated_data_handler.perform_analysis(integrated_data)
+        #Calls the method to integrate popular movies from TMDb with their YouTube video stats.
+        integrated_data = integrated_data_handler.integrate_popular_movies_youtube_data()
+
+        #Checks if there is any integrated data. 
+        if integrated_data:
+
+            #Iterates through each movie's integrated data. 
+            for movie_data in integrated_data:
+
+                report_movie_data(movie_data, exporters, leaderboards)
+
+        else:
+            print("No integrated data found.")
+
+        if leaderboards is None:
+
+            integrated_data_handler.perform_analysis(integrated_data)
+
+    for exporter in exporters:
+
+        exporter.close()
+
+    if leaderboards is not None:
+
+        print_leaderboards(leaderboards.results())
+
+    if arguments.connection_stats:
+
+        stats = transport.connection_stats()
+        print(f"Connections opened: {stats['connections_opened']}, reused: {stats['connections_reused']}, requests: {stats['requests']}, coalesced: {transport.single_flight.coalesced}")
+
+    if cache is not None:
+
+        if arguments.cache_stats:
+
+            stats = cache.stats()
+            print(f"Cache hits: {stats['hits']}, misses: {stats['misses']}, hit rate: {stats['hit_rate']:.0%}, entries: {stats['entries']}, evictions: {stats['evictions']}")
+
+        cache.close()
+
+    if stats_history is not None:
+
+        if arguments.compact_history:
+
+            print(f"Stats history compacted to {stats_history.compact()} snapshots")
+
+        stats_history.close()
+
+    if id_index is not None:
+
+        if arguments.id_index_stats:
+
+            stats = id_index.stats()
+            print(f"ID index entries: {stats['entries']}, with IMDb IDs: {stats['imdb_ids']}, with video IDs: {stats['video_ids']}, search hits: {stats['search_hits']}, misses: {stats['search_misses']}")
+
+        id_index.close()
+
+    if instrumentation is not None:
+
+        if arguments.timings:
+
+            print_timings(instrumentation.summary())
+
+        if arguments.metrics:
+
+            print(instrumentation.render_prometheus())
+
+        if arguments.trace:
+
+            instrumentation.dump_trace(arguments.trace)
+
+    transport.close()
 
 if __name__ == "__main__":
     main()
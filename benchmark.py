@@ -0,0 +1,359 @@
+import argparse
+import json
+import multiprocessing
+import random
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from Project_Code import HTTPTransport, Instrumentation, IntegratedData, YouTubeDataSource, TMDbDataSource, IMDb, TMDB_PAGE_SIZE
+
+#Offline benchmark for the integration. A local server stands in for the TMDb, OMDb and YouTube endpoints so runs are repeatable and cost no quota
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+
+    #Serves fake but realistically shaped payloads, with optional latency, jitter and injected errors
+
+    protocol_version = 'HTTP/1.1'
+
+    #Sends the headers and body in one write, otherwise Nagle's algorithm adds tens of milliseconds to every response
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+
+        config = self.server.config
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        #Simulates the network round trip before answering
+        delay = config['latency'] + random.uniform(-config['jitter'], config['jitter'])
+
+        if delay > 0:
+
+            time.sleep(delay)
+
+        roll = random.random()
+
+        if roll < config['throttle_rate']:
+
+            return self._send(429, {'status_message': 'Too many requests'}, {'Retry-After': str(config['retry_after'])})
+
+        if roll < config['throttle_rate'] + config['error_rate']:
+
+            return self._send(500, {'status_message': 'Internal error'})
+
+        if url.path.startswith('/youtube/') and roll < config['throttle_rate'] + config['error_rate'] + config['quota_rate']:
+
+            return self._send(403, {'error': {'errors': [{'reason': 'quotaExceeded'}]}})
+
+        if url.path == '/tmdb/movie/popular':
+
+            page = int(query.get('page', ['1'])[0])
+            first_id = (page - 1) * TMDB_PAGE_SIZE + 1
+            last_id = min(page * TMDB_PAGE_SIZE, config['movie_count'])
+            total_pages = -(-config['movie_count'] // TMDB_PAGE_SIZE)
+            return self._send(200, {'page': page, 'total_pages': total_pages, 'results': [{'id': movie_id, 'title': f'Movie {movie_id}', 'popularity': 1000 - movie_id} for movie_id in range(first_id, last_id + 1)]})
+
+        if url.path.startswith('/tmdb/movie/'):
+
+            return self._send(200, self._movie_details(int(url.path.rsplit('/', 1)[1])))
+
+        if url.path == '/omdb/':
+
+            #Answers both title searches and lookups by IMDb ID
+            if 'i' in query:
+
+                movie_id = int(query['i'][0][2:])
+                title, imdb_id = f'Movie {movie_id}', query['i'][0]
+
+            else:
+
+                title, imdb_id = query['t'][0], 'tt0000001'
+
+            return self._send(200, {'Title': title, 'Director': 'Mock Director', 'Actors': 'Lead Actor, Second Actor, Third Actor', 'Plot': 'A mock plot. ' * 20, 'imdbVotes': '12,345', 'imdbRating': '7.2', 'imdbID': imdb_id, 'Response': 'True'})
+
+        if url.path == '/youtube/search':
+
+            title = query['q'][0].replace(' ', '_')
+            items = [{'id': {'kind': 'youtube#video', 'videoId': f'{title}_{index}'}, 'snippet': {'title': f'{title} trailer {index}', 'description': 'Trailer. ' * 20}} for index in range(3)]
+
+            #Like YouTube, a fields parameter trims the items down to the requested parts
+            if 'fields' in query:
+
+                items = [{'id': {'videoId': item['id']['videoId']}} for item in items]
+
+            return self._send(200, {'items': items})
+
+        if url.path == '/youtube/videos':
+
+            return self._send(200, {'items': [self._video(video_id, 'fields' in query) for video_id in query['id'][0].split(',')]})
+
+        return self._send(404, {'status_message': 'Not found'})
+
+    def _movie_details(self, movie_id):
+
+        credits_size = self.server.config['credits_size']
+
+        return {
+
+            'id': movie_id,
+            'imdb_id': f'tt{movie_id:07d}',
+            'title': f'Movie {movie_id}',
+            'overview': 'A mock overview. ' * 20,
+            'vote_average': 5 + movie_id % 50 / 10,
+            'vote_count': 100 + movie_id,
+            'budget': 1000000 * (movie_id % 200),
+            'credits': {
+
+                'cast': [{'id': index, 'name': f'Actor {index}', 'character': f'Character {index}', 'order': index, 'profile_path': '/mock.jpg'} for index in range(credits_size)],
+                'crew': [{'id': index, 'name': f'Crew {index}', 'job': 'Director' if index == credits_size // 2 else 'Grip', 'department': 'Crew', 'profile_path': '/mock.jpg'} for index in range(credits_size)]
+
+            }
+
+        }
+
+    def _video(self, video_id, partial=False):
+
+        seed = sum(map(ord, video_id))
+        video = {'id': video_id, 'snippet': {'title': f'Trailer {video_id}', 'channelTitle': 'Mock Channel', 'description': 'Trailer. ' * 20}, 'statistics': {'viewCount': str(seed * 1000), 'likeCount': str(seed * 20), 'commentCount': str(seed)}}
+
+        if partial:
+
+            del video['snippet']['description'], video['statistics']['commentCount']
+
+        return video
+
+    def _send(self, status, body, headers=None):
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+
+        for name, value in (headers or {}).items():
+
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+
+        pass
+
+def _serve(config, port_queue):
+
+    #Runs the mock server in its own process so it does not share the benchmark's CPU time or memory
+    random.seed(config['seed'])
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockAPIHandler)
+    server.daemon_threads = True
+    server.config = config
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+class MockAPIServer:
+
+    #Starts and stops the mock server process, usable as a context manager
+
+    def __init__(self, movie_count=100, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, quota_rate=0.0, retry_after=0, credits_size=50, seed=0):
+
+        self.config = {
+
+            'movie_count': movie_count,
+            'latency': latency,
+            'jitter': jitter,
+            'error_rate': error_rate,
+            'throttle_rate': throttle_rate,
+            'quota_rate': quota_rate,
+            'retry_after': retry_after,
+            'credits_size': credits_size,
+            'seed': seed
+
+        }
+        self.process = None
+        self.base_url = None
+
+    def __enter__(self):
+
+        port_queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=_serve, args=(self.config, port_queue), daemon=True)
+        self.process.start()
+        self.base_url = f'http://127.0.0.1:{port_queue.get(timeout=10)}/'
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.process.terminate()
+        self.process.join()
+
+def _percentile(sorted_values, fraction):
+
+    if not sorted_values:
+
+        return 0.0
+
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+def run_benchmark(server, movie_count, concurrent=True, workers=8, chunk_size=16, trace_memory=True):
+
+    #Integrates movie_count movies end to end against the mock server and reports wall time, requests, latency percentiles and peak memory
+
+    #Every call that goes to the network is timed through the transport's instrumentation
+    instrumentation = Instrumentation()
+    latencies = []
+    requests_sent = []
+
+    def record(event):
+
+        if event['type'] == 'request' and not event['cache_hit']:
+
+            latencies.append(event['latency'])
+            requests_sent.append(1 + event['retries'])
+
+    instrumentation.add_hook(record)
+    transport = HTTPTransport(pool_size=workers, instrumentation=instrumentation)
+    youtube_ds = YouTubeDataSource('benchmark_key', transport)
+    tmdb_ds = TMDbDataSource('benchmark_key', transport)
+    imdb_ds = IMDb('benchmark_key', transport)
+    youtube_ds.base_url = server.base_url + 'youtube/'
+    tmdb_ds.base_url = server.base_url + 'tmdb/'
+    imdb_ds.base_url = server.base_url + 'omdb/'
+    integrated_data_handler = IntegratedData(youtube_ds, tmdb_ds, imdb_ds, concurrent=concurrent, source_concurrency={'tmdb': workers, 'imdb': workers, 'youtube': workers}, instrumentation=instrumentation)
+
+    #tracemalloc slows every allocation down, so it can be turned off when only the timings matter
+    if trace_memory:
+
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    integrated_count = sum(1 for _ in integrated_data_handler.stream_popular_movies_youtube_data(movie_count, chunk_size=chunk_size))
+    wall_time = time.perf_counter() - started
+    peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+
+    if trace_memory:
+
+        tracemalloc.stop()
+
+    transport.close()
+
+    latencies.sort()
+
+    return {
+
+        'movies': movie_count,
+        'integrated': integrated_count,
+        'mode': 'concurrent' if concurrent else 'sequential',
+        'wall_time': wall_time,
+        'requests': sum(requests_sent),
+        'p50_latency': _percentile(latencies, 0.5),
+        'p95_latency': _percentile(latencies, 0.95),
+        'p99_latency': _percentile(latencies, 0.99),
+        'peak_memory': peak_memory,
+        'stages': instrumentation.summary()['stages']
+
+    }
+
+def print_report(results):
+
+    print(f"{'movies':>8} {'mode':>11} {'integrated':>10} {'wall (s)':>9} {'requests':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'peak MB':>8}")
+
+    for result in results:
+
+        print(f"{result['movies']:>8} {result['mode']:>11} {result['integrated']:>10} {result['wall_time']:>9.2f} {result['requests']:>9} {result['p50_latency'] * 1000:>9.1f} {result['p95_latency'] * 1000:>9.1f} {result['p99_latency'] * 1000:>9.1f} {result['peak_memory'] / 1024 / 1024:>8.1f}")
+
+#Metrics a run is held to against the baseline, lower is better for all of them
+BASELINE_METRICS = ('p50_latency', 'p95_latency', 'requests')
+
+def save_baseline(path, results):
+
+    #Keeps only what the comparison needs, the stage timings and memory vary too much between machines to hold a run to
+    baseline = [{key: result[key] for key in ('movies', 'mode') + BASELINE_METRICS} for result in results]
+
+    with open(path, 'w') as baseline_file:
+
+        json.dump(baseline, baseline_file, indent=2)
+
+def load_baseline(path):
+
+    with open(path) as baseline_file:
+
+        return json.load(baseline_file)
+
+def compare_to_baseline(results, baseline, latency_tolerance=0.5, requests_tolerance=0.0):
+
+    #Returns a message for every metric that got worse than the baseline by more than its tolerance, a share of the baseline value
+    #Runs without a baseline entry for the same movie count and mode are not compared
+    baseline_runs = {(run['movies'], run['mode']): run for run in baseline}
+    regressions = []
+
+    for result in results:
+
+        baseline_run = baseline_runs.get((result['movies'], result['mode']))
+
+        if baseline_run is None:
+
+            continue
+
+        for metric in BASELINE_METRICS:
+
+            tolerance = requests_tolerance if metric == 'requests' else latency_tolerance
+            limit = baseline_run[metric] * (1 + tolerance)
+
+            if result[metric] > limit:
+
+                regressions.append(f"{result['movies']} movies {result['mode']}: {metric} {result[metric]:g} is above the baseline {baseline_run[metric]:g} by more than {tolerance:.0%}")
+
+    return regressions
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Benchmarks the integration against a local mock of the TMDb, OMDb and YouTube APIs.')
+    parser.add_argument('--movies', type=int, nargs='+', default=[10, 100, 1000], help='Movie counts to benchmark.')
+    parser.add_argument('--sequential', action='store_true', help='Benchmark the sequential path instead of the concurrent one.')
+    parser.add_argument('--workers', type=int, default=8, help='Requests in flight per source in concurrent mode.')
+    parser.add_argument('--chunk-size', type=int, default=16, help='Movies integrated together while streaming.')
+    parser.add_argument('--latency', type=float, default=0.02, help='Simulated server latency in seconds.')
+    parser.add_argument('--jitter', type=float, default=0.01, help='Random variation added to the latency in seconds.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 500.')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with a 429.')
+    parser.add_argument('--quota-rate', type=float, default=0.0, help='Share of YouTube requests answered with a 403 quota error.')
+    parser.add_argument('--retry-after', type=int, default=0, help='Retry-After seconds sent with injected 429s.')
+    parser.add_argument('--skip-memory', action='store_true', help='Do not trace peak memory, which slows the run down and inflates the latencies.')
+    parser.add_argument('--credits-size', type=int, default=50, help='Number of cast and crew entries in each movie payload.')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write the results to PATH as the baseline later runs are compared against.')
+    parser.add_argument('--baseline', metavar='PATH', help='Compare the results to the baseline at PATH and exit with status 1 on a regression.')
+    parser.add_argument('--latency-tolerance', type=float, default=0.5, help='Share by which p50 and p95 latency may exceed the baseline.')
+    parser.add_argument('--requests-tolerance', type=float, default=0.0, help='Share by which the requests sent may exceed the baseline.')
+    arguments = parser.parse_args(argv)
+
+    results = []
+
+    for movie_count in arguments.movies:
+
+        with MockAPIServer(movie_count, arguments.latency, arguments.jitter, arguments.error_rate, arguments.throttle_rate, arguments.quota_rate, arguments.retry_after, arguments.credits_size) as server:
+
+            results.append(run_benchmark(server, movie_count, not arguments.sequential, arguments.workers, arguments.chunk_size, not arguments.skip_memory))
+
+    print_report(results)
+
+    if arguments.save_baseline:
+
+        save_baseline(arguments.save_baseline, results)
+
+    if arguments.baseline:
+
+        regressions = compare_to_baseline(results, load_baseline(arguments.baseline), arguments.latency_tolerance, arguments.requests_tolerance)
+
+        for regression in regressions:
+
+            print('Regression: ' + regression)
+
+        if regressions:
+
+            raise SystemExit(1)
+
+    return results
+
+if __name__ == "__main__":
+    main()
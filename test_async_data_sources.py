@@ -0,0 +1,141 @@
+import asyncio
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from Project_Code import AsyncHTTPTransport, AsyncYouTubeDataSource, AsyncTMDbDataSource, AsyncIMDb, AsyncIntegratedData, IntegratedData, YouTubeDataSource, TMDbDataSource, IMDb, IDIndex, SnapshotStore
+
+pytest.importorskip('aiohttp')
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == '/tmdb/movie/popular':
+
+            body = {'total_pages': 1, 'results': [{'id': movie_id, 'title': f'Movie {movie_id}'} for movie_id in range(1, 6)]}
+
+        elif url.path.startswith('/tmdb/movie/'):
+
+            movie_id = url.path.rsplit('/', 1)[1]
+            body = {'title': f'Movie {movie_id}', 'vote_average': 7.5, 'vote_count': 100, 'budget': 1000,
+                    'credits': {'crew': [{'job': 'Writer', 'name': 'W'}, {'job': 'Director', 'name': f'Director {movie_id}'}], 'cast': [{'order': 0, 'name': f'Actor {movie_id}'}]}}
+
+        elif url.path == '/omdb/':
+
+            body = {'Response': 'True', 'Director': 'D', 'Actors': 'First Actor, Second Actor', 'imdbVotes': '1,234', 'imdbRating': '7.1'}
+
+        elif url.path == '/youtube/search':
+
+            body = {'items': [{'id': {'videoId': f"{query['q'][0]}-{index}"}} for index in range(3)]}
+
+        else:
+
+            body = {'items': [{'id': video_id, 'snippet': {'title': video_id, 'channelTitle': 'C'}, 'statistics': {'viewCount': '100', 'likeCount': '7'}} for video_id in query['id'][0].split(',')]}
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+
+        pass
+
+@pytest.fixture
+def fake_api():
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAPIHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+    server.server_close()
+
+def point_at(fake_api, youtube_ds, tmdb_ds, imdb_ds):
+
+    youtube_ds.base_url = fake_api + 'youtube/'
+    tmdb_ds.base_url = fake_api + 'tmdb/'
+    imdb_ds.base_url = fake_api + 'omdb/'
+    return youtube_ds, tmdb_ds, imdb_ds
+
+def test_async_sources_parse_like_the_blocking_ones(fake_api):
+
+    async def run():
+
+        async with AsyncHTTPTransport(max_in_flight=10) as transport:
+
+            youtube_ds, tmdb_ds, imdb_ds = point_at(fake_api, AsyncYouTubeDataSource('key', transport), AsyncTMDbDataSource('key', transport), AsyncIMDb('key', transport))
+            return await tmdb_ds.fetch_movie_details_with_credits(3), await imdb_ds.get_movie_info('Movie 3'), await youtube_ds.fetch_video_stats('abc')
+
+    details, imdb_info, stats = asyncio.run(run())
+
+    assert details == {'title': 'Movie 3', 'average_rating': 7.5, 'number_of_ratings': 100, 'director': 'Director 3', 'lead_actor': 'Actor 3', 'budget': 1000}
+    assert imdb_info['Lead Actor'] == 'First Actor'
+    assert stats == {'channelName': 'C', 'videoTitle': 'abc', 'views': 100, 'likes': 7}
+
+def test_async_integration_matches_blocking_integration(fake_api):
+
+    async def run():
+
+        async with AsyncHTTPTransport(max_in_flight=4) as transport:
+
+            sources = point_at(fake_api, AsyncYouTubeDataSource('key', transport), AsyncTMDbDataSource('key', transport), AsyncIMDb('key', transport))
+            handler = AsyncIntegratedData(*sources)
+            streamed = [movie_data async for movie_data in handler.stream_popular_movies_youtube_data(5, chunk_size=2)]
+            return await handler.integrate_popular_movies_youtube_data(), streamed
+
+    async_data, streamed = asyncio.run(run())
+    blocking_data = IntegratedData(*point_at(fake_api, YouTubeDataSource('key'), TMDbDataSource('key'), IMDb('key'))).integrate_popular_movies_youtube_data()
+
+    assert async_data == blocking_data
+    assert [movie['title'] for movie in streamed] == [f'Movie {movie_id}' for movie_id in range(1, 6)]
+
+def test_async_incremental_refresh_only_integrates_new_movies(fake_api, tmp_path):
+
+    store = SnapshotStore(str(tmp_path / 'snapshot.json'))
+    index = IDIndex(str(tmp_path / 'index.sqlite'))
+
+    async def run():
+
+        async with AsyncHTTPTransport(max_in_flight=4) as transport:
+
+            handler = AsyncIntegratedData(*point_at(fake_api, AsyncYouTubeDataSource('key', transport), AsyncTMDbDataSource('key', transport), AsyncIMDb('key', transport)), id_index=index)
+            first = await handler.refresh_incremental(store, movie_count=2)
+            second = await handler.refresh_incremental(store)
+
+            return first, second
+
+    (first, first_delta), (second, second_delta) = asyncio.run(run())
+
+    assert [movie['title'] for movie in first] == ['Movie 1', 'Movie 2']
+    assert len(first_delta['added']) == 2
+    assert [movie['title'] for movie in second] == ['Movie 1', 'Movie 2', 'Movie 3']
+    assert [movie['title'] for movie in second_delta['added']] == ['Movie 3']
+    assert second[0] == first[0]
+    assert index.stats()['entries'] == 3
+    assert len(store.load()) == 3
+
+def test_async_pipelined_stream_yields_every_movie(fake_api):
+
+    async def run():
+
+        async with AsyncHTTPTransport(max_in_flight=4) as transport:
+
+            youtube_ds, tmdb_ds, imdb_ds = point_at(fake_api, AsyncYouTubeDataSource('key', transport), AsyncTMDbDataSource('key', transport), AsyncIMDb('key', transport))
+            handler = AsyncIntegratedData(youtube_ds, tmdb_ds, imdb_ds)
+            pipelined = [movie_data async for movie_data in handler.stream_pipelined_movies(tmdb_ds.iter_popular_movies(5))]
+            chunked = [movie_data async for movie_data in handler.stream_popular_movies_youtube_data(5)]
+            return pipelined, chunked
+
+    pipelined, chunked = asyncio.run(run())
+
+    assert sorted(pipelined, key=lambda movie: movie['tmdb_id']) == chunked
@@ -0,0 +1,37 @@
+from benchmark import MockAPIServer, run_benchmark, save_baseline, load_baseline, compare_to_baseline
+
+def test_benchmark_runs_end_to_end_against_the_mock_server():
+
+    with MockAPIServer(movie_count=10, credits_size=5) as server:
+
+        result = run_benchmark(server, 10, concurrent=True, workers=4)
+
+    #One popular page, then details, OMDb and search per movie, then a single batched stats request
+    assert result['integrated'] == 10
+    assert result['requests'] == 1 + 3 * 10 + 1
+    assert result['p99_latency'] >= result['p95_latency'] >= result['p50_latency'] > 0
+    assert result['peak_memory'] > 0
+
+def test_benchmark_survives_injected_errors():
+
+    with MockAPIServer(movie_count=20, error_rate=0.2, credits_size=5, seed=1) as server:
+
+        result = run_benchmark(server, 20, concurrent=False, trace_memory=False)
+
+    assert result['integrated'] <= 20
+    assert result['requests'] > 0
+
+def test_regressions_past_the_tolerance_are_flagged(tmp_path):
+
+    baseline = {'movies': 10, 'mode': 'concurrent', 'p50_latency': 0.020, 'p95_latency': 0.030, 'requests': 32, 'wall_time': 1.0}
+    save_baseline(tmp_path / 'baseline.json', [baseline])
+    slower = dict(baseline, p50_latency=0.024, p95_latency=0.040, requests=33)
+
+    regressions = compare_to_baseline([slower], load_baseline(tmp_path / 'baseline.json'), latency_tolerance=0.25)
+
+    #p50 is within the tolerance, p95 and the extra request are not
+    assert len(regressions) == 2
+    assert 'p95_latency' in regressions[0]
+    assert 'requests' in regressions[1]
+    assert compare_to_baseline([baseline], [baseline]) == []
+    assert compare_to_baseline([dict(slower, movies=100)], [baseline]) == []
@@ -0,0 +1,57 @@
+import json
+import pytest
+from Project_Code import IntegratedData, NDJSONExporter, ParquetExporter, flatten_movie_record
+from test_integrated_data import MockYoutubeDataSource, MockYoutubeDataSourceQuotaExceeded, MockTMDbDataSourceManyMovies, MockIMDb
+
+@pytest.fixture
+def integrated_data():
+
+    return IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb()).integrate_popular_movies_youtube_data()
+
+def test_flatten_movie_record(integrated_data):
+
+    movie_row, video_rows = flatten_movie_record(integrated_data[0])
+
+    assert movie_row['tmdb_id'] == '1'
+    assert movie_row['title'] == 'Mock Movie 1'
+    assert movie_row['video_count'] == 2
+    assert [row['video_id'] for row in video_rows] == ['Mock Movie 1-video-1', 'Mock Movie 1-video-2']
+    assert video_rows[0]['views'] == 1000 and video_rows[0]['error'] is None
+
+    movie_row, video_rows = flatten_movie_record(IntegratedData(MockYoutubeDataSourceQuotaExceeded(), MockTMDbDataSourceManyMovies(), MockIMDb()).integrate_popular_movies_youtube_data()[0])
+
+    assert video_rows[0]['video_id'] is None
+    assert video_rows[0]['views'] is None
+    assert 'quota' in video_rows[0]['error']
+
+def test_ndjson_export_writes_one_line_per_movie(integrated_data, tmp_path):
+
+    with NDJSONExporter(str(tmp_path / 'movies.ndjson')) as exporter:
+
+        for movie_data in integrated_data:
+
+            exporter.write(movie_data)
+
+    lines = (tmp_path / 'movies.ndjson').read_text().splitlines()
+
+    assert len(lines) == 10
+    assert json.loads(lines[0]) == integrated_data[0].to_dict()
+
+def test_parquet_export_writes_movie_and_video_tables_in_batches(integrated_data, tmp_path):
+
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+
+    with ParquetExporter(str(tmp_path), batch_size=4) as exporter:
+
+        for movie_data in integrated_data:
+
+            exporter.write(movie_data)
+
+    movies = pyarrow_parquet.ParquetFile(str(tmp_path / 'movies.parquet'))
+    videos = pyarrow_parquet.read_table(str(tmp_path / 'videos.parquet'))
+
+    assert movies.metadata.num_rows == 10
+    assert movies.metadata.num_row_groups == 3
+    assert videos.num_rows == 20
+    assert videos.column('views').to_pylist() == [1000] * 20
+    assert movies.read().column('imdb_average_review').type == 'double'
@@ -0,0 +1,91 @@
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Project_Code import HTTPTransport, TMDbDataSource, IMDb, YouTubeDataSource, CircuitBreaker, CircuitOpenError
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+
+        body = json.dumps({'path': self.path, 'encoding': self.headers.get('Accept-Encoding')}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+
+        pass
+
+@pytest.fixture
+def local_server():
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+    server.server_close()
+
+def test_transport_reuses_connections(local_server):
+
+    transport = HTTPTransport(pool_size=2)
+
+    for _ in range(5):
+
+        response = transport.get('tmdb', local_server + 'movie/popular')
+        assert response.status_code == 200
+
+    assert 'gzip' in response.json()['encoding']
+    assert transport.connection_stats() == {'sessions': 1, 'requests': 5, 'connections_opened': 1, 'connections_reused': 4}
+    transport.close()
+
+def test_data_sources_share_transport(requests_mock):
+
+    transport = HTTPTransport()
+    sources = [YouTubeDataSource('key', transport), TMDbDataSource('key', transport), IMDb('key', transport)]
+
+    requests_mock.get("http://www.omdbapi.com/", json={'Response': 'False'})
+    sources[2].search('Missing Movie')
+
+    assert all(source.transport is transport for source in sources)
+    assert list(transport.sessions) == ['www.omdbapi.com']
+
+def test_transport_retries_server_errors_with_jittered_backoff(requests_mock):
+
+    transport = HTTPTransport()
+    waits = []
+    transport.sleep = waits.append
+    requests_mock.get("http://www.omdbapi.com/", [{'status_code': 500}, {'status_code': 503}, {'json': {'Response': 'True'}}])
+
+    assert transport.get('imdb', "http://www.omdbapi.com/").status_code == 200
+    assert len(waits) == 2
+    assert 0 <= waits[0] <= 0.5 and 0 <= waits[1] <= 1.0
+
+def test_circuit_breaker_fails_fast_until_the_host_recovers(requests_mock):
+
+    now = [0.0]
+    circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=lambda: now[0])
+    transport = HTTPTransport(max_retries=0, circuit_breaker=circuit_breaker)
+    requests_mock.get("http://www.omdbapi.com/", status_code=500)
+
+    assert transport.get('imdb', "http://www.omdbapi.com/").status_code == 500
+    assert transport.get('imdb', "http://www.omdbapi.com/").status_code == 500
+
+    with pytest.raises(CircuitOpenError):
+
+        transport.get('imdb', "http://www.omdbapi.com/")
+
+    assert requests_mock.call_count == 2
+    assert circuit_breaker.state('www.omdbapi.com') == 'open'
+
+    #After the reset timeout one trial call goes through and its success closes the circuit
+    now[0] = 31
+    requests_mock.get("http://www.omdbapi.com/", json={'Response': 'True'})
+
+    assert transport.get('imdb', "http://www.omdbapi.com/").status_code == 200
+    assert circuit_breaker.state('www.omdbapi.com') == 'closed'
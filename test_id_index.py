@@ -0,0 +1,148 @@
+import pytest
+from Project_Code import IDIndex, IntegratedData, IMDb, HTTPTransport, SnapshotStore, TMDbDetails
+from test_integrated_data import MockYoutubeDataSource, MockTMDbDataSourceManyMovies, MockIMDb
+
+class MockYoutubeDataSourceCounting(MockYoutubeDataSource):
+
+    def __init__(self):
+
+        self.searches = []
+
+    def search_videos_by_title(self, title):
+
+        self.searches.append(title)
+        return super().search_videos_by_title(title)
+
+class MockTMDbDataSourceWithIMDbIDs(MockTMDbDataSourceManyMovies):
+
+    def fetch_movie_details_with_credits(self, movie_id):
+
+        details = super().fetch_movie_details_with_credits(movie_id)
+        details['imdb_id'] = f'tt{int(movie_id):07d}'
+        return details
+
+class MockIMDbByID(MockIMDb):
+
+    def __init__(self):
+
+        self.lookups = []
+
+    def get_movie_info(self, title):
+
+        raise AssertionError("movies with an IMDb ID should not be searched by title")
+
+    def get_movie_info_by_id(self, imdb_id):
+
+        self.lookups.append(imdb_id)
+        return super().get_movie_info(imdb_id)
+
+class IDIndexCountingWrites(IDIndex):
+
+    def __init__(self, path):
+
+        super().__init__(path)
+        self.writes = []
+
+    def update(self, tmdb_id, imdb_id=None, video_ids=None):
+
+        self.writes.append((tmdb_id, imdb_id, video_ids))
+        super().update(tmdb_id, imdb_id, video_ids)
+
+def test_index_merges_updates_and_expires_video_ids(tmp_path):
+
+    now = [1000.0]
+    index = IDIndex(str(tmp_path / 'index.sqlite'), max_age=60, clock=lambda: now[0])
+
+    index.update('1', imdb_id='tt0000001')
+    index.update('1', video_ids=['a', 'b'])
+
+    assert index.get('1') == {'imdb_id': 'tt0000001', 'video_ids': ['a', 'b']}
+    assert index.get('2') is None
+
+    now[0] += 61
+
+    assert index.get('1') == {'imdb_id': 'tt0000001', 'video_ids': None}
+
+    index.invalidate(['1'], videos_only=True)
+    assert index.get('1') == {'imdb_id': 'tt0000001', 'video_ids': None}
+
+    assert index.warm_up([('2', None, ['c']), ('3', 'tt0000003', None)]) == 2
+    assert index.stats()['entries'] == 3
+
+    index.invalidate()
+    assert index.stats()['entries'] == 0
+
+@pytest.mark.parametrize('concurrent', [False, True])
+def test_indexed_movies_skip_the_youtube_search(tmp_path, concurrent):
+
+    index = IDIndex(str(tmp_path / 'index.sqlite'))
+    youtube_ds = MockYoutubeDataSourceCounting()
+
+    first = IntegratedData(youtube_ds, MockTMDbDataSourceManyMovies(), MockIMDb(), concurrent=concurrent, id_index=index).integrate_popular_movies_youtube_data()
+    second = IntegratedData(youtube_ds, MockTMDbDataSourceManyMovies(), MockIMDb(), concurrent=concurrent, id_index=index).integrate_popular_movies_youtube_data()
+
+    assert len(youtube_ds.searches) == 10
+    assert second == first
+    assert index.stats()['search_hits'] == 10
+
+def test_omdb_is_queried_by_imdb_id(tmp_path):
+
+    index = IDIndex(str(tmp_path / 'index.sqlite'))
+    imdb_ds = MockIMDbByID()
+
+    integrated_data = IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceWithIMDbIDs(), imdb_ds, id_index=index).integrate_popular_movies_youtube_data()
+
+    assert imdb_ds.lookups == [f'tt{movie_id:07d}' for movie_id in range(1, 11)]
+    assert integrated_data[0]['imdb_details']['Director'] == 'Mock Director'
+    assert index.get('3')['imdb_id'] == 'tt0000003'
+
+def test_unchanged_ids_are_not_written_again(tmp_path):
+
+    index = IDIndexCountingWrites(str(tmp_path / 'index.sqlite'))
+
+    IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceWithIMDbIDs(), MockIMDbByID(), id_index=index).integrate_popular_movies_youtube_data()
+
+    assert len(index.writes) == 20
+
+    index.writes = []
+    IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceWithIMDbIDs(), MockIMDbByID(), id_index=index).integrate_popular_movies_youtube_data()
+
+    assert index.writes == []
+
+    #A changed IMDb ID replaces the indexed one
+    index.update('3', imdb_id='tt9999999')
+    index.writes = []
+    IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceWithIMDbIDs(), MockIMDbByID(), id_index=index).integrate_popular_movies_youtube_data()
+
+    assert index.writes == [('3', 'tt0000003', None)]
+
+def test_snapshot_restores_the_imdb_ids(tmp_path):
+
+    store = SnapshotStore(str(tmp_path / 'snapshot.json'))
+    store.save(IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceWithIMDbIDs(), MockIMDb()).integrate_popular_movies_youtube_data())
+    records = store.load()
+
+    assert records['3']['tmdb_details']['imdb_id'] == 'tt0000003'
+
+    index = IDIndex(str(tmp_path / 'index.sqlite'))
+    index.warm_up_from_records(records.values())
+
+    assert index.get('3') == {'imdb_id': 'tt0000003', 'video_ids': list(records['3']['youtube_video_ids'])}
+    assert index.stats()['imdb_ids'] == 10
+
+def test_details_without_an_imdb_id_keep_their_keys():
+
+    details = TMDbDetails('Movie', 7.5, 100, 'Director', 'Actor', 1000)
+
+    assert 'imdb_id' not in details
+    assert details.to_dict() == {'title': 'Movie', 'average_rating': 7.5, 'number_of_ratings': 100, 'director': 'Director', 'lead_actor': 'Actor', 'budget': 1000}
+    assert TMDbDetails.from_dict(dict(details.to_dict(), imdb_id='tt0000001')).to_dict()['imdb_id'] == 'tt0000001'
+
+def test_imdb_lookup_by_id(requests_mock):
+
+    requests_mock.get("http://www.omdbapi.com/?apikey=key&i=tt1375666", json={'Title': 'Inception', 'Director': 'Christopher Nolan', 'Actors': 'Leonardo DiCaprio, Joseph Gordon-Levitt', 'imdbVotes': '2,000,000', 'imdbRating': '8.8', 'Response': 'True'})
+
+    info = IMDb('key', HTTPTransport()).get_movie_info_by_id('tt1375666')
+
+    assert info['Director'] == 'Christopher Nolan'
+    assert info['Lead Actor'] == 'Leonardo DiCaprio'
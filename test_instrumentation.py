@@ -0,0 +1,74 @@
+import json
+import pytest
+from Project_Code import Instrumentation, HTTPTransport, ResponseCache, IMDb, IntegratedData
+from test_integrated_data import MockYoutubeDataSource, MockTMDbDataSource, MockIMDb
+
+def test_transport_records_requests_retries_and_cache_hits(requests_mock):
+
+    instrumentation = Instrumentation(keep_trace=True)
+    events = []
+    instrumentation.add_hook(events.append)
+    transport = HTTPTransport(cache=ResponseCache(':memory:'), instrumentation=instrumentation)
+    transport.sleep = lambda seconds: None
+    imdb = IMDb('key', transport)
+
+    requests_mock.get("http://www.omdbapi.com/", [{'status_code': 429, 'headers': {'Retry-After': '0'}}, {'json': {'Title': 'Inception', 'Response': 'True'}}])
+
+    assert imdb.search('Inception')['Title'] == 'Inception'
+    assert imdb.search('Inception')['Title'] == 'Inception'
+
+    assert [(event['status'], event['retries'], event['cache_hit']) for event in events] == [(200, 1, False), (200, 0, True)]
+    assert events == instrumentation.trace
+
+    totals = instrumentation.summary()['requests'][events[0]['endpoint']]
+    assert totals['calls'] == 2
+    assert totals['retries'] == 1
+    assert totals['cache_hits'] == 1
+    assert totals['bytes'] == 2 * events[0]['payload_bytes'] > 0
+
+def test_transport_records_failed_calls(requests_mock):
+
+    instrumentation = Instrumentation()
+    transport = HTTPTransport(instrumentation=instrumentation)
+
+    requests_mock.get("http://www.omdbapi.com/", exc=ConnectionError)
+
+    with pytest.raises(ConnectionError):
+
+        transport.get('imdb', "http://www.omdbapi.com/")
+
+    assert instrumentation.summary()['requests']['imdb']['errors'] == 1
+
+def test_prometheus_rendering_and_trace_dump(tmp_path):
+
+    instrumentation = Instrumentation(keep_trace=True)
+    instrumentation.record_request('tmdb', 'tmdb.details', 0.03, 512, 200)
+
+    with instrumentation.stage('analysis'):
+
+        pass
+
+    metrics = instrumentation.render_prometheus()
+
+    assert 'api_requests_total{source="tmdb",endpoint="tmdb.details",status="200"} 1' in metrics
+    assert 'api_request_duration_seconds_bucket{source="tmdb",endpoint="tmdb.details",le="0.025"} 0' in metrics
+    assert 'api_request_duration_seconds_bucket{source="tmdb",endpoint="tmdb.details",le="0.05"} 1' in metrics
+    assert 'api_request_duration_seconds_count{source="tmdb",endpoint="tmdb.details"} 1' in metrics
+    assert 'stage_seconds_total{stage="analysis"}' in metrics
+
+    instrumentation.dump_trace(tmp_path / 'trace.json')
+    trace = json.loads((tmp_path / 'trace.json').read_text())
+
+    assert [event['type'] for event in trace] == ['request', 'stage']
+
+@pytest.mark.parametrize('concurrent', [False, True])
+def test_integration_times_each_stage(concurrent):
+
+    instrumentation = Instrumentation()
+    integrated_data_handler = IntegratedData(MockYoutubeDataSource(), MockTMDbDataSource(), MockIMDb(), concurrent=concurrent, instrumentation=instrumentation)
+
+    integrated_data_handler.analyze(integrated_data_handler.integrate_popular_movies_youtube_data())
+    stages = instrumentation.summary()['stages']
+
+    assert sorted(stages) == ['analysis', 'integrate', 'popular']
+    assert all(totals['runs'] == 1 for totals in stages.values())
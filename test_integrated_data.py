@@ -1,5 +1,5 @@
 import pytest
-from Project_Code import IntegratedData, YouTubeDataSource, TMDbDataSource, IMDb
+from Project_Code import IntegratedData, YouTubeDataSource, TMDbDataSource, IMDb, QuotaExceededError, SnapshotStore, MovieRecord, OMDbInfo, VideoStats, ErrorMarker, CircuitOpenError
 
 class MockYoutubeDataSourceQuotaExceeded:
 
@@ -64,4 +64,310 @@ def test_quota_exceeded_integration(mock_data_sources):
     response = integrated_data_handler.integrate_popular_movies_youtube_data()
 
     assert "No Youtube results available (Youtube API quota reached, try using a new key). No information Available." in str(response)
-    
\ No newline at end of file
+    
+class MockYoutubeDataSource:
+
+    def search_videos_by_title(self, title):
+
+        return [f'{title}-video-1', f'{title}-video-2']
+
+    def fetch_video_stats(self, video_id):
+
+        return {
+
+            'channelName': 'Mock Channel',
+            'videoTitle': video_id,
+            'views': 1000,
+            'likes': 10
+
+        }
+
+class MockTMDbDataSourceManyMovies(MockTMDbDataSource):
+
+    def fetch_most_popular_movies(self):
+
+        return [{'id': str(movie_id), 'title': f'Mock Movie {movie_id}'} for movie_id in range(1, 11)]
+
+    def fetch_movie_details_with_credits(self, movie_id):
+
+        details = super().fetch_movie_details_with_credits(movie_id)
+        details['title'] = f'Mock Movie {movie_id}'
+        return details
+
+def test_concurrent_integration_matches_sequential():
+
+    youtube_ds, tmdb_ds, imdb_ds = MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb()
+
+    sequential = IntegratedData(youtube_ds, tmdb_ds, imdb_ds).integrate_popular_movies_youtube_data()
+    concurrent = IntegratedData(youtube_ds, tmdb_ds, imdb_ds, concurrent=True, source_concurrency={'tmdb': 3, 'youtube': 2}).integrate_popular_movies_youtube_data()
+
+    assert concurrent == sequential
+    assert [movie['title'] for movie in concurrent] == [f'Mock Movie {movie_id}' for movie_id in range(1, 11)]
+
+def test_concurrent_integration_records_youtube_errors(mock_data_sources):
+
+    youtube_ds, tmdb_ds, imdb_ds = mock_data_sources
+    response = IntegratedData(youtube_ds, tmdb_ds, imdb_ds, concurrent=True).integrate_popular_movies_youtube_data()
+
+    assert "No Youtube results available (Youtube API quota reached, try using a new key). No information Available." in str(response)
+
+class MockYoutubeDataSourceBatched(MockYoutubeDataSource):
+
+    def __init__(self):
+
+        self.batches = []
+
+    def fetch_video_stats(self, video_id):
+
+        raise AssertionError("per-video lookups should not be used when batching is available")
+
+    def fetch_video_stats_batch(self, video_ids):
+
+        self.batches.append(list(video_ids))
+        return {video_id: MockYoutubeDataSource.fetch_video_stats(self, video_id) for video_id in video_ids}
+
+def test_integration_batches_video_stats():
+
+    youtube_ds = MockYoutubeDataSourceBatched()
+    integrated_data = IntegratedData(youtube_ds, MockTMDbDataSourceManyMovies(), MockIMDb()).integrate_popular_movies_youtube_data()
+
+    assert len(youtube_ds.batches) == 1
+    assert len(youtube_ds.batches[0]) == 20
+    assert integrated_data == IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb()).integrate_popular_movies_youtube_data()
+
+class MockTMDbDataSourcePaged(MockTMDbDataSourceManyMovies):
+
+    def __init__(self):
+
+        self.movies_listed = 0
+
+    def iter_popular_movies(self, count, prefetch=1):
+
+        for movie_id in range(1, count + 1):
+
+            self.movies_listed += 1
+            yield {'id': str(movie_id), 'title': f'Mock Movie {movie_id}'}
+
+@pytest.mark.parametrize('concurrent', [False, True])
+def test_stream_yields_records_before_the_list_is_exhausted(concurrent):
+
+    tmdb_ds = MockTMDbDataSourcePaged()
+    stream = IntegratedData(MockYoutubeDataSourceBatched(), tmdb_ds, MockIMDb(), concurrent=concurrent).stream_popular_movies_youtube_data(1000, chunk_size=5)
+
+    first = next(stream)
+
+    assert first['title'] == 'Mock Movie 1'
+    assert tmdb_ds.movies_listed == 5
+    assert [movie['title'] for movie in stream][-1] == 'Mock Movie 1000'
+
+def analysis_movie(title, budget, tmdb_rating, imdb_rating, stats):
+
+    return {
+
+        'title': title,
+        'tmdb_details': {'budget': budget, 'average_rating': tmdb_rating},
+        'imdb_details': {'Average Review': imdb_rating},
+        'youtube_videos_stats': stats
+
+    }
+
+def test_analyze_computes_metrics_and_correlations(mock_data_sources):
+
+    integrated_data_handler = IntegratedData(*mock_data_sources)
+    integrated_data = [
+
+        analysis_movie('A', 1000, 6.0, '5.5', [{'views': 100, 'likes': 10}, {'views': 300, 'likes': 30}]),
+        analysis_movie('B', 2000, 7.0, '6.5', [{'views': 1000, 'likes': 50}]),
+        analysis_movie('C', 0, 8.0, 'N/A', [{'error': 'quota'}])
+
+    ]
+
+    analysis = integrated_data_handler.analyze(integrated_data)
+    columns = analysis['columns']
+
+    assert analysis['titles'] == ['A', 'B', 'C']
+    assert list(columns['average_views']) == [200, 1000, 0]
+    assert list(columns['engagement_ratio']) == [10, 5, 0]
+    assert columns['potential_revenue'][0] == pytest.approx(20 * 11.23 * 0.1)
+    assert analysis['correlations']['tmdb_vs_imdb_rating'] == pytest.approx(1.0)
+    assert analysis['correlations']['budget_vs_engagement_ratio'] == pytest.approx(-1.0)
+
+def test_perform_analysis_returns_structured_results(mock_data_sources, capsys):
+
+    integrated_data_handler = IntegratedData(*mock_data_sources)
+    analysis = integrated_data_handler.perform_analysis([analysis_movie('A', 1000, 6.0, '5.5', [{'views': 100, 'likes': 10}])])
+
+    assert analysis['titles'] == ['A']
+    assert 'Engagement Ratio (Likes/Views): 10.00%' in capsys.readouterr().out
+
+class MockYoutubeDataSourceQuotaRunsOut(MockYoutubeDataSourceBatched):
+
+    def __init__(self, searches_allowed):
+
+        super().__init__()
+        self.searches = 0
+        self.searches_allowed = searches_allowed
+
+    def search_videos_by_title(self, title):
+
+        self.searches += 1
+
+        if self.searches > self.searches_allowed:
+
+            raise QuotaExceededError("YouTube API quota exceeded")
+
+        return super().search_videos_by_title(title)
+
+def test_quota_exhaustion_keeps_partial_results():
+
+    youtube_ds = MockYoutubeDataSourceQuotaRunsOut(searches_allowed=3)
+    integrated_data = IntegratedData(youtube_ds, MockTMDbDataSourceManyMovies(), MockIMDb()).integrate_popular_movies_youtube_data()
+
+    assert len(integrated_data) == 10
+    assert youtube_ds.searches == 4
+    assert [len(movie['youtube_videos_stats']) for movie in integrated_data[:3]] == [2, 2, 2]
+    assert all('error' in movie['youtube_videos_stats'][0] for movie in integrated_data[3:])
+    assert all(movie['imdb_details'] for movie in integrated_data)
+
+class MockTMDbDataSourceChanging(MockTMDbDataSourceManyMovies):
+
+    def __init__(self, movie_ids):
+
+        self.movie_ids = movie_ids
+        self.details_fetched = []
+
+    def fetch_most_popular_movies(self):
+
+        return [{'id': str(movie_id), 'title': f'Mock Movie {movie_id}'} for movie_id in self.movie_ids]
+
+    def fetch_movie_details_with_credits(self, movie_id):
+
+        self.details_fetched.append(movie_id)
+        return super().fetch_movie_details_with_credits(movie_id)
+
+class MockYoutubeDataSourceGrowing(MockYoutubeDataSourceBatched):
+
+    def __init__(self, views):
+
+        super().__init__()
+        self.views = views
+        self.searched = []
+
+    def search_videos_by_title(self, title):
+
+        self.searched.append(title)
+        return super().search_videos_by_title(title)
+
+    def fetch_video_stats_batch(self, video_ids):
+
+        stats = super().fetch_video_stats_batch(video_ids)
+
+        for video_stats in stats.values():
+
+            video_stats['views'] = self.views
+
+        return stats
+
+def test_incremental_refresh_only_fetches_new_movies(tmp_path):
+
+    snapshot_store = SnapshotStore(str(tmp_path / 'snapshot.json'))
+    first_run = IntegratedData(MockYoutubeDataSourceGrowing(1000), MockTMDbDataSourceChanging([1, 2, 3]), MockIMDb())
+    records, delta = first_run.refresh_incremental(snapshot_store)
+
+    assert [movie['title'] for movie in delta['added']] == ['Mock Movie 1', 'Mock Movie 2', 'Mock Movie 3']
+
+    tmdb_ds, youtube_ds = MockTMDbDataSourceChanging([2, 3, 4]), MockYoutubeDataSourceGrowing(1500)
+    records, delta = IntegratedData(youtube_ds, tmdb_ds, MockIMDb()).refresh_incremental(snapshot_store)
+
+    assert tmdb_ds.details_fetched == ['4']
+    assert youtube_ds.searched == ['Mock Movie 4']
+    assert [movie['title'] for movie in records] == ['Mock Movie 2', 'Mock Movie 3', 'Mock Movie 4']
+    assert [movie['title'] for movie in delta['added']] == ['Mock Movie 4']
+    assert [movie['title'] for movie in delta['removed']] == ['Mock Movie 1']
+    assert delta['updated'] == [
+
+        {'tmdb_id': '2', 'title': 'Mock Movie 2', 'views_change': 1000, 'likes_change': 0},
+        {'tmdb_id': '3', 'title': 'Mock Movie 3', 'views_change': 1000, 'likes_change': 0}
+
+    ]
+    assert records[0]['youtube_videos_stats'][0]['views'] == 1500
+    assert snapshot_store.load()['4']['title'] == 'Mock Movie 4'
+
+def test_integrated_records_are_compact_and_dict_compatible(mock_data_sources):
+
+    integrated_data = IntegratedData(MockYoutubeDataSource(), *mock_data_sources[1:]).integrate_popular_movies_youtube_data()
+    movie_data = integrated_data[0]
+
+    assert isinstance(movie_data, MovieRecord)
+    assert isinstance(movie_data['youtube_videos_stats'][0], VideoStats)
+    assert not hasattr(movie_data, '__dict__')
+    assert movie_data['tmdb_details']['director'] == 'Mock Director'
+    assert movie_data['youtube_videos_stats'][0] == MockYoutubeDataSource().fetch_video_stats('Mock Movie 1-video-1')
+    assert MovieRecord.from_dict(movie_data.to_dict()) == movie_data
+
+def test_omdb_numbers_are_parsed_once():
+
+    imdb_details = OMDbInfo.from_dict({'Director': 'Someone', 'Lead Actor': 'N/A', 'Number of Reviews': '1,234,567', 'Average Review': '8.5'})
+
+    assert imdb_details.number_of_reviews == 1234567
+    assert imdb_details['Average Review'] == 8.5
+    assert imdb_details.get('Lead Actor', 'N/A') == 'N/A'
+    assert OMDbInfo.from_dict({'Number of Reviews': 'N/A', 'Average Review': 'N/A'}).to_dict() == {'Director': None, 'Lead Actor': None, 'Number of Reviews': None, 'Average Review': None}
+
+class MockIMDbFlaky(MockIMDb):
+
+    def get_movie_info(self, title):
+
+        if title == 'Mock Movie 2':
+
+            raise CircuitOpenError("www.omdbapi.com is unavailable, failing fast for another 30s")
+
+        return super().get_movie_info(title)
+
+class MockYoutubeDataSourceMissingVideo(MockYoutubeDataSourceBatched):
+
+    def fetch_video_stats_batch(self, video_ids):
+
+        stats = super().fetch_video_stats_batch(video_ids)
+        del stats['Mock Movie 1-video-2']
+        return stats
+
+class MockYoutubeDataSourceUnwatchedVideo(MockYoutubeDataSourceBatched):
+
+    def fetch_video_stats_batch(self, video_ids):
+
+        stats = super().fetch_video_stats_batch(video_ids)
+        stats['Mock Movie 1-video-2'] = {'channelName': '', 'videoTitle': '', 'views': 0, 'likes': 0}
+        return stats
+
+def test_video_with_no_views_is_not_taken_for_a_missing_one():
+
+    integrated_data = IntegratedData(MockYoutubeDataSourceUnwatchedVideo(), MockTMDbDataSourceManyMovies(), MockIMDb()).integrate_popular_movies_youtube_data()
+    unwatched = integrated_data[0]['youtube_videos_stats'][1]
+
+    assert isinstance(unwatched, VideoStats)
+    assert unwatched['views'] == 0
+    assert integrated_data[0]['errors'] == ()
+
+@pytest.mark.parametrize('concurrent', [False, True])
+def test_failing_sources_leave_typed_error_markers(concurrent):
+
+    integrated_data = IntegratedData(MockYoutubeDataSourceMissingVideo(), MockTMDbDataSourceManyMovies(), MockIMDbFlaky(), concurrent=concurrent).integrate_popular_movies_youtube_data()
+
+    assert len(integrated_data) == 10
+    assert integrated_data[1]['imdb_details'] is None
+    assert [(error.source, error.kind) for error in integrated_data[1]['errors']] == [('imdb', 'unavailable')]
+
+    missing = integrated_data[0]['youtube_videos_stats'][1]
+
+    assert isinstance(missing, ErrorMarker) and missing.kind == 'missing'
+    assert 'views' not in missing
+    assert IntegratedData(MockYoutubeDataSource(), MockTMDbDataSource(), MockIMDb()).analyze(integrated_data[:1])['columns']['average_views'][0] == 1000
+
+def test_popular_list_failure_integrates_nothing(mock_data_sources, capsys):
+
+    youtube_ds, tmdb_ds, imdb_ds = mock_data_sources
+    tmdb_ds.fetch_most_popular_movies = lambda: 'Possible Network Error'
+
+    assert IntegratedData(youtube_ds, tmdb_ds, imdb_ds).integrate_popular_movies_youtube_data() == []
+    assert 'Could not fetch the popular movies' in capsys.readouterr().out
@@ -0,0 +1,71 @@
+import pytest
+from Project_Code import IntegratedData, Leaderboard, Leaderboards, top_movies, movie_metrics, main
+from test_integrated_data import MockYoutubeDataSource, MockTMDbDataSourceManyMovies, MockIMDb
+
+class MockYoutubeDataSourceVaried(MockYoutubeDataSource):
+
+    #Movie n gets n * 1000 views and a like count that makes the engagement ratio fall as n grows
+
+    def fetch_video_stats(self, video_id):
+
+        movie_number = int(video_id.split(' ')[2].split('-')[0])
+        return {'channelName': 'Mock Channel', 'videoTitle': video_id, 'views': movie_number * 1000, 'likes': 1000 - movie_number * 50}
+
+class MockTMDbDataSourceBudgets(MockTMDbDataSourceManyMovies):
+
+    def fetch_movie_details_with_credits(self, movie_id):
+
+        details = super().fetch_movie_details_with_credits(movie_id)
+        details['budget'] = int(movie_id) * 1000000 if movie_id != '5' else 0
+        details['number_of_ratings'] = int(movie_id) * 10
+        return details
+
+@pytest.fixture
+def integrated_data():
+
+    return IntegratedData(MockYoutubeDataSourceVaried(), MockTMDbDataSourceBudgets(), MockIMDb()).integrate_popular_movies_youtube_data()
+
+def test_top_k_matches_a_full_sort(integrated_data):
+
+    for metric in ('engagement_ratio', 'potential_revenue', 'average_views'):
+
+        expected = sorted(integrated_data, key=lambda movie: movie_metrics(movie)[metric], reverse=True)[:3]
+        top = top_movies(iter(integrated_data), metric, k=3)
+
+        assert [movie['tmdb_id'] for movie in top] == [movie['tmdb_id'] for movie in expected]
+
+    assert [movie['title'] for movie in top_movies(integrated_data, 'average_views', k=2)] == ['Mock Movie 10', 'Mock Movie 9']
+
+def test_filters_and_ties(integrated_data):
+
+    #Movie 5 has no known budget, movies 1 and 2 have too few ratings
+    board = Leaderboard('average_views', k=10, min_budget=1000000, max_budget=7000000, min_ratings=30).extend(integrated_data)
+
+    assert [movie['tmdb_id'] for movie in board.results()] == ['7', '6', '4', '3']
+    assert (board.seen, board.matched) == (10, 4)
+
+    #Every movie has the same rating gap, so the first ones seen keep their places
+    assert [movie['tmdb_id'] for movie in top_movies(integrated_data, 'rating_gap', k=3)] == ['1', '2', '3']
+    assert top_movies(integrated_data, 'rating_gap', k=1)[0]['score'] == 0
+
+    with pytest.raises(ValueError):
+
+        Leaderboard('popularity')
+
+def test_leaderboards_rank_several_metrics_in_one_pass(integrated_data):
+
+    results = Leaderboards(['engagement_ratio', 'average_views'], k=1, predicate=lambda movie, metrics: movie['tmdb_id'] != '1').extend(integrated_data).results()
+
+    assert results['engagement_ratio'][0]['tmdb_id'] == '2'
+    assert results['average_views'][0]['tmdb_id'] == '10'
+
+def test_cli_prints_only_the_leaderboard(monkeypatch, capsys, integrated_data):
+
+    monkeypatch.setattr(IntegratedData, 'integrate_popular_movies_youtube_data', lambda self: integrated_data)
+    main(['--top', '2', '--rank-by', 'average_views', '--no-cache'])
+
+    output = capsys.readouterr().out
+
+    assert '--- Top 2 by Average Views ---' in output
+    assert '1. Mock Movie 10' in output and '2. Mock Movie 9' in output
+    assert 'Mock Movie 3' not in output
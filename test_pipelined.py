@@ -0,0 +1,189 @@
+import threading
+import time
+from Project_Code import IntegratedData, TaskGraph, Instrumentation
+from test_integrated_data import MockYoutubeDataSource, MockYoutubeDataSourceQuotaExceeded, MockTMDbDataSourceManyMovies, MockIMDb
+
+class MockTMDbDataSourceGated(MockTMDbDataSourceManyMovies):
+
+    #Holds back the details of the gated movies until the gate opens
+
+    def __init__(self, gated):
+
+        self.gated = gated
+        self.gate = threading.Event()
+
+    def fetch_movie_details_with_credits(self, movie_id):
+
+        if movie_id in self.gated:
+
+            assert self.gate.wait(5)
+
+        return super().fetch_movie_details_with_credits(movie_id)
+
+class MockYoutubeDataSourceOpeningGate(MockYoutubeDataSource):
+
+    def __init__(self, gate):
+
+        self.gate = gate
+
+    def search_videos_by_title(self, title):
+
+        self.gate.set()
+        return super().search_videos_by_title(title)
+
+class MockYoutubeDataSourceBatching(MockYoutubeDataSource):
+
+    #The first search waits until every movie has been scheduled, so the other searches finish while the first batch is still queued
+
+    def __init__(self):
+
+        self.gate = threading.Event()
+        self.batches = []
+
+    def search_videos_by_title(self, title):
+
+        assert self.gate.wait(5)
+        return super().search_videos_by_title(title)
+
+    def fetch_video_stats_batch(self, video_ids):
+
+        self.batches.append(list(video_ids))
+        return {video_id: self.fetch_video_stats(video_id) for video_id in video_ids}
+
+class MockTMDbDataSourceFailingMovie(MockTMDbDataSourceManyMovies):
+
+    def __init__(self, failed_movie, gate):
+
+        self.failed_movie = failed_movie
+        self.gate = gate
+
+    def fetch_movie_details_with_credits(self, movie_id):
+
+        if movie_id == self.failed_movie:
+
+            self.gate.set()
+            raise ConnectionError("TMDb is unavailable")
+
+        return super().fetch_movie_details_with_credits(movie_id)
+
+class MockYoutubeDataSourceHeldSearch(MockYoutubeDataSourceBatching):
+
+    #The first search holds the only YouTube worker until the failing details have been fetched, so the other searches are still queued
+
+    def search_videos_by_title(self, title):
+
+        self.searches.append(title)
+        assert self.gate.wait(5)
+        time.sleep(0.05)
+        return MockYoutubeDataSource.search_videos_by_title(self, title)
+
+    def __init__(self):
+
+        super().__init__()
+        self.searches = []
+
+def test_pipelined_records_match_the_sequential_ones():
+
+    sequential = IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb()).integrate_popular_movies_youtube_data()
+    pipelined = list(IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb()).stream_pipelined_movies(MockTMDbDataSourceManyMovies().fetch_most_popular_movies()))
+
+    assert sorted(pipelined, key=lambda movie: int(movie['tmdb_id'])) == sequential
+
+    #Bare TMDb IDs search with the title from the details instead
+    assert sorted(IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb()).stream_pipelined_movies({'id': str(movie_id)} for movie_id in range(1, 11)), key=lambda movie: int(movie['tmdb_id'])) == sequential
+
+def test_youtube_search_does_not_wait_for_the_details():
+
+    #The details only return once the search has started, so waiting on them first would stall the movie
+    tmdb_ds = MockTMDbDataSourceGated({'1'})
+    records = list(IntegratedData(MockYoutubeDataSourceOpeningGate(tmdb_ds.gate), tmdb_ds, MockIMDb()).stream_pipelined_movies([{'id': '1', 'title': 'Mock Movie 1'}]))
+
+    assert [movie['title'] for movie in records] == ['Mock Movie 1']
+
+def test_records_stream_out_in_completion_order():
+
+    tmdb_ds = MockTMDbDataSourceGated({'1'})
+    stream = IntegratedData(MockYoutubeDataSource(), tmdb_ds, MockIMDb()).stream_pipelined_movies(tmdb_ds.fetch_most_popular_movies()[:2])
+
+    assert next(stream)['tmdb_id'] == '2'
+
+    tmdb_ds.gate.set()
+
+    assert next(stream)['tmdb_id'] == '1'
+
+def test_youtube_errors_are_recorded_per_movie():
+
+    records = list(IntegratedData(MockYoutubeDataSourceQuotaExceeded(), MockTMDbDataSourceManyMovies(), MockIMDb()).stream_pipelined_movies(MockTMDbDataSourceManyMovies().fetch_most_popular_movies()))
+
+    assert len(records) == 10
+    assert all(movie['youtube_videos_stats'][0]['kind'] == 'quota' for movie in records)
+
+def test_failed_dependency_fails_the_task_without_running_it():
+
+    graph = TaskGraph()
+    calls = []
+
+    def fail():
+
+        raise ValueError("details failed")
+
+    failed = graph.add(None, fail)
+    dependent = graph.add(None, calls.append, failed)
+
+    assert isinstance(dependent.exception(), ValueError)
+    assert calls == []
+
+def test_movies_in_flight_are_bounded_by_the_pools():
+
+    tmdb_ds = MockTMDbDataSourceGated({str(movie_id) for movie_id in range(1, 11)})
+    pulled = []
+
+    def movies():
+
+        for movie in tmdb_ds.fetch_most_popular_movies():
+
+            pulled.append(movie['id'])
+            yield movie
+
+    stream = IntegratedData(MockYoutubeDataSource(), tmdb_ds, MockIMDb(), source_concurrency={'tmdb': 1, 'imdb': 1, 'youtube': 1}).stream_pipelined_movies(movies())
+    records = []
+    consumer = threading.Thread(target=lambda: records.extend(stream))
+    consumer.start()
+    time.sleep(0.2)
+
+    #No movie can finish while its details are held back, so only one movie per pool worker has been taken
+    assert pulled == ['1', '2', '3']
+
+    tmdb_ds.gate.set()
+    consumer.join(5)
+
+    assert len(records) == 10
+
+def test_stats_of_movies_found_together_share_a_request():
+
+    youtube_ds = MockYoutubeDataSourceBatching()
+    instrumentation = Instrumentation()
+
+    def movies():
+
+        yield from MockTMDbDataSourceManyMovies().fetch_most_popular_movies()
+        youtube_ds.gate.set()
+
+    pipelined = list(IntegratedData(youtube_ds, MockTMDbDataSourceManyMovies(), MockIMDb(), source_concurrency={'tmdb': 10, 'imdb': 10, 'youtube': 1}, instrumentation=instrumentation).stream_pipelined_movies(movies()))
+    sequential = IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb()).integrate_popular_movies_youtube_data()
+
+    assert sorted(pipelined, key=lambda movie: int(movie['tmdb_id'])) == sequential
+    assert len(youtube_ds.batches) == 1
+    assert len(youtube_ds.batches[0]) == 20
+    assert instrumentation.stage_totals['integrate']['runs'] == 1
+
+def test_movies_whose_details_fail_spend_no_youtube_quota():
+
+    youtube_ds = MockYoutubeDataSourceHeldSearch()
+    tmdb_ds = MockTMDbDataSourceFailingMovie('2', youtube_ds.gate)
+
+    records = list(IntegratedData(youtube_ds, tmdb_ds, MockIMDb(), source_concurrency={'tmdb': 10, 'imdb': 10, 'youtube': 1}).stream_pipelined_movies(tmdb_ds.fetch_most_popular_movies()))
+
+    assert len(records) == 9
+    assert 'Mock Movie 2' not in youtube_ds.searches
+    assert not any(video_id.startswith('Mock Movie 2-') for batch in youtube_ds.batches for video_id in batch)
@@ -0,0 +1,163 @@
+import pytest
+import requests
+from Project_Code import RateLimiter, TokenBucket, HTTPTransport, YouTubeDataSource, QuotaExceededError, ResponseCache, Instrumentation, CircuitBreaker, _quota_day
+
+class FakeTime:
+
+    def __init__(self):
+
+        self.now = 0.0
+        self.slept = []
+
+    def clock(self):
+
+        return self.now
+
+    def sleep(self, seconds):
+
+        self.slept.append(seconds)
+        self.now += seconds
+
+def test_token_bucket_waits_once_the_burst_is_spent():
+
+    fake_time = FakeTime()
+    bucket = TokenBucket(rate=2, burst=2, clock=fake_time.clock, sleep=fake_time.sleep)
+
+    for _ in range(4):
+
+        bucket.acquire()
+
+    assert fake_time.slept == [0.5, 0.5]
+
+def test_youtube_quota_charges_endpoint_costs():
+
+    fake_time = FakeTime()
+    limiter = RateLimiter({'youtube': {'daily_quota': 250}}, clock=fake_time.clock, sleep=fake_time.sleep)
+
+    limiter.acquire('youtube', 'youtube.search')
+    limiter.acquire('youtube', 'youtube.search')
+
+    for _ in range(50):
+
+        limiter.acquire('youtube', 'youtube.videos')
+
+    assert limiter.quota_remaining('youtube') == 0
+
+    with pytest.raises(QuotaExceededError):
+
+        limiter.acquire('youtube', 'youtube.videos')
+
+def test_quota_resets_on_a_new_day():
+
+    day = ['2024-03-01']
+    limiter = RateLimiter({'imdb': {'daily_quota': 1}}, sleep=lambda seconds: None, today=lambda: day[0])
+
+    limiter.acquire('imdb')
+    day[0] = '2024-03-02'
+    limiter.acquire('imdb')
+
+    assert limiter.quota_remaining('imdb') == 0
+
+def test_transport_retries_after_429(requests_mock):
+
+    limiter = RateLimiter(sleep=lambda seconds: None)
+    transport = HTTPTransport(rate_limiter=limiter)
+    waits = []
+    transport.sleep = waits.append
+    requests_mock.get("https://api.themoviedb.org/3/movie/1", [
+
+        {'status_code': 429, 'headers': {'Retry-After': '2'}},
+        {'status_code': 429},
+        {'status_code': 200, 'json': {'title': 'Movie'}}
+
+    ])
+
+    response = transport.get('tmdb', "https://api.themoviedb.org/3/movie/1")
+
+    assert response.status_code == 200
+    assert waits == [2.0, 1.0]
+    assert limiter.buckets['tmdb'].rate < limiter.buckets['tmdb'].max_rate
+
+def test_youtube_403_exhausts_the_quota(requests_mock):
+
+    limiter = RateLimiter(sleep=lambda seconds: None)
+    youtube_data_source = YouTubeDataSource('test_api_key', HTTPTransport(rate_limiter=limiter))
+    requests_mock.get("https://www.googleapis.com/youtube/v3/search", status_code=403)
+
+    with pytest.raises(QuotaExceededError):
+
+        youtube_data_source.search_videos_by_title('Movie')
+
+    assert limiter.quota_remaining('youtube') == 0
+
+def test_daily_quota_usage_persists_across_runs(tmp_path):
+
+    day = ['2024-03-01']
+    limits = {'youtube': {'daily_quota': 250}}
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+
+    RateLimiter(limits, sleep=lambda seconds: None, today=lambda: day[0], usage_store=cache).acquire('youtube', 'youtube.search')
+    cache.close()
+
+    #A later run on the same day starts from what the first one spent
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    limiter = RateLimiter(limits, sleep=lambda seconds: None, today=lambda: day[0], usage_store=cache)
+
+    assert limiter.quota_remaining('youtube') == 150
+
+    limiter.exhaust('youtube')
+    assert cache.load_quota_usage('2024-03-01') == {'youtube': 250}
+
+    day[0] = '2024-03-02'
+    limiter.acquire('youtube', 'youtube.videos')
+
+    assert limiter.quota_remaining('youtube') == 249
+    assert cache.load_quota_usage('2024-03-01') == {}
+
+def test_retried_request_is_charged_once(requests_mock):
+
+    limiter = RateLimiter({'youtube': {'daily_quota': 1000}}, sleep=lambda seconds: None)
+    transport = HTTPTransport(rate_limiter=limiter)
+    transport.sleep = lambda seconds: None
+    requests_mock.get("https://www.googleapis.com/youtube/v3/search", [{'status_code': 503}, {'status_code': 429}, {'status_code': 200, 'json': {'items': []}}])
+
+    assert transport.get('youtube', "https://www.googleapis.com/youtube/v3/search", endpoint='youtube.search').status_code == 200
+    assert limiter.quota_remaining('youtube') == 900
+
+def test_request_refused_by_the_quota_is_not_recorded(requests_mock):
+
+    now = [0.0]
+    limiter = RateLimiter({'imdb': {'daily_quota': 1}}, sleep=lambda seconds: None)
+    instrumentation = Instrumentation()
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+    transport = HTTPTransport(rate_limiter=limiter, instrumentation=instrumentation, max_retries=0, circuit_breaker=circuit_breaker)
+    requests_mock.get("http://www.omdbapi.com/", exc=requests.ConnectionError)
+
+    with pytest.raises(requests.ConnectionError):
+
+        transport.get('imdb', "http://www.omdbapi.com/")
+
+    #The circuit is half open, the request refused by the quota must not take the trial call
+    now[0] += 31
+
+    with pytest.raises(QuotaExceededError):
+
+        transport.get('imdb', "http://www.omdbapi.com/")
+
+    assert circuit_breaker.state('www.omdbapi.com') == 'half-open'
+    assert instrumentation.request_totals['imdb']['calls'] == 1
+
+def test_youtube_quota_day_follows_pacific_time(tmp_path):
+
+    #03:00 UTC on March 2nd is still the evening of March 1st in California
+    timestamp = 1709348400
+
+    assert _quota_day(timestamp=timestamp) == '2024-03-02'
+    assert _quota_day('America/Los_Angeles', timestamp) == '2024-03-01'
+
+    #Recording a UTC day for OMDb keeps the YouTube usage of the Pacific day before it
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    cache.add_quota_usage('2024-03-01', 'youtube', 9850)
+    cache.add_quota_usage('2024-03-02', 'imdb', 1)
+
+    assert cache.load_quota_usage('2024-03-01') == {'youtube': 9850}
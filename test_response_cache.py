@@ -0,0 +1,71 @@
+import pytest
+from Project_Code import ResponseCache, HTTPTransport, TMDbDataSource
+
+class FakeClock:
+
+    def __init__(self):
+
+        self.now = 1000.0
+
+    def __call__(self):
+
+        return self.now
+
+@pytest.fixture
+def clock():
+
+    return FakeClock()
+
+@pytest.fixture
+def cache(clock):
+
+    return ResponseCache(':memory:', ttls={'tmdb.details': 60, 'youtube.videos': 10}, max_bytes=100, clock=clock)
+
+def test_cache_key_strips_api_keys_and_sorts_parameters():
+
+    first = ResponseCache.make_key('https://api.themoviedb.org/3/movie/1?api_key=abc&append_to_response=credits')
+    second = ResponseCache.make_key('https://api.themoviedb.org/3/movie/1?append_to_response=credits&api_key=xyz')
+    omdb = ResponseCache.make_key('http://www.omdbapi.com/', {'apikey': 'abc', 't': 'The Matrix'})
+
+    assert first == second == 'api.themoviedb.org/3/movie/1?append_to_response=credits'
+    assert omdb == 'www.omdbapi.com/?t=The+Matrix'
+
+def test_cache_entries_expire_per_endpoint(cache, clock):
+
+    cache.set('tmdb.details', 'details', b'{}')
+    cache.set('youtube.videos', 'videos', b'{}')
+    clock.now += 30
+
+    assert cache.get('tmdb.details', 'details') == b'{}'
+    assert cache.get('youtube.videos', 'videos') is None
+    assert cache.stats()['endpoints'] == {'tmdb.details': {'hits': 1, 'misses': 0}, 'youtube.videos': {'hits': 0, 'misses': 1}}
+
+def test_cache_evicts_least_recently_used(cache, clock):
+
+    for key in ('a', 'b', 'c'):
+
+        clock.now += 1
+        cache.set('tmdb.details', key, b'x' * 40)
+
+        if key == 'b':
+
+            clock.now += 1
+            cache.get('tmdb.details', 'a')
+
+    assert cache.get('tmdb.details', 'a') is not None
+    assert cache.get('tmdb.details', 'b') is None
+    assert cache.stats()['evictions'] == 1
+
+def test_transport_serves_repeat_requests_from_cache(requests_mock):
+
+    url = "https://api.themoviedb.org/3/movie/12345?api_key=test_api_key&append_to_response=credits"
+    requests_mock.get(url, json={'title': 'Cached Movie', 'vote_average': 7.0, 'vote_count': 10, 'credits': {'crew': [], 'cast': []}})
+    cache = ResponseCache(':memory:')
+    tmdb_data_source = TMDbDataSource('test_api_key', HTTPTransport(cache=cache))
+
+    first = tmdb_data_source.fetch_movie_details_with_credits('12345')
+    second = tmdb_data_source.fetch_movie_details_with_credits('12345')
+
+    assert first == second
+    assert requests_mock.call_count == 1
+    assert cache.stats()['hits'] == 1
@@ -0,0 +1,84 @@
+import gzip
+import json
+import pytest
+from Project_Code import IntegratedData, SnapshotStore, iter_tmdb_export, top_exported_movies, main
+from test_integrated_data import MockYoutubeDataSource, MockTMDbDataSourceManyMovies, MockIMDb
+
+class MockTMDbDataSourceNoPopularList(MockTMDbDataSourceManyMovies):
+
+    def fetch_most_popular_movies(self):
+
+        raise AssertionError("seeded runs should not fetch the popular list")
+
+@pytest.fixture
+def export_path(tmp_path):
+
+    path = tmp_path / 'movie_ids_01_02_2024.json.gz'
+
+    with gzip.open(path, 'wt', encoding='utf-8') as export_file:
+
+        for movie_id in range(1, 1001):
+
+            export_file.write(json.dumps({'adult': movie_id % 100 == 0, 'id': movie_id, 'original_title': f'Original {movie_id}', 'popularity': movie_id % 97 + movie_id / 10000, 'video': False}) + '\n')
+
+        #A download cut off mid-line
+        export_file.write('{"adult": false, "id": 10')
+
+    return str(path)
+
+def test_export_is_streamed_and_ranked_by_popularity(export_path):
+
+    assert sum(1 for _ in iter_tmdb_export(export_path)) == 990
+    assert sum(1 for _ in iter_tmdb_export(export_path, include_adult=True)) == 1000
+
+    top = top_exported_movies(export_path, 3)
+
+    assert [movie['id'] for movie in top] == [969, 872, 775]
+    assert top[0] == {'id': 969, 'original_title': 'Original 969', 'popularity': 96.0969}
+
+    #Adult titles are only ranked when asked for
+    assert 800 not in [movie['id'] for movie in top_exported_movies(export_path, 1000)]
+    assert 800 in [movie['id'] for movie in top_exported_movies(export_path, 1000, include_adult=True)]
+
+def test_truncated_download_keeps_the_movies_read_so_far(export_path, tmp_path, capsys):
+
+    truncated_path = tmp_path / 'truncated.json.gz'
+
+    with open(export_path, 'rb') as export_file:
+
+        compressed = export_file.read()
+
+    #Cuts the compressed stream itself, as an interrupted download does
+    truncated_path.write_bytes(compressed[:len(compressed) // 2])
+
+    movies = list(iter_tmdb_export(str(truncated_path)))
+
+    assert 0 < len(movies) < 990
+    assert [movie['id'] for movie in movies] == [movie['id'] for movie in iter_tmdb_export(export_path)][:len(movies)]
+    assert 'truncated' in capsys.readouterr().out
+    assert len(top_exported_movies(str(truncated_path), 3)) == 3
+
+def test_seeded_movies_integrate_without_the_popular_list(export_path, tmp_path):
+
+    handler = IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceNoPopularList(), MockIMDb())
+    records = list(handler.iter_integrated_movies(top_exported_movies(export_path, 3)))
+
+    #The records and searches use the title from the TMDb details
+    assert [movie['title'] for movie in records] == ['Mock Movie 969', 'Mock Movie 872', 'Mock Movie 775']
+    assert records[0]['youtube_video_ids'] == ('Mock Movie 969-video-1', 'Mock Movie 969-video-2')
+
+    pipelined = list(handler.stream_pipelined_movies(top_exported_movies(export_path, 3)))
+    assert sorted(pipelined, key=lambda movie: movie['title']) == sorted(records, key=lambda movie: movie['title'])
+
+    refreshed, delta = handler.refresh_incremental(SnapshotStore(str(tmp_path / 'snapshot.json')), popular_movies=top_exported_movies(export_path, 2))
+    assert [movie['title'] for movie in refreshed] == ['Mock Movie 969', 'Mock Movie 872']
+    assert len(delta['added']) == 2
+
+def test_cli_seeds_from_the_export(export_path, monkeypatch):
+
+    seeded = []
+    monkeypatch.setattr(IntegratedData, 'iter_integrated_movies', lambda self, movies, chunk_size: seeded.extend(movies) or iter(()))
+
+    main(['--seed-export', export_path, '--movies', '5', '--no-cache'])
+
+    assert [movie['id'] for movie in seeded] == [movie['id'] for movie in top_exported_movies(export_path, 5)]
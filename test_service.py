@@ -0,0 +1,116 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from Project_Code import MovieService, ServiceHTTPServer, IntegratedData, SnapshotStore
+from test_integrated_data import MockYoutubeDataSource, MockTMDbDataSourceManyMovies, MockIMDb
+
+class MockTMDbDataSourceFailing(MockTMDbDataSourceManyMovies):
+
+    def fetch_most_popular_movies(self):
+
+        return "Possible Network Error"
+
+@pytest.fixture
+def service_url():
+
+    service = MovieService(IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb()))
+    server = ServiceHTTPServer(('127.0.0.1', 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield service, f'http://127.0.0.1:{server.server_address[1]}'
+
+    server.shutdown()
+    server.server_close()
+
+def get(url, headers=None):
+
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {})) as response:
+
+        return response.status, response.headers, json.loads(response.read() or b'null')
+
+def test_service_serves_the_snapshot_from_memory(service_url):
+
+    service, url = service_url
+
+    assert get(url + '/movies')[2] == []
+    assert service.refresh()
+
+    status, headers, movies = get(url + '/movies')
+
+    assert status == 200
+    assert [movie['title'] for movie in movies] == [f'Mock Movie {movie_id}' for movie_id in range(1, 11)]
+    assert get(url + '/movies/3')[2] == movies[2]
+    assert get(url + '/analysis')[2]['movies'][0]['average_views'] == 1000
+    assert get(url + '/health')[2]['generation'] == 1
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+
+        get(url + '/movies/999')
+
+    assert error.value.code == 404
+
+    #An unchanged snapshot is not sent again
+    with pytest.raises(urllib.error.HTTPError) as error:
+
+        get(url + '/movies', {'If-None-Match': headers['ETag']})
+
+    assert error.value.code == 304
+
+def test_failed_refresh_keeps_serving_the_previous_snapshot():
+
+    service = MovieService(IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb()))
+    assert service.refresh()
+    snapshot = service.snapshot
+
+    service.integrated_data_handler.tmdb_data_source = MockTMDbDataSourceFailing()
+
+    assert not service.refresh()
+    assert service.snapshot is snapshot
+    assert service.health()['failures'] == 1
+
+def test_service_starts_from_the_saved_snapshot_and_refreshes_in_the_background(tmp_path):
+
+    handler = IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb())
+    store = SnapshotStore(str(tmp_path / 'snapshot.json'))
+    store.save(handler.integrate_popular_movies_youtube_data()[:2])
+
+    service = MovieService(handler, refresh_interval=60, snapshot_store=store)
+
+    assert len(service.snapshot.records) == 2
+
+    service.start()
+    service.stop()
+
+    assert service.snapshot.generation == 1
+    assert len(service.snapshot.records) == 10
+
+class MockYoutubeDataSourceQuotaResets(MockYoutubeDataSource):
+
+    def __init__(self):
+
+        self.quota_used_up = True
+
+    def search_videos_by_title(self, title):
+
+        if self.quota_used_up:
+
+            raise Exception("Youtube API quota exceeded")
+
+        return super().search_videos_by_title(title)
+
+def test_service_recovers_once_the_youtube_quota_is_reset():
+
+    youtube_ds = MockYoutubeDataSourceQuotaResets()
+    service = MovieService(IntegratedData(youtube_ds, MockTMDbDataSourceManyMovies(), MockIMDb()))
+
+    assert service.refresh()
+    assert all(movie['youtube_videos_stats'][0]['kind'] == 'quota' for movie in service.snapshot.records)
+
+    #The next day the quota is back and the following refresh has the YouTube data again
+    youtube_ds.quota_used_up = False
+
+    assert service.refresh()
+    assert all(movie['youtube_videos_stats'][0]['views'] == 1000 for movie in service.snapshot.records)
@@ -0,0 +1,81 @@
+import pytest
+from benchmark import MockAPIServer
+from Project_Code import ShardedRunner, IntegratedData, HTTPTransport, YouTubeDataSource, TMDbDataSource, IMDb, RateLimiter, ResponseCache, IDIndex, parse_arguments
+
+FAST_LIMITS = {source: {'rate': 10000, 'burst': 10000} for source in ('tmdb', 'imdb', 'youtube')}
+
+def base_urls(server):
+
+    return {'youtube': server.base_url + 'youtube/', 'tmdb': server.base_url + 'tmdb/', 'imdb': server.base_url + 'omdb/'}
+
+def test_sharded_run_matches_single_process_run():
+
+    with MockAPIServer(movie_count=30, credits_size=5) as server:
+
+        runner = ShardedRunner('key', 'key', 'key', processes=2, shard_size=7, rate_limits=FAST_LIMITS, base_urls=base_urls(server))
+        sharded = runner.run(range(1, 31))
+
+        transport = HTTPTransport()
+        sources = [YouTubeDataSource('key', transport), TMDbDataSource('key', transport), IMDb('key', transport)]
+
+        for data_source, source in zip(sources, ('youtube', 'tmdb', 'imdb')):
+
+            data_source.base_url = base_urls(server)[source]
+
+        single = IntegratedData(*sources)._integrate_chunk([{'id': movie_id} for movie_id in range(1, 31)])
+
+    assert [movie['tmdb_id'] for movie in sharded] == list(range(1, 31))
+    assert sharded == single
+
+def test_workers_share_one_quota():
+
+    limits = dict(FAST_LIMITS, youtube={'rate': 10000, 'burst': 10000, 'daily_quota': 350})
+
+    with MockAPIServer(movie_count=12, credits_size=5) as server:
+
+        records = ShardedRunner('key', 'key', 'key', processes=2, shard_size=3, rate_limits=limits, base_urls=base_urls(server)).run(range(1, 13))
+
+    #Each search costs 100 units, so only three searches fit in the budget across both workers
+    assert len(records) == 12
+    assert sum(1 for movie in records if movie['youtube_video_ids']) == 3
+
+def test_workers_charge_the_quota_persisted_for_the_day(tmp_path):
+
+    limits = dict(FAST_LIMITS, youtube={'rate': 10000, 'burst': 10000, 'daily_quota': 360})
+    cache_path = str(tmp_path / 'cache.sqlite')
+    RateLimiter(limits, usage_store=ResponseCache(cache_path)).charge('youtube', 150)
+
+    with MockAPIServer(movie_count=12, credits_size=5) as server:
+
+        records = ShardedRunner('key', 'key', 'key', processes=2, shard_size=3, rate_limits=limits, base_urls=base_urls(server), cache_path=cache_path).run(range(1, 13))
+
+    #150 units were already spent today, so two searches fit in what is left
+    assert sum(1 for movie in records if movie['youtube_video_ids']) == 2
+    assert RateLimiter(limits, usage_store=ResponseCache(cache_path)).quota_remaining('youtube') <= 10
+
+def test_workers_use_the_cache_and_id_index(tmp_path):
+
+    cache_path = str(tmp_path / 'cache.sqlite')
+    index_path = str(tmp_path / 'index.sqlite')
+
+    with MockAPIServer(movie_count=12, credits_size=5) as server:
+
+        runner = ShardedRunner('key', 'key', 'key', processes=2, shard_size=3, rate_limits=FAST_LIMITS, base_urls=base_urls(server), cache_path=cache_path, id_index_path=index_path)
+        first = runner.run(range(1, 13))
+
+    #Every movie's video IDs are indexed and its responses cached by the workers
+    assert IDIndex(index_path).stats()['video_ids'] == 12
+    assert ResponseCache(cache_path).stats()['entries'] > 0
+
+    with MockAPIServer(movie_count=12, credits_size=5) as server:
+
+        second = ShardedRunner('key', 'key', 'key', processes=2, shard_size=3, rate_limits=FAST_LIMITS, base_urls=base_urls(server), cache_path=cache_path, id_index_path=index_path).run(range(1, 13))
+
+    assert [movie['youtube_video_ids'] for movie in second] == [movie['youtube_video_ids'] for movie in first]
+
+@pytest.mark.parametrize('option', [['--pipelined'], ['--timings'], ['--metrics'], ['--trace', 'trace.json']])
+def test_options_the_workers_cannot_honour_are_rejected(option):
+
+    with pytest.raises(SystemExit):
+
+        parse_arguments(['--movies', '10', '--processes', '2'] + option)
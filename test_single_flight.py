@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from Project_Code import SingleFlight, AsyncSingleFlight, HTTPTransport, IMDb
+
+def test_concurrent_identical_calls_run_once():
+
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_lookup(title):
+
+        calls.append(title)
+        release.wait(5)
+        return {'Title': title}
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+
+        futures = [pool.submit(single_flight.do, 'The Matrix', slow_lookup, 'The Matrix') for _ in range(5)]
+
+        while single_flight.coalesced < 4:
+
+            time.sleep(0.01)
+
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert calls == ['The Matrix']
+    assert results == [{'Title': 'The Matrix'}] * 5
+    assert single_flight.stats() == {'calls': 1, 'coalesced': 4}
+
+def test_errors_are_shared_and_not_remembered():
+
+    single_flight = SingleFlight()
+
+    def failing_lookup():
+
+        raise ValueError('upstream down')
+
+    with pytest.raises(ValueError):
+
+        single_flight.do('key', failing_lookup)
+
+    assert single_flight.do('key', lambda: 'recovered') == 'recovered'
+
+def test_async_callers_share_one_task():
+
+    single_flight = AsyncSingleFlight()
+    calls = []
+
+    async def lookup(movie_id):
+
+        calls.append(movie_id)
+        await asyncio.sleep(0.01)
+        return {'id': movie_id}
+
+    async def run():
+
+        return await asyncio.gather(*(single_flight.do(('tmdb', 42), lookup, 42) for _ in range(10)))
+
+    results = asyncio.run(run())
+
+    assert calls == [42]
+    assert results == [{'id': 42}] * 10
+    assert single_flight.coalesced == 9
+
+def test_transport_coalesces_identical_omdb_searches(requests_mock):
+
+    def slow_response(request, context):
+
+        time.sleep(0.2)
+        return {'Title': 'The Matrix', 'Response': 'True'}
+
+    requests_mock.get("http://www.omdbapi.com/", json=slow_response)
+    imdb_api = IMDb('test_api_key', HTTPTransport())
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+
+        results = list(pool.map(imdb_api.search, ['The Matrix'] * 4))
+
+    assert results == [{'Title': 'The Matrix', 'Response': 'True'}] * 4
+    assert requests_mock.call_count == 1
+    assert imdb_api.transport.single_flight.coalesced == 3
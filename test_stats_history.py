@@ -0,0 +1,132 @@
+import os
+from Project_Code import StatsHistory, IntegratedData, SnapshotStore, STATS_HISTORY_ROW
+from test_integrated_data import MockYoutubeDataSource, MockTMDbDataSourceManyMovies, MockIMDb
+
+DAY = 24 * 3600
+
+class MockYoutubeDataSourceStatsDown(MockYoutubeDataSource):
+
+    def __init__(self):
+
+        self.down = False
+
+    def fetch_video_stats(self, video_id):
+
+        if self.down:
+
+            raise ConnectionError("YouTube is unavailable")
+
+        return super().fetch_video_stats(video_id)
+
+def stats(views, likes):
+
+    return {'channelName': 'Mock Channel', 'videoTitle': 'Trailer', 'views': views, 'likes': likes}
+
+def test_range_latest_and_growth_queries(tmp_path):
+
+    history = StatsHistory(str(tmp_path))
+
+    for day in range(5):
+
+        history.append('1', {'a': stats(1000 * (day + 1), 10 * (day + 1)), 'b': stats(500, 5), 'c': {'error': 'quota'}}, timestamp=day * DAY)
+
+    #A snapshot that is not newer than the last one is ignored
+    assert history.append('1', {'a': stats(1, 1)}, timestamp=2 * DAY) == 0
+
+    assert history.range('a', DAY, 3 * DAY) == [(DAY, 2000, 20), (2 * DAY, 3000, 30), (3 * DAY, 4000, 40)]
+    assert history.latest('a') == (4 * DAY, 5000, 50)
+    assert history.latest('c') is None
+    assert set(history.movie_latest('1')) == {'a', 'b'}
+    assert len(history.movie_range('1', start=3 * DAY)['b']) == 2
+
+    assert history.growth('a') == {'days': 4.0, 'views_change': 4000, 'likes_change': 40, 'views_per_day': 1000.0, 'likes_per_day': 10.0}
+    assert history.growth('a', window=DAY)['days'] == 1.0
+    assert history.movie_growth('1', window=2 * DAY)['views_per_day'] == 1000.0
+    assert history.movie_growth('2') is None
+
+def test_history_survives_reopening_and_torn_writes(tmp_path):
+
+    history = StatsHistory(str(tmp_path), segment_rows=3)
+
+    for day in range(7):
+
+        history.append('1', {'a': stats(day, day)}, timestamp=day * DAY)
+
+    history.close()
+
+    #A crash mid-write leaves half a row at the end of the newest segment
+    newest = sorted(name for name in os.listdir(tmp_path) if name.endswith('.bin'))[-1]
+
+    with open(tmp_path / newest, 'ab') as segment:
+
+        segment.write(STATS_HISTORY_ROW.pack(0, 99 * DAY, 1, 1)[:10])
+
+    reopened = StatsHistory(str(tmp_path), segment_rows=3)
+
+    assert reopened.range('a') == [(day * DAY, day, day) for day in range(7)]
+    assert reopened.append('1', {'a': stats(7, 7)}, timestamp=7 * DAY) == 1
+    assert reopened.latest('a') == (7 * DAY, 7, 7)
+
+def test_compaction_downsamples_old_snapshots(tmp_path):
+
+    now = 30 * DAY
+    history = StatsHistory(str(tmp_path), segment_rows=10, compact_after_segments=100, downsample_after=7 * DAY, clock=lambda: now)
+
+    #Four snapshots a day for thirty days
+    for step in range(120):
+
+        history.append('1', {'a': stats(step, step)}, timestamp=step * DAY / 4)
+
+    assert history.stats()['segments'] > 1
+
+    kept = history.compact()
+    rows = history.range('a')
+
+    #One snapshot per day before the cutoff, every snapshot after it
+    assert kept == len(rows) == 23 + 7 * 4
+    assert rows[0] == (0.75 * DAY, 3, 3)
+    assert history.stats()['segments'] == 2
+    history.close()
+
+    assert StatsHistory(str(tmp_path)).range('a') == rows
+
+def test_integration_records_snapshots_and_reports_growth(tmp_path):
+
+    now = [0]
+    history = StatsHistory(str(tmp_path), clock=lambda: now[0])
+    handler = IntegratedData(MockYoutubeDataSource(), MockTMDbDataSourceManyMovies(), MockIMDb(), stats_history=history)
+
+    handler.integrate_popular_movies_youtube_data()
+    now[0] = DAY
+    integrated_data = handler.integrate_popular_movies_youtube_data()
+
+    assert history.stats()['rows'] == 2 * 20
+    assert history.latest('Mock Movie 1-video-1') == (DAY, 1000, 10)
+
+    analysis = handler.analyze(integrated_data)
+
+    #The mock counts never change, so the trailers gained nothing per day
+    assert list(analysis['columns']['views_per_day']) == [0.0] * 10
+
+def test_refresh_without_fresh_stats_adds_no_samples(tmp_path):
+
+    now = [0]
+    history = StatsHistory(str(tmp_path / 'history'), clock=lambda: now[0])
+    snapshot_store = SnapshotStore(str(tmp_path / 'snapshot.json'))
+    youtube_ds = MockYoutubeDataSourceStatsDown()
+    handler = IntegratedData(youtube_ds, MockTMDbDataSourceManyMovies(), MockIMDb(), stats_history=history)
+
+    handler.refresh_incremental(snapshot_store)
+    now[0] = DAY
+    handler.refresh_incremental(snapshot_store)
+
+    assert history.stats()['rows'] == 2 * 20
+
+    #The stats the failed refresh carried over are kept in the records but not sampled again
+    youtube_ds.down = True
+    now[0] = 2 * DAY
+    records, delta = handler.refresh_incremental(snapshot_store)
+
+    assert records[0]['youtube_videos_stats'][0]['views'] == 1000
+    assert history.stats()['rows'] == 2 * 20
+    assert history.latest('Mock Movie 1-video-1') == (DAY, 1000, 10)
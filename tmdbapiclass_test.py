@@ -99,3 +99,41 @@ def test_fetch_movie_details_response_missing_budget(tmdb_data_source):
     movie_details = tmdb_data_source.fetch_movie_details_with_credits(movie_id = '12345')
 
     assert movie_details.get('budget') == None 
+
+def test_iter_popular_movies_pages_lazily(tmdb_data_source, requests_mock):
+
+    def popular_page(request, context):
+
+        page = int(request.qs['page'][0])
+        return {'page': page, 'total_pages': 10, 'results': [{'id': page * 100 + index, 'title': f'Movie {page}-{index}'} for index in range(20)]}
+
+    requests_mock.get("https://api.themoviedb.org/3/movie/popular", json=popular_page)
+
+    movies = list(tmdb_data_source.iter_popular_movies(45, prefetch=2))
+
+    assert len(movies) == 45
+    assert movies[-1]['id'] == 304
+    assert sorted(int(request.qs['page'][0]) for request in requests_mock.request_history) == [1, 2, 3]
+
+def test_iter_popular_movies_stops_at_last_page(tmdb_data_source, requests_mock):
+
+    requests_mock.get("https://api.themoviedb.org/3/movie/popular", json={'page': 1, 'total_pages': 1, 'results': [{'id': 1, 'title': 'Only Movie'}]})
+
+    assert [movie['id'] for movie in tmdb_data_source.iter_popular_movies(100)] == [1]
+
+def test_fetch_movie_details_keeps_only_director_and_lead_actor(tmdb_data_source, requests_mock):
+
+    cast = [{'id': index, 'name': f'Actor {index}', 'character': 'Someone', 'order': index} for index in range(300)]
+    crew = [{'id': index, 'name': f'Crew {index}', 'job': 'Director' if index == 150 else 'Grip'} for index in range(300)]
+    requests_mock.get("https://api.themoviedb.org/3/movie/7", json={'title': 'Big Production', 'overview': 'Long', 'vote_average': 7.5, 'vote_count': 42, 'budget': 200000000, 'credits': {'cast': cast[::-1], 'crew': crew}})
+
+    assert tmdb_data_source.fetch_movie_details_with_credits(7) == {
+
+        'title': 'Big Production',
+        'average_rating': 7.5,
+        'number_of_ratings': 42,
+        'director': 'Crew 150',
+        'lead_actor': 'Actor 0',
+        'budget': 200000000
+
+    }
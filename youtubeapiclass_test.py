@@ -0,0 +1,47 @@
+import pytest
+from urllib.parse import urlsplit, parse_qs
+from Project_Code import YouTubeDataSource, YOUTUBE_SEARCH_FIELDS, YOUTUBE_VIDEOS_FIELDS
+
+def video_item(video_id, views, likes):
+
+    return {'id': video_id, 'snippet': {'channelTitle': 'Channel', 'title': f'Video {video_id}'}, 'statistics': {'viewCount': str(views), 'likeCount': str(likes)}}
+
+@pytest.fixture
+def youtube_data_source():
+
+    return YouTubeDataSource(api_key='test_api_key')
+
+def test_fetch_video_stats_batch_uses_one_request_per_50_ids(youtube_data_source, requests_mock):
+
+    video_ids = [f'v{index}' for index in range(120)]
+
+    def videos_response(request, context):
+
+        ids = request.qs['id'][0].split(',')
+        return {'items': [video_item(video_id, 100, 5) for video_id in ids]}
+
+    requests_mock.get("https://www.googleapis.com/youtube/v3/videos", json=videos_response)
+
+    stats = youtube_data_source.fetch_video_stats_batch(video_ids + video_ids[:10])
+
+    assert requests_mock.call_count == 3
+    assert list(stats) == video_ids
+    assert stats['v119'] == {'channelName': 'Channel', 'videoTitle': 'Video v119', 'views': 100, 'likes': 5}
+
+def test_fetch_video_stats_batch_missing_video(youtube_data_source, requests_mock):
+
+    requests_mock.get("https://www.googleapis.com/youtube/v3/videos", json={'items': [video_item('a', 10, 1)]})
+
+    stats = youtube_data_source.fetch_video_stats_batch(['a', 'b'])
+
+    assert stats['a']['views'] == 10
+    assert 'b' not in stats
+
+def test_requests_only_the_parsed_fields(youtube_data_source, requests_mock):
+
+    requests_mock.get("https://www.googleapis.com/youtube/v3/search", json={'items': [{'id': {'videoId': 'a'}}]})
+    requests_mock.get("https://www.googleapis.com/youtube/v3/videos", json={'items': [video_item('a', 10, 1)]})
+
+    assert youtube_data_source.search_videos_by_title('Inception') == ['a']
+    assert youtube_data_source.fetch_video_stats('a')['views'] == 10
+    assert [parse_qs(urlsplit(request.url).query)['fields'] for request in requests_mock.request_history] == [[YOUTUBE_SEARCH_FIELDS], [YOUTUBE_VIDEOS_FIELDS]]